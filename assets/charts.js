@@ -0,0 +1,74 @@
+// Figures for the dashboard tabs, drawn from the chart-data / chart-zoom stores
+// filled by dashboard.py, so switching tabs never goes back to the server.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    charts: {
+        render: function (tab, data, zoom, template) {
+            if (!data) {
+                return window.dash_clientside.no_update;
+            }
+
+            var zoomed = zoom && zoom.tab === tab;
+            var series = zoomed ? zoom.series : data[tab];
+            var layout = {
+                template: {layout: template},
+                uirevision: data.name + ":" + tab,
+                xaxis: {title: {text: "date"}}
+            };
+            if (zoomed) {
+                layout.xaxis.range = [zoom.start, zoom.end];
+            }
+
+            if (tab === "calories") {
+                layout.title = {text: "Calories per " + series.resolution};
+                layout.yaxis = {title: {text: "calories"}};
+                return {
+                    data: [{type: "bar", x: series.date, y: series.calories}],
+                    layout: layout
+                };
+            }
+
+            if (tab === "sleep") {
+                layout.yaxis = {title: {text: "sleep_hours"}};
+                return {
+                    data: [{
+                        type: "scatter",
+                        mode: "lines+markers",
+                        x: series.date,
+                        y: series.sleep_hours
+                    }],
+                    layout: layout
+                };
+            }
+
+            if (tab === "workouts") {
+                if (!series.date.length) {
+                    return {data: [], layout: {title: {text: "No workout data"}}};
+                }
+                // one trace per workout type, stacked like px.bar(color=...)
+                var traces = {};
+                series.workout_type.forEach(function (type, i) {
+                    if (!traces[type]) {
+                        traces[type] = {type: "bar", name: type, x: [], y: []};
+                    }
+                    traces[type].x.push(series.date[i]);
+                    traces[type].y.push(series.calories_burned[i]);
+                });
+                layout.title = {text: "Workout Calories Burned per " + series.resolution};
+                layout.yaxis = {title: {text: "calories_burned"}};
+                layout.barmode = "relative";
+                layout.legend = {title: {text: "workout_type"}};
+                return {data: Object.values(traces), layout: layout};
+            }
+
+            // moods: distribution over all time, no x axis to zoom
+            var moods = data.moods;
+            if (!moods.count.length) {
+                return {data: [], layout: {title: {text: "No mood data"}}};
+            }
+            return {
+                data: [{type: "pie", labels: moods.mood, values: moods.count}],
+                layout: {title: {text: "Mood Distribution"}}
+            };
+        }
+    }
+});
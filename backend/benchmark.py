@@ -0,0 +1,251 @@
+import argparse
+import itertools
+import json
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+import requests
+from sqlalchemy import text
+
+from backend.synthetic import random_entry, user_names
+
+
+# -------------------- SCENARIOS --------------------
+INGEST_PATHS = {
+    "calories": "/calories/add-by-name",
+    "sleep": "/sleep/add-by-name",
+    "workouts": "/workouts/add-by-name",
+    "moods": "/moods/add-by-name",
+}
+
+SCENARIOS = (
+    "add-calorie", "add-sleep", "add-workout", "add-mood",
+    "dashboard-kpis", "dashboard-charts",
+)
+
+# entries written by the benchmark land on this day, away from real data
+BENCH_DAY = date(2000, 1, 1)
+
+
+def ingest_call(api: str, kind: str, users: list):
+    """call(rng) posting one random entry to the add-by-name endpoint for `kind`."""
+    url = api.rstrip("/") + INGEST_PATHS[kind]
+    local = threading.local()
+
+    def call(rng):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        entry = random_entry(rng, kind, rng.choice(users), BENCH_DAY)
+        if kind == "moods":
+            # this endpoint takes query parameters, not a body
+            response = session.post(url, params=entry)
+        else:
+            response = session.post(url, json=entry)
+        response.raise_for_status()
+
+    return call
+
+
+def dashboard_call(query: str, users: list):
+    # the functions behind the dashboard callbacks, without their per-version
+    # caches: KPIs always query, charts go through the incremental frame cache
+    import dashboard
+    fetch = {"kpis": dashboard.fetch_kpis, "charts": dashboard.fetch_charts}[query]
+
+    # the dashboard resolves the selected name to a user_id once
+    with dashboard.engine.connect() as conn:
+        user_ids = conn.execute(
+            text("SELECT user_id FROM users WHERE name = ANY(:names)"), {"names": users}
+        ).scalars().all()
+
+    def call(rng):
+        fetch(rng.choice(user_ids))
+
+    return call
+
+
+def make_call(scenario: str, api: str, users: list):
+    kind = {
+        "add-calorie": "calories", "add-sleep": "sleep",
+        "add-workout": "workouts", "add-mood": "moods",
+    }.get(scenario)
+    if kind:
+        return ingest_call(api, kind, users)
+    return dashboard_call(scenario.split("-", 1)[1], users)
+
+
+# -------------------- RUNNER --------------------
+def run_scenario(call, total: int, concurrency: int, warmup: int, seed: int) -> dict:
+    """Run `call` `total` times from `concurrency` threads and summarize latency."""
+    rng = random.Random(f"{seed}-warmup")
+    for _ in range(warmup):
+        call(rng)
+
+    counter = itertools.count()
+    latencies, errors = [], []
+
+    def worker(worker_id):
+        rng = random.Random(f"{seed}-{worker_id}")
+        while next(counter) < total:
+            started = time.perf_counter()
+            try:
+                call(rng)
+            except Exception as exc:
+                errors.append(repr(exc))
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "requests": total,
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 1),
+    }
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        result.update(
+            p50_ms=round(cuts[49], 2), p95_ms=round(cuts[94], 2), p99_ms=round(cuts[98], 2),
+            mean_ms=round(statistics.fmean(latencies), 2), max_ms=round(max(latencies), 2),
+        )
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+def seed_data(users: list, days: int, seed: int) -> None:
+    """`days` days of every entry kind for each benchmark user, through COPY."""
+    from backend.database import SessionLocal
+    from backend.importer import flush_chunk
+    from backend.ingest import ENTRY_KINDS, parse_entry
+
+    rng = random.Random(seed)
+    first_day = BENCH_DAY - timedelta(days=days)
+    with SessionLocal() as db:
+        for kind in ENTRY_KINDS:
+            chunk = [
+                parse_entry(kind, random_entry(rng, kind, name, first_day + timedelta(days=d)))
+                for name in users
+                for d in range(days)
+            ]
+            flush_chunk(db, kind, chunk)
+
+
+# -------------------- BASELINE --------------------
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Regressions of `results` against `baseline`, as readable lines."""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base or "p95_ms" not in base or "p95_ms" not in current:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {current['p95_ms']} ms (baseline {base['p95_ms']} ms)")
+        if current["throughput"] < base["throughput"] * (1 - threshold):
+            regressions.append(
+                f"{name}: {current['throughput']} req/s (baseline {base['throughput']} req/s)"
+            )
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load-test the ingest endpoints and the dashboard queries"
+    )
+    parser.add_argument("--api", default="http://127.0.0.1:8000", help="running API to drive")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=500, help="measured calls per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--seed-days", type=int, default=0,
+                        help="insert this many days of data per user first")
+    parser.add_argument("--out", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed p95 / throughput regression (0.2 = 20%%)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="write these results to --baseline instead of comparing")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    users = user_names(args.users)
+    if args.seed_days:
+        seed_data(users, args.seed_days, args.seed)
+        print(f"✅ Seeded {args.seed_days} days for {len(users)} users")
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "seed": args.seed,
+        },
+        "scenarios": {},
+    }
+
+    for scenario in scenarios:
+        try:
+            result = run_scenario(
+                make_call(scenario, args.api, users),
+                args.requests, args.concurrency, args.warmup, args.seed
+            )
+        except Exception as exc:
+            # warmup failed: the API is down or the scenario can't run at all
+            result = {"requests": 0, "errors": 1, "throughput": 0, "first_error": repr(exc)}
+        results["scenarios"][scenario] = result
+        print(
+            f"{scenario:<18} {result['throughput']:>8} req/s  "
+            f"p50 {result.get('p50_ms', '-')} ms  p95 {result.get('p95_ms', '-')} ms  "
+            f"p99 {result.get('p99_ms', '-')} ms  errors {result['errors']}"
+        )
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {args.out}")
+
+    failed = [name for name, result in results["scenarios"].items() if result["errors"]]
+    if failed:
+        print(f"❌ Errors in: {', '.join(failed)} ({results['scenarios'][failed[0]]['first_error']})")
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Baseline updated: {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"❌ Regression: {line}")
+        if regressions:
+            failed.append("baseline")
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,127 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+from sqlalchemy import text
+
+from backend.database import SessionLocal, engine
+from backend.partitions import add_months, month_start
+from backend.reports import build_shard
+
+SHARD_USERS = 1000
+
+# --full recomputes from here; a Monday and the 1st of a month
+FULL_SINCE = date(1900, 1, 1)
+
+
+# -------------------- WORKERS --------------------
+def init_worker() -> None:
+    # connections inherited through fork belong to the parent
+    engine.dispose(close=False)
+
+
+def run_shard(task: dict) -> tuple:
+    """Build one shard's reports and mark it done in the same transaction."""
+    with SessionLocal() as db:
+        rows = build_shard(db, task["first"], task["last"], task["since"])
+        db.execute(text("""
+            UPDATE report_shards SET finished_at = now()
+            WHERE run_id = :run AND shard = :shard
+        """), {"run": task["run_id"], "shard": task["shard"]})
+        db.commit()
+    return task["shard"], rows
+
+
+# -------------------- RUNS --------------------
+def start_run(db, since: date, shard_users: int) -> int:
+    """Record a new run and split the current users into id-range shards."""
+    run_id = db.execute(
+        text("INSERT INTO report_runs (since) VALUES (:since) RETURNING run_id"), {"since": since}
+    ).scalar()
+    user_ids = db.execute(text("SELECT user_id FROM users ORDER BY user_id")).scalars().all()
+    shards = [
+        {"run": run_id, "shard": n, "first": chunk[0], "last": chunk[-1]}
+        for n, chunk in enumerate(
+            user_ids[i:i + shard_users] for i in range(0, len(user_ids), shard_users)
+        )
+    ]
+    if shards:
+        db.execute(text("""
+            INSERT INTO report_shards (run_id, shard, first_user_id, last_user_id)
+            VALUES (:run, :shard, :first, :last)
+        """), shards)
+    db.commit()
+    return run_id
+
+
+def unfinished_run(db):
+    return db.execute(text("""
+        SELECT run_id, since FROM report_runs
+        WHERE finished_at IS NULL
+        ORDER BY run_id DESC LIMIT 1
+    """)).first()
+
+
+def pending_shards(db, run_id: int) -> list:
+    return db.execute(text("""
+        SELECT shard, first_user_id, last_user_id FROM report_shards
+        WHERE run_id = :run AND finished_at IS NULL
+        ORDER BY shard
+    """), {"run": run_id}).all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compute weekly and monthly reports for every user"
+    )
+    parser.add_argument("--since", type=date.fromisoformat,
+                        help="recompute periods from this day on (default: start of last month)")
+    parser.add_argument("--full", action="store_true", help="recompute the whole history")
+    parser.add_argument("--restart", action="store_true",
+                        help="abandon an unfinished run instead of resuming it")
+    parser.add_argument("--shard-users", type=int, default=SHARD_USERS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        previous = unfinished_run(db)
+        if previous and not args.restart:
+            run_id, since = previous
+            print(f"→ Resuming run {run_id} (since {since})", file=sys.stderr)
+        else:
+            if previous:
+                db.execute(text("DELETE FROM report_runs WHERE run_id = :run"), {"run": previous[0]})
+            since = FULL_SINCE if args.full else args.since or add_months(month_start(date.today()), -1)
+            run_id = start_run(db, since, args.shard_users)
+            print(f"→ Run {run_id}: reports since {since}", file=sys.stderr)
+
+        shards = pending_shards(db, run_id)
+
+    tasks = [
+        {"run_id": run_id, "shard": shard, "first": first, "last": last, "since": since}
+        for shard, first, last in shards
+    ]
+
+    started = time.perf_counter()
+    total = 0
+    with ProcessPoolExecutor(max(1, args.workers), initializer=init_worker) as pool:
+        futures = [pool.submit(run_shard, task) for task in tasks]
+        for done, future in enumerate(as_completed(futures), 1):
+            shard, rows = future.result()
+            total += rows
+            print(
+                f"… {done}/{len(tasks)} shards, {total} reports, "
+                f"{time.perf_counter() - started:.0f}s",
+                file=sys.stderr
+            )
+
+    with SessionLocal() as db:
+        db.execute(
+            text("UPDATE report_runs SET finished_at = now() WHERE run_id = :run"), {"run": run_id}
+        )
+        db.commit()
+
+    print(f"✅ Wrote {total} reports in {time.perf_counter() - started:.0f}s")
@@ -0,0 +1,257 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import Counter, namedtuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend.database import SessionLocal
+from backend.metrics import Gauges
+
+
+# -------------------- SEED DATA --------------------
+# the original hard-coded lists; migration 0004 loads them into catalog_items
+SEED_FOODS = {
+    "rice": 350,
+    "roti": 120,
+    "banana": 105,
+    "apple": 95,
+    "oats": 250,
+    "chicken": 400,
+}
+
+SEED_WORKOUTS = {
+    "lunges": 230,
+    "squats": 250,
+    "pushups": 180,
+    "plank": 120,
+    "jumping jacks": 200,
+    "burpees": 300,
+    "running": 400,
+}
+
+CATALOG_KINDS = ("food", "workout")
+
+# fuzzy matches below this trigram similarity are dropped
+MIN_SIMILARITY = 0.3
+
+RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "10"))
+
+log = logging.getLogger("backend.catalog")
+
+
+# -------------------- INDEX --------------------
+CatalogEntry = namedtuple("CatalogEntry", "item_id kind name calories serving_unit")
+
+
+def normalize(term: str) -> str:
+    return " ".join(term.lower().split())
+
+
+def trigrams(term: str) -> set:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CatalogIndex:
+    """Immutable in-memory snapshot of the catalog.
+
+    Names and synonyms are normalized into one key space per kind: a dict
+    for exact lookups, a sorted list for prefix search (bisect) and trigram
+    posting lists for fuzzy search. A reload builds a new index and swaps
+    the module-level reference, so readers never see a half-built one.
+    """
+
+    def __init__(self, version: int, items, synonyms):
+        self.version = version
+
+        by_id = {item.item_id: item for item in items}
+        # the fact tables store item ids
+        self.names = {item_id: item.name for item_id, item in by_id.items()}
+        self._exact = {}
+        keys = {kind: [] for kind in CATALOG_KINDS}
+
+        def add(item, name):
+            key = (item.kind, normalize(name))
+            if key not in self._exact:
+                self._exact[key] = item
+                keys.setdefault(item.kind, []).append(key[1])
+
+        for item in by_id.values():
+            add(item, item.name)
+        for item_id, name in synonyms:
+            if item_id in by_id:
+                add(by_id[item_id], name)
+
+        self._sorted = {kind: sorted(names) for kind, names in keys.items()}
+
+        self._postings = {}
+        self._gram_counts = {}
+        for kind, names in self._sorted.items():
+            postings = {}
+            for name in names:
+                grams = trigrams(name)
+                self._gram_counts[(kind, name)] = len(grams)
+                for gram in grams:
+                    postings.setdefault(gram, []).append(name)
+            self._postings[kind] = {gram: tuple(names) for gram, names in postings.items()}
+
+        self.size = len(by_id)
+
+    def lookup(self, kind: str, name: str):
+        return self._exact.get((kind, normalize(name)))
+
+    def search(self, query: str, kind: str = None, limit: int = 10) -> list:
+        """Prefix matches first, then fuzzy (trigram) matches to fill `limit`."""
+        query = normalize(query)
+        kinds = (kind,) if kind else CATALOG_KINDS
+        results, seen = [], set()
+
+        def collect(kind, name):
+            item = self._exact[(kind, name)]
+            if item.item_id not in seen:
+                seen.add(item.item_id)
+                results.append({
+                    "kind": item.kind,
+                    "name": item.name,
+                    "calories": item.calories,
+                    "serving_unit": item.serving_unit,
+                    "matched": name,
+                })
+
+        for kind in kinds:
+            names = self._sorted.get(kind, ())
+            i = bisect.bisect_left(names, query)
+            while i < len(names) and names[i].startswith(query) and len(results) < limit:
+                collect(kind, names[i])
+                i += 1
+
+        if len(results) >= limit or not query:
+            return results
+
+        grams = trigrams(query)
+        scored = []
+        for kind in kinds:
+            postings = self._postings.get(kind, {})
+            shared = Counter()
+            for gram in grams:
+                shared.update(postings.get(gram, ()))
+            for name, count in shared.items():
+                similarity = count / (len(grams) + self._gram_counts[(kind, name)] - count)
+                if similarity >= MIN_SIMILARITY:
+                    scored.append((similarity, kind, name))
+
+        scored.sort(key=lambda match: -match[0])
+        for _, kind, name in scored:
+            if len(results) >= limit:
+                break
+            collect(kind, name)
+
+        return results
+
+
+# -------------------- LOADING --------------------
+def load_index(db: Session) -> CatalogIndex:
+    # version first: a change landing mid-load just triggers one more reload
+    version = db.execute(text("SELECT version FROM catalog_meta")).scalar() or 0
+    # in id order, so the oldest of two items with one normalized name wins
+    items = [
+        CatalogEntry(*row) for row in db.execute(text(
+            "SELECT item_id, kind, name, calories, serving_unit FROM catalog_items ORDER BY item_id"
+        ))
+    ]
+    synonyms = db.execute(text(
+        "SELECT item_id, name FROM catalog_synonyms ORDER BY item_id, synonym_id"
+    )).all()
+    return CatalogIndex(version, items, synonyms)
+
+
+_index = None
+_load_lock = threading.Lock()
+_swap_lock = threading.Lock()
+_watcher = None
+
+RELOAD_STATS = {"version": 0, "reloads": 0, "skipped_loads": 0, "watch_errors": 0}
+
+Gauges(
+    "catalog_index", "In-memory catalog index; watch_errors counts failed background checks.",
+    ("stat",), lambda: {(stat,): value for stat, value in RELOAD_STATS.items()}
+)
+
+
+def reload() -> CatalogIndex:
+    """Load the catalog and install it, unless a newer index is live already.
+
+    The watcher, POST /catalog/reload and the first use can all load at
+    once; one that read an older version and finishes last is dropped
+    instead of replacing what the others installed.
+    """
+    global _index
+    with SessionLocal() as db:
+        index = load_index(db)
+    with _swap_lock:
+        if _index is not None and index.version <= _index.version:
+            RELOAD_STATS["skipped_loads"] += 1
+            return _index
+        _index = index
+        RELOAD_STATS["version"] = index.version
+        RELOAD_STATS["reloads"] += 1
+        return index
+
+
+def current() -> CatalogIndex:
+    """The live index, loaded on first use and refreshed in the background."""
+    index = _index
+    if index is None:
+        with _load_lock:
+            if _index is None:
+                reload()
+                _start_watcher()
+        index = _index
+    return index
+
+
+def is_loaded() -> bool:
+    return _index is not None
+
+
+def preload() -> None:
+    """Load the index at startup, so no request blocks on the first load.
+
+    Under USE_ASYNC_DB lookups run on the event loop, where that load's
+    sync queries would stall every other request. If the database isn't
+    reachable yet, the first use tries again.
+    """
+    try:
+        current()
+    except Exception:
+        log.exception("catalog preload failed")
+
+
+def _start_watcher() -> None:
+    global _watcher
+    if _watcher is None:
+        _watcher = threading.Thread(target=_watch, name="catalog-reloader", daemon=True)
+        _watcher.start()
+
+
+def _watch() -> None:
+    while True:
+        time.sleep(RELOAD_INTERVAL)
+        check_for_changes()
+
+
+def check_for_changes() -> None:
+    # catalog_meta.version is a single-row read, so polling it is cheap
+    try:
+        with SessionLocal() as db:
+            version = db.execute(text("SELECT version FROM catalog_meta")).scalar()
+        if _index is None or version > _index.version:
+            reload()
+    except Exception:
+        # keeps serving the last index; the next tick tries again
+        RELOAD_STATS["watch_errors"] += 1
+        log.exception("catalog reload check failed")
@@ -1,6 +1,11 @@
 from backend.database import engine
 from backend.models import Base
+from backend.migrations import upgrade
 
 if __name__ == "__main__":
     Base.metadata.create_all(bind=engine)
+    # fresh tables already have the latest schema; this only records the
+    # migrations as applied (they're idempotent), contract and maintenance
+    # steps included: there is nothing in the tables to lock yet
+    upgrade(engine, contract=True, maintenance=True)
     print("✅ Database tables created successfully")
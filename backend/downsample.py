@@ -0,0 +1,70 @@
+from datetime import date
+
+
+# -------------------- RESOLUTION --------------------
+RESOLUTIONS = ("day", "week", "month")
+
+# upper bound on points per series sent to a chart
+MAX_POINTS = 1000
+
+
+def pick_resolution(start: date, end: date) -> str:
+    """Coarsest bucket that still shows the range in useful detail."""
+    if start is None or end is None:
+        return "day"
+    days = (end - start).days
+    if days <= 92:
+        return "day"
+    if days <= 2 * 365:
+        return "week"
+    return "month"
+
+
+def bucket_sql(resolution: str, column: str = "date") -> str:
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    if resolution == "day":
+        return column
+    return f"date_trunc('{resolution}', {column})::date"
+
+
+# -------------------- LTTB --------------------
+def lttb(xs: list, ys: list, threshold: int = MAX_POINTS) -> list:
+    """Largest-Triangle-Three-Buckets: indices of the points to keep.
+
+    `xs` must be sorted and numeric (use date.toordinal() for dates). The
+    first and last points are always kept; every bucket in between keeps
+    the point forming the largest triangle with its neighbours, which
+    preserves peaks and dips far better than striding or averaging.
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    keep = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # average of the next bucket is the third triangle corner
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+
+        keep.append(best)
+        a = best
+
+    keep.append(n - 1)
+    return keep
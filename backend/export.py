@@ -0,0 +1,173 @@
+import io
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import BigInteger, Date, DateTime, Float, Integer, SmallInteger, cast, select, text
+from sqlalchemy.engine import Connection
+
+from backend.models import Calorie, Sleep, Workout, Mood, CatalogItem, SleepQuality
+
+
+# -------------------- SETTINGS --------------------
+# rows fetched from the server-side cursor, and written, per batch
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "50000"))
+
+EXPORT_TABLES = {
+    "calories": Calorie,
+    "sleep": Sleep,
+    "workouts": Workout,
+    "moods": Mood,
+}
+
+# dimension id column -> (exported name column, dimension model); the ids are
+# kept and the names joined in, so files read the same as before
+EXPORT_LABELS = {
+    "food_item_id": ("food_name", CatalogItem),
+    "workout_item_id": ("workout_type", CatalogItem),
+    "quality_id": ("sleep_quality", SleepQuality),
+}
+
+# moods.mood_level is text until migration 12 runs, the cast is a no-op after
+CAST_COLUMNS = {"mood_level"}
+
+FORMATS = {
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "arrow": ("arrows", "application/vnd.apache.arrow.stream"),
+}
+
+
+# -------------------- SCHEMA --------------------
+def arrow_type(column) -> pa.DataType:
+    kind = type(column.type)
+    if issubclass(kind, SmallInteger):
+        return pa.int16()
+    if issubclass(kind, BigInteger):
+        return pa.int64()
+    if issubclass(kind, Integer):
+        return pa.int32()
+    if issubclass(kind, Float):
+        return pa.float64()
+    if issubclass(kind, DateTime):
+        return pa.timestamp("us", tz="UTC" if column.type.timezone else None)
+    if issubclass(kind, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def table_schema(model) -> pa.Schema:
+    columns = [c for c in model.__table__.columns if c.name != "data_version"]
+    fields = [pa.field(c.name, arrow_type(c), c.nullable) for c in columns]
+    fields += [
+        pa.field(EXPORT_LABELS[c.name][0], pa.string()) for c in columns if c.name in EXPORT_LABELS
+    ]
+    return pa.schema(fields)
+
+
+# -------------------- READING --------------------
+def iter_batches(conn: Connection, model, user_id: int = None, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """Yield RecordBatches of `model`'s rows, `chunk_rows` at a time.
+
+    stream_results makes psycopg2 use a named (server-side) cursor, so only
+    one chunk is ever held in memory, however long the history is.
+    """
+    schema = table_schema(model)
+    table = model.__table__
+    selected = [
+        cast(table.c[name], table.c[name].type).label(name) if name in CAST_COLUMNS else table.c[name]
+        for name in schema.names if name in table.c
+    ]
+    source = table
+    for column in list(selected):
+        if column.name in EXPORT_LABELS:
+            label, dimension = EXPORT_LABELS[column.name]
+            dimension = dimension.__table__.alias(label)
+            key = next(iter(dimension.primary_key))
+            source = source.outerjoin(dimension, key == column)
+            selected.append(dimension.c.name.label(label))
+    query = select(*selected).select_from(source)
+    if user_id is not None:
+        # served by the (user_id, date) index; full-table exports stay unordered
+        query = query.where(table.c.user_id == user_id).order_by(table.c.date)
+
+    result = conn.execution_options(stream_results=True, max_row_buffer=chunk_rows).execute(query)
+    for rows in result.partitions(chunk_rows):
+        columns = zip(*rows)
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema
+        )
+
+
+# -------------------- WRITING --------------------
+class ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def open_writer(fmt: str, sink, schema: pa.Schema):
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, schema, compression="zstd")
+    if fmt == "arrow":
+        return pa.ipc.new_stream(sink, schema)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+def write_export(conn: Connection, model, fmt: str, sink, user_id: int = None,
+                 chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    """Write `model`'s rows to the file object `sink`; returns the row count."""
+    rows = 0
+    with open_writer(fmt, sink, table_schema(model)) as writer:
+        for batch in iter_batches(conn, model, user_id, chunk_rows):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+
+def stream_export(engine, model, fmt: str, user_id: int = None, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """Yield the encoded export as it is produced, one chunk of rows at a time."""
+    sink = ChunkSink()
+    with engine.connect() as conn:
+        with open_writer(fmt, sink, table_schema(model)) as writer:
+            for batch in iter_batches(conn, model, user_id, chunk_rows):
+                writer.write_batch(batch)
+                data = sink.drain()
+                if data:
+                    yield data
+    # the parquet footer / arrow end-of-stream marker
+    yield sink.drain()
+
+
+# -------------------- SNAPSHOTS --------------------
+def export_snapshot(conn: Connection) -> str:
+    """Export `conn`'s snapshot so other connections read the same data.
+
+    `conn` has to stay in its REPEATABLE READ transaction until every
+    reader has imported the snapshot.
+    """
+    return conn.execute(text("SELECT pg_export_snapshot()")).scalar()
+
+
+def use_snapshot(conn: Connection, snapshot: str) -> None:
+    # must be the first statement of a REPEATABLE READ transaction
+    conn.execute(text(f"SET TRANSACTION SNAPSHOT '{snapshot}'"))
+
@@ -0,0 +1,200 @@
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# -------------------- SETTINGS --------------------
+FRAME_CACHE_MB = float(os.getenv("FRAME_CACHE_MB", "256"))
+# a full reload every so often catches deletes, and rows whose transaction
+# committed after a higher id had already been read
+FRAME_RESYNC_SECONDS = float(os.getenv("FRAME_RESYNC_SECONDS", "600"))
+
+# metric -> (table, id column, selected columns); dimension ids stay ids,
+# which keeps the frames small, and are mapped to names when charted
+FRAME_TABLES = {
+    "calories": ("calories", "calorie_id", ("date", "calories")),
+    "sleep": ("sleep", "sleep_id", ("date", "sleep_hours", "quality_id")),
+    "workouts": ("workouts", "workout_id", ("date", "workout_item_id", "duration", "calories_burned")),
+    "moods": ("moods", "mood_id", ("date", "mood_level")),
+}
+
+
+# -------------------- FRAME CACHE --------------------
+class _Entry:
+    __slots__ = ("frame", "last_id", "version", "synced_at", "nbytes", "lock")
+
+    def __init__(self):
+        # one incremental fetch at a time, or two could append the same rows
+        self.lock = threading.Lock()
+
+
+class FrameCache:
+    """Per-user DataFrames of the fact tables, kept current incrementally.
+
+    A miss loads the user's whole history once; after that a changed data
+    version only fetches rows with an id above the last one seen. Entries
+    are evicted least recently used first once their combined size passes
+    `budget_mb`, and reloaded in full every `resync_after` seconds.
+    """
+
+    def __init__(self, engine, budget_mb: float = FRAME_CACHE_MB,
+                 resync_after: float = FRAME_RESYNC_SECONDS):
+        self.engine = engine
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.resync_after = resync_after
+        self.nbytes = 0
+        self.full_loads = 0
+        self.incremental_loads = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, metric: str, version=None) -> pd.DataFrame:
+        """Rows of `metric` for `user_id`, ordered by id.
+
+        With the same `version` as last time the cached frame is returned
+        without a query; None always checks for new rows. Callers must not
+        modify the frame.
+        """
+        return self.get_many([(user_id, version)], metric)[0]
+
+    def get_many(self, users: list, metric: str) -> list:
+        """get() for [(user_id, version)]; users not cached yet share one query."""
+        now = time.monotonic()
+        frames, missing, changed = [None] * len(users), [], []
+        with self._lock:
+            for i, (user_id, version) in enumerate(users):
+                entry = self._data.get((user_id, metric))
+                if entry is None or now - entry.synced_at >= self.resync_after:
+                    missing.append(i)
+                    continue
+                self._data.move_to_end((user_id, metric))
+                if version is None or version != entry.version:
+                    changed.append(i)
+                else:
+                    frames[i] = entry.frame
+
+        if missing:
+            loaded = self._load([users[i][0] for i in missing], metric)
+            for i in missing:
+                user_id, version = users[i]
+                entry = _Entry()
+                entry.frame, entry.last_id = loaded.get(user_id) or (self.empty(metric), None)
+                entry.synced_at, entry.version = now, version
+                self._store((user_id, metric), entry)
+                frames[i] = entry.frame
+            self.full_loads += len(missing)
+
+        for i in changed:
+            user_id, version = users[i]
+            entry = self._data.get((user_id, metric))
+            if entry is None:
+                # evicted in the meantime
+                frames[i] = self.get(user_id, metric, version)
+                continue
+            with entry.lock:
+                if version is None or version != entry.version:
+                    new, last_id = self._load([user_id], metric, after=entry.last_id).get(
+                        user_id, (None, entry.last_id)
+                    )
+                    if new is not None:
+                        entry.frame = pd.concat([entry.frame, new], ignore_index=True)
+                        entry.last_id = last_id
+                    entry.version = version
+                    self._store((user_id, metric), entry)
+                    self.incremental_loads += 1
+                frames[i] = entry.frame
+
+        return frames
+
+    def _load(self, user_ids: list, metric: str, after: int = None) -> dict:
+        """{user_id: (frame, last id)} for users with rows (above `after`)."""
+        table, id_column, columns = FRAME_TABLES[metric]
+        params = {"users": list(user_ids)}
+        where = ""
+        if after is not None:
+            where = f" AND {id_column} > %(after)s"
+            params["after"] = after
+
+        # COPY + read_csv: no per-row Python objects between the socket and
+        # the columns, which matters for long histories
+        with self.engine.connect() as conn:
+            cursor = conn.connection.cursor()
+            try:
+                query = cursor.mogrify(f"""
+                    SELECT user_id, {id_column}, {", ".join(columns)}
+                    FROM {table}
+                    WHERE user_id = ANY(%(users)s){where}
+                    ORDER BY user_id, {id_column}
+                """, params).decode()
+                buf = io.StringIO()
+                cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", buf)
+            finally:
+                cursor.close()
+        buf.seek(0)
+        frame = pd.read_csv(buf)
+
+        frame["date"] = pd.to_datetime(frame["date"])
+        # rows come sorted by user, so each user is one contiguous slice
+        user_column = frame["user_id"].to_numpy()
+        ids = frame[id_column].to_numpy()
+        values = frame[list(columns)]
+        starts = np.flatnonzero(np.r_[True, user_column[1:] != user_column[:-1]]) if len(frame) else []
+        ends = list(starts[1:]) + [len(frame)]
+        return {
+            int(user_column[a]): (values.iloc[a:b].reset_index(drop=True), int(ids[b - 1]))
+            for a, b in zip(starts, ends)
+        }
+
+    @staticmethod
+    def empty(metric: str) -> pd.DataFrame:
+        columns = FRAME_TABLES[metric][2]
+        return pd.DataFrame({
+            column: pd.Series(dtype="datetime64[ns]" if column == "date" else "object")
+            for column in columns
+        })
+
+    def _store(self, key, entry: _Entry) -> None:
+        with self._lock:
+            old = self._data.get(key)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            entry.nbytes = int(entry.frame.memory_usage(deep=True).sum())
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            self.nbytes += entry.nbytes
+
+            # the newest entry stays even if it alone is over budget
+            while self.nbytes > self.budget and len(self._data) > 1:
+                _, evicted = self._data.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            for metric in FRAME_TABLES:
+                entry = self._data.pop((user_id, metric), None)
+                if entry is not None:
+                    self.nbytes -= entry.nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self.nbytes,
+                "full_loads": self.full_loads,
+                "incremental_loads": self.incremental_loads,
+            }
+
+
+# -------------------- BUCKETS --------------------
+def bucket_dates(dates: pd.Series, resolution: str) -> pd.Series:
+    """pandas version of downsample.bucket_sql: day, Monday of the week or 1st of the month."""
+    if resolution == "day":
+        return dates
+    if resolution == "week":
+        return dates - pd.to_timedelta(dates.dt.weekday, unit="D")
+    return dates.dt.to_period("M").dt.start_time
@@ -0,0 +1,163 @@
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from backend.database import SessionLocal, engine
+from backend.importer import copy_csv
+from backend.ingest import ENTRY_KINDS
+from backend.rolling import rebuild as rebuild_rolling
+from backend.summary import SUMMARY_COLUMNS, entry_deltas
+from backend.synthetic import user_profile, user_history
+
+USERS_PER_TASK = 200
+
+
+# -------------------- WORKERS --------------------
+def init_worker() -> None:
+    # connections inherited through fork belong to the parent
+    engine.dispose(close=False)
+
+
+def generate_users(task: dict) -> dict:
+    """Generate and COPY the full history of a slice of users.
+
+    Every user has its own RNG seeded from (seed, index), so the data does
+    not depend on how users are split across workers. daily_summary rows
+    are computed in the same pass and copied alongside the facts, and the
+    slice's rolling stats are rebuilt from them before the commit.
+    """
+    buffers = {kind: io.StringIO() for kind in ENTRY_KINDS}
+    writers = {kind: csv.writer(buf) for kind, buf in buffers.items()}
+    summary_buf = io.StringIO()
+    summary_writer = csv.writer(summary_buf)
+    counts = dict.fromkeys(ENTRY_KINDS, 0)
+
+    foods, workouts = task["foods"], task["workouts"]
+    workout_names = sorted(workouts)
+
+    for index, user_id in task["users"]:
+        rng = random.Random(f"{task['seed']}:{index}")
+        profile = user_profile(rng, workout_names)
+
+        for day, entries in user_history(rng, profile, task["start"], task["end"], foods, workouts):
+            totals = dict.fromkeys(SUMMARY_COLUMNS, 0)
+            for kind, rows in entries.items():
+                columns = ENTRY_KINDS[kind][3]
+                for values in rows:
+                    writers[kind].writerow((user_id, *values))
+                    row = dict(zip(columns, (user_id, *values)))
+                    for column, delta in entry_deltas(kind, row).items():
+                        totals[column] += delta
+                counts[kind] += len(rows)
+            summary_writer.writerow((user_id, day, *(totals[c] for c in SUMMARY_COLUMNS)))
+
+    with SessionLocal() as db:
+        for kind, buf in buffers.items():
+            model, _, _, columns = ENTRY_KINDS[kind]
+            copy_csv(db, model.__tablename__, columns, buf)
+        copy_csv(db, "daily_summary", ("user_id", "date") + SUMMARY_COLUMNS, summary_buf)
+        rebuild_rolling(db, [user_id for _, user_id in task["users"]])
+        db.commit()
+
+    return counts
+
+
+# -------------------- SETUP --------------------
+def load_catalog(db) -> tuple:
+    rows = db.execute(text(
+        "SELECT kind, item_id, name, calories FROM catalog_items ORDER BY kind, name"
+    )).all()
+    foods = [(item_id, calories) for kind, item_id, name, calories in rows if kind == "food"]
+    workouts = {name: (item_id, calories) for kind, item_id, name, calories in rows if kind == "workout"}
+    return foods, workouts
+
+
+def create_users(db, prefix: str, count: int, seed: int, workout_names: list) -> list:
+    """COPY `count` users with their profile attributes; returns [(index, user_id)]."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for index in range(count):
+        profile = user_profile(random.Random(f"{seed}:{index}"), workout_names)
+        writer.writerow((
+            f"{prefix}-{index}", profile["age"], profile["height"], profile["weight"], profile["goal"]
+        ))
+    copy_csv(db, "users", ("name", "age", "height", "weight", "goal"), buf)
+    db.commit()
+
+    ids = db.execute(
+        text("SELECT name, user_id FROM users WHERE name LIKE :pattern"),
+        {"pattern": f"{prefix}-%"}
+    ).all()
+    return sorted((int(name.rsplit("-", 1)[1]), user_id) for name, user_id in ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate deterministic synthetic users and history for scale testing"
+    )
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--end", type=date.fromisoformat, default=date.today(),
+                        help="last day of history (default today)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--prefix", default="synth", help="user names are <prefix>-<n>")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    start = args.end - timedelta(days=int(args.years * 365))
+
+    with SessionLocal() as db:
+        taken = db.execute(
+            text("SELECT COUNT(*) FROM users WHERE name LIKE :pattern"),
+            {"pattern": f"{args.prefix}-%"}
+        ).scalar()
+        if taken:
+            sys.exit(f"❌ {taken} users named {args.prefix}-* already exist; pick another --prefix")
+
+        foods, workouts = load_catalog(db)
+        users = create_users(db, args.prefix, args.users, args.seed, sorted(workouts))
+
+    print(f"✅ Created {len(users)} users, generating {start} → {args.end}", file=sys.stderr)
+
+    tasks = [
+        {
+            "users": users[i:i + USERS_PER_TASK],
+            "seed": args.seed,
+            "start": start,
+            "end": args.end,
+            "foods": foods,
+            "workouts": workouts,
+        }
+        for i in range(0, len(users), USERS_PER_TASK)
+    ]
+
+    started = time.perf_counter()
+    totals = dict.fromkeys(ENTRY_KINDS, 0)
+    with ProcessPoolExecutor(args.workers, initializer=init_worker) as pool:
+        for done, counts in enumerate(pool.map(generate_users, tasks), 1):
+            for kind, count in counts.items():
+                totals[kind] += count
+            rows = sum(totals.values())
+            print(
+                f"… {min(done * USERS_PER_TASK, len(users))}/{len(users)} users, "
+                f"{rows} rows, {rows / (time.perf_counter() - started):,.0f} rows/s",
+                file=sys.stderr
+            )
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in ("users", "daily_summary", "rolling_stats", *(m.__tablename__ for m, _, _, _ in ENTRY_KINDS.values())):
+            conn.execute(text(f"ANALYZE {table}"))
+
+    print(
+        f"✅ Generated {sum(totals.values())} rows "
+        f"({', '.join(f'{kind}: {count}' for kind, count in totals.items())}) "
+        f"in {time.perf_counter() - started:.0f}s"
+    )
@@ -0,0 +1,45 @@
+import argparse
+import sys
+
+from backend.database import SessionLocal
+from backend.ingest import ENTRY_KINDS
+from backend.importer import CHUNK_SIZE, import_stream
+
+
+def print_progress(report):
+    print(
+        f"… {report['processed']} lines, "
+        f"{report['inserted']} inserted, {report['rejected']} rejected",
+        file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import an NDJSON/CSV export")
+    parser.add_argument("kind", choices=sorted(ENTRY_KINDS))
+    parser.add_argument("path", help="file to import, or - for stdin")
+    parser.add_argument("--format", choices=["ndjson", "csv"])
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+
+    if args.path == "-":
+        stream = sys.stdin
+    else:
+        stream = open(args.path, encoding="utf-8", newline="")
+
+    with stream, SessionLocal() as db:
+        report = import_stream(
+            db, stream, args.kind, fmt,
+            chunk_size=args.chunk_size,
+            on_progress=print_progress
+        )
+
+    for reject in report["rejects"]:
+        print(f"line {reject['line']}: {reject['detail']}", file=sys.stderr)
+
+    print(
+        f"✅ Imported {report['inserted']} {args.kind} entries "
+        f"({report['rejected']} rejected)"
+    )
@@ -0,0 +1,123 @@
+import csv
+import io
+import json
+
+from sqlalchemy.orm import Session
+
+from backend.ingest import (
+    ENTRY_KINDS, EntryError, parse_entry, normalize_name, resolve_user_ids,
+)
+from backend.summary import record_entries
+
+
+# -------------------- SETTINGS --------------------
+CHUNK_SIZE = 5000      # rows per COPY
+MAX_REJECTS = 1000     # rejects kept in the report (all are counted)
+
+
+# -------------------- READING --------------------
+def iter_records(stream, fmt: str):
+    """Yield (line number, record) pairs one line at a time.
+
+    A line that can't be decoded is yielded as an EntryError so the caller
+    can reject it without stopping the import.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            if None in record:
+                yield reader.line_num, EntryError("Too many columns")
+            else:
+                yield reader.line_num, record
+        return
+
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield line_no, EntryError(f"Invalid JSON: {exc.msg}")
+
+
+# -------------------- WRITING --------------------
+def copy_rows(db: Session, table: str, columns: tuple, rows: list) -> None:
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    copy_csv(db, table, columns, buf)
+
+
+def copy_csv(db: Session, table: str, columns: tuple, buf) -> None:
+    """COPY a CSV buffer into `table` in the session's transaction."""
+    buf.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buf
+        )
+    finally:
+        cursor.close()
+
+
+def flush_chunk(db: Session, kind: str, chunk: list) -> int:
+    model, _, _, columns = ENTRY_KINDS[kind]
+    user_ids = resolve_user_ids(db, [name for name, _ in chunk])
+
+    rows = [
+        {**values, "user_id": user_ids[normalize_name(name)]}
+        for name, values in chunk
+    ]
+
+    copy_rows(
+        db, model.__tablename__, columns,
+        [[row.get(column) for column in columns] for row in rows]
+    )
+    record_entries(db, kind, rows)
+    db.commit()
+    return len(rows)
+
+
+# -------------------- PIPELINE --------------------
+def import_stream(
+    db: Session,
+    stream,
+    kind: str,
+    fmt: str = "ndjson",
+    chunk_size: int = CHUNK_SIZE,
+    on_progress=None
+) -> dict:
+    """Stream an NDJSON/CSV export into the fact table for `kind`.
+
+    Only one chunk is held in memory at a time; each chunk is committed on
+    its own so a failure late in a large file keeps the earlier chunks.
+    """
+    report = {"kind": kind, "processed": 0, "inserted": 0, "rejected": 0, "rejects": []}
+    chunk = []
+
+    def flush():
+        report["inserted"] += flush_chunk(db, kind, chunk)
+        chunk.clear()
+        if on_progress:
+            on_progress(report)
+
+    for line_no, record in iter_records(stream, fmt):
+        report["processed"] += 1
+        try:
+            if isinstance(record, EntryError):
+                raise record
+            chunk.append(parse_entry(kind, record))
+        except EntryError as exc:
+            report["rejected"] += 1
+            if len(report["rejects"]) < MAX_REJECTS:
+                report["rejects"].append({"line": line_no, "detail": exc.detail})
+            continue
+
+        if len(chunk) >= chunk_size:
+            flush()
+
+    if chunk:
+        flush()
+
+    return report
@@ -0,0 +1,230 @@
+import os
+
+from pydantic import ValidationError
+from sqlalchemy import event, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from backend import catalog
+from backend.cache import TTLCache
+from backend.models import User, Calorie, Sleep, Workout, Mood
+from backend.schemas import CalorieByName, SleepByName, WorkoutByName, MoodByName
+
+
+# -------------------- MASTER DATA --------------------
+MOOD_MAP = {
+    "Sad": 1,
+    "Tired": 2,
+    "Neutral": 3,
+    "Happy": 4,
+    "Energetic": 5
+}
+
+# sleep_qualities rows; migration 0008 seeds them with these ids
+SLEEP_QUALITY_MAP = {
+    "Poor": 1,
+    "Fair": 2,
+    "Good": 3,
+    "Excellent": 4
+}
+
+
+# -------------------- USERS --------------------
+# normalized name -> user_id; per process, so after a user is deleted other
+# workers may keep a stale id for at most USER_CACHE_TTL seconds
+USER_CACHE = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "300"))
+)
+
+# Finds the user case-insensitively, or creates it. ON CONFLICT makes two
+# concurrent creators of the same name both get the same id back.
+UPSERT_USER = text("""
+    WITH found AS (
+        SELECT user_id FROM users
+        WHERE lower(name) = lower(:name)
+        ORDER BY user_id
+        LIMIT 1
+    ), created AS (
+        INSERT INTO users (name, age, height, weight, goal)
+        SELECT :name, 0, 0, 0, 'General'
+        WHERE NOT EXISTS (SELECT 1 FROM found)
+        ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+        RETURNING user_id
+    )
+    SELECT user_id FROM found
+    UNION ALL
+    SELECT user_id FROM created
+""")
+
+
+def normalize_name(name: str) -> str:
+    return name.lower()
+
+
+def remember_user_ids(db: Session, ids: dict) -> None:
+    # ids only reach the cache once the transaction that found or created
+    # them commits, so a rollback can't leave a dangling id behind
+    db.info.setdefault("pending_user_ids", {}).update(ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_user_ids(session):
+    for key, user_id in session.info.pop("pending_user_ids", {}).items():
+        USER_CACHE.set(key, user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_user_ids(session):
+    session.info.pop("pending_user_ids", None)
+
+
+@event.listens_for(User, "after_delete")
+def _forget_deleted_user(mapper, connection, target):
+    invalidate_user(target.name)
+
+
+def invalidate_user(name: str) -> None:
+    USER_CACHE.invalidate(normalize_name(name))
+
+
+def get_user_id(db: Session, name: str) -> int:
+    """Return the id for `name`, creating the user if needed.
+
+    A cache hit costs no statement; a miss costs one upsert.
+    """
+    key = normalize_name(name)
+    user_id = USER_CACHE.get(key)
+    if user_id is None:
+        user_id = db.execute(UPSERT_USER, {"name": name}).scalar_one()
+        remember_user_ids(db, {key: user_id})
+    return user_id
+
+
+def resolve_user_ids(db: Session, names) -> dict:
+    """Map normalized names to user ids for a whole batch.
+
+    Cached names cost nothing; the rest are looked up with one SELECT and
+    any new users are created with one INSERT … ON CONFLICT.
+    """
+    ids, wanted = {}, {}
+    for name in names:
+        key = normalize_name(name)
+        if key in ids or key in wanted:
+            continue
+        user_id = USER_CACHE.get(key)
+        if user_id is None:
+            wanted[key] = name
+        else:
+            ids[key] = user_id
+
+    if not wanted:
+        return ids
+
+    found = {}
+    rows = (
+        db.query(User.user_id, User.name)
+        .filter(func.lower(User.name).in_(list(wanted)))
+        .order_by(User.user_id)
+        .all()
+    )
+    for user_id, name in rows:
+        found.setdefault(normalize_name(name), user_id)
+
+    missing = [name for key, name in wanted.items() if key not in found]
+    if missing:
+        stmt = pg_insert(User).values([
+            {"name": name, "age": 0, "height": 0, "weight": 0, "goal": "General"}
+            for name in missing
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.name],
+            set_={"name": stmt.excluded.name}
+        ).returning(User.user_id, User.name)
+        for user_id, name in db.execute(stmt):
+            found[normalize_name(name)] = user_id
+
+    remember_user_ids(db, found)
+    ids.update(found)
+    return ids
+
+
+# -------------------- ENTRY MAPPING --------------------
+def calorie_values(data: CalorieByName) -> dict:
+    food = catalog.current().lookup("food", data.food)
+    if food is None:
+        raise ValueError("Food not found")
+    return {"food_item_id": food.item_id, "calories": food.calories, "date": data.entry_date}
+
+
+def sleep_values(data: SleepByName) -> dict:
+    quality_id = SLEEP_QUALITY_MAP.get(data.sleep_quality.strip().capitalize())
+    if quality_id is None:
+        raise ValueError("Invalid sleep quality")
+    return {
+        "sleep_hours": data.sleep_hours,
+        "quality_id": quality_id,
+        "date": data.entry_date
+    }
+
+
+def workout_values(data: WorkoutByName) -> dict:
+    workout = catalog.current().lookup("workout", data.workout)
+    if workout is None:
+        raise ValueError("Workout not found")
+    return {
+        "workout_item_id": workout.item_id,
+        "duration": data.duration,
+        "calories_burned": workout.calories,
+        "date": data.entry_date
+    }
+
+
+def mood_values(data: MoodByName) -> dict:
+    mood_level = MOOD_MAP.get(data.mood)
+    if mood_level is None:
+        raise ValueError("Invalid mood")
+    return {"mood_level": mood_level, "date": data.entry_date}
+
+
+# kind -> (model, input schema, mapper, insert columns in table order)
+ENTRY_KINDS = {
+    "calories": (
+        Calorie, CalorieByName, calorie_values,
+        ("user_id", "food_item_id", "calories", "date"),
+    ),
+    "sleep": (
+        Sleep, SleepByName, sleep_values,
+        ("user_id", "sleep_hours", "quality_id", "date"),
+    ),
+    "workouts": (
+        Workout, WorkoutByName, workout_values,
+        ("user_id", "workout_item_id", "duration", "calories_burned", "date"),
+    ),
+    "moods": (
+        Mood, MoodByName, mood_values,
+        ("user_id", "mood_level", "date"),
+    ),
+}
+
+
+class EntryError(Exception):
+    def __init__(self, detail):
+        super().__init__(detail)
+        self.detail = detail
+
+
+def parse_entry(kind: str, raw) -> tuple:
+    """Validate one raw entry and return (user name, column values)."""
+    _, schema, to_values, _ = ENTRY_KINDS[kind]
+
+    if not isinstance(raw, dict):
+        raise EntryError("Entry must be an object")
+    try:
+        data = schema(**raw)
+    except ValidationError as exc:
+        raise EntryError(exc.errors(include_url=False))
+    try:
+        return data.name, to_values(data)
+    except ValueError as exc:
+        raise EntryError(str(exc))
@@ -0,0 +1,168 @@
+import asyncio
+import os
+import re
+import time
+from collections import deque
+
+from starlette.responses import JSONResponse
+
+from backend.metrics import Gauges, Histogram
+
+
+# -------------------- SETTINGS --------------------
+# route class -> (requests served at once, requests allowed to wait); a
+# request arriving with the queue full gets 503 right away. Keep the sum of
+# the first numbers near DB_POOL_SIZE + DB_MAX_OVERFLOW (backend/database.py)
+# so admitted requests rarely wait for a connection. 0 turns a limit off.
+ROUTE_LIMITS = {
+    "read": (int(os.getenv("READ_CONCURRENCY", "12")), int(os.getenv("READ_QUEUE", "48"))),
+    "ingest": (int(os.getenv("INGEST_CONCURRENCY", "6")), int(os.getenv("INGEST_QUEUE", "24"))),
+    "export": (int(os.getenv("EXPORT_CONCURRENCY", "2")), int(os.getenv("EXPORT_QUEUE", "4"))),
+}
+# a queued request gives up after this long, before the client would
+QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", "5"))
+RETRY_AFTER = os.getenv("RETRY_AFTER", "1")
+
+# (methods, path) -> route class; first match wins, anything else (/,
+# /metrics, /ingest/queue, /docs) is never limited
+ROUTE_CLASSES = (
+    (("GET",), re.compile(r"^/(users/[^/]+/)?export/"), "export"),
+    (("POST", "DELETE"), re.compile(r"^/(calories|sleep|workouts|moods|import|users)/"), "ingest"),
+    (("GET",), re.compile(r"^/(users|catalog)/"), "read"),
+)
+
+QUEUE_WAIT = Histogram(
+    "http_queue_wait_seconds", "Time admitted requests waited for a concurrency slot.",
+    ("route_class",)
+)
+
+
+def route_class(method: str, path: str):
+    for methods, pattern, name in ROUTE_CLASSES:
+        if method in methods and pattern.match(path):
+            return name
+    return None
+
+
+# -------------------- LIMITER --------------------
+class ConcurrencyLimiter:
+    """At most `limit` requests at once, `max_queue` more waiting in order.
+
+    Runs on the event loop only, so plain counters are enough. A released
+    slot is handed straight to the oldest waiter, which keeps newcomers
+    from overtaking the queue.
+    """
+
+    def __init__(self, limit: int, max_queue: int, timeout: float = QUEUE_TIMEOUT):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters = deque()
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    async def acquire(self) -> bool:
+        """Take a slot; False when the request should be shed instead."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            # release() may have dropped the cancelled waiter already
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self.timed_out += 1
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # got the slot just as the client went away
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "queue_limit": self.max_queue,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+        }
+
+
+LIMITERS = {
+    name: ConcurrencyLimiter(limit, max_queue)
+    for name, (limit, max_queue) in ROUTE_LIMITS.items()
+    if limit > 0
+}
+
+Gauges(
+    "http_concurrency", "Concurrency limiters per route class; shed and timed_out requests got 503.",
+    ("route_class", "stat"),
+    lambda: {
+        (name, stat): value
+        for name, limiter in LIMITERS.items()
+        for stat, value in limiter.stats().items()
+    }
+)
+
+
+# -------------------- MIDDLEWARE --------------------
+class ConcurrencyLimitMiddleware:
+    """ASGI middleware admitting each request through its class's limiter.
+
+    Shed requests are answered with 503 and Retry-After before any work
+    is done, so a burst can't pile up on the connection pool; separate
+    limiters keep one class (bulk ingest) from starving another (reads).
+    A streamed response holds its slot until the last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limiter = None
+        if scope["type"] == "http":
+            name = route_class(scope["method"], scope["path"])
+            limiter = LIMITERS.get(name)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        if not await limiter.acquire():
+            response = JSONResponse(
+                {"detail": f"Too many {name} requests, retry later"},
+                status_code=503, headers={"Retry-After": RETRY_AFTER}
+            )
+            await response(scope, receive, send)
+            return
+        QUEUE_WAIT.observe((name,), time.perf_counter() - started)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
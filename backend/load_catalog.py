@@ -0,0 +1,85 @@
+import argparse
+import csv
+import sys
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from backend.catalog import CATALOG_KINDS
+from backend.database import SessionLocal
+from backend.models import CatalogItem, CatalogSynonym
+
+CHUNK_SIZE = 2000
+
+
+def upsert_chunk(db, rows):
+    items = {}
+    for row in rows:
+        items[(row["kind"], row["name"])] = row
+
+    stmt = pg_insert(CatalogItem).values([
+        {
+            "kind": row["kind"],
+            "name": row["name"],
+            "calories": row["calories"],
+            "serving_unit": row["serving_unit"],
+        }
+        for row in items.values()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_catalog_items_kind_name",
+        set_={
+            "calories": stmt.excluded.calories,
+            "serving_unit": stmt.excluded.serving_unit,
+        }
+    ).returning(CatalogItem.item_id, CatalogItem.kind, CatalogItem.name)
+
+    synonyms = []
+    for item_id, kind, name in db.execute(stmt):
+        for synonym in items[(kind, name)]["synonyms"]:
+            synonyms.append({"item_id": item_id, "name": synonym})
+
+    if synonyms:
+        db.execute(
+            pg_insert(CatalogSynonym).values(synonyms).on_conflict_do_nothing(
+                constraint="uq_catalog_synonyms_item_name"
+            )
+        )
+    db.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Upsert catalog entries from a CSV with columns "
+                    "kind,name,calories,serving_unit,synonyms (synonyms separated by |)"
+    )
+    parser.add_argument("path", help="CSV file, or - for stdin")
+    args = parser.parse_args()
+
+    stream = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8", newline="")
+
+    loaded, chunk = 0, []
+    with stream, SessionLocal() as db:
+        for line_no, row in enumerate(csv.DictReader(stream), 2):
+            kind = (row.get("kind") or "").strip().lower()
+            if kind not in CATALOG_KINDS:
+                print(f"line {line_no}: unknown kind {kind!r}, skipped", file=sys.stderr)
+                continue
+            chunk.append({
+                "kind": kind,
+                "name": row["name"].strip().lower(),
+                "calories": int(row["calories"]),
+                "serving_unit": (row.get("serving_unit") or "serving").strip(),
+                "synonyms": [
+                    s.strip().lower() for s in (row.get("synonyms") or "").split("|") if s.strip()
+                ],
+            })
+            if len(chunk) >= CHUNK_SIZE:
+                upsert_chunk(db, chunk)
+                loaded += len(chunk)
+                chunk = []
+
+        if chunk:
+            upsert_chunk(db, chunk)
+            loaded += len(chunk)
+
+    print(f"✅ Loaded {loaded} catalog entries (workers reload automatically)")
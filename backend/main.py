@@ -1,16 +1,60 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import date
+from typing import Optional
+from contextlib import asynccontextmanager
+import hashlib
+import io
 
-from backend.database import get_db
+from backend.database import get_db, engine, SessionLocal, async_sessions, USE_ASYNC_DB
 from backend.models import User, Sleep, Mood
-from backend.schemas import SleepByName, WorkoutByName, CalorieByName
-from sqlalchemy import text
+from backend.schemas import (
+    SleepByName, WorkoutByName, CalorieByName, MoodByName,
+    BatchRequest, BatchResponse,
+)
+from backend.ingest import (
+    MOOD_MAP, SLEEP_QUALITY_MAP, ENTRY_KINDS, USER_CACHE,
+    EntryError, parse_entry, get_user_id, invalidate_user, normalize_name,
+    resolve_user_ids,
+)
+from backend.importer import import_stream
+from backend.export import EXPORT_TABLES, FORMATS, stream_export
+from backend.summary import record_entries
+from backend.reads import (
+    TIMESERIES, lookup_user_version, version_of, search_users, fetch_summary, fetch_timeseries,
+)
+from backend.downsample import RESOLUTIONS
+from backend.reports import PERIODS, fetch_reports
+from backend.rolling import fetch_rolling
+from backend.versions import VersionWatcher
+from backend.metrics import Gauges, MetricsMiddleware, render_metrics
+from backend.limits import ConcurrencyLimitMiddleware
+from backend.response_cache import RESPONSE_CACHE, read_key
+from backend.writebehind import INGEST_QUEUE, WRITE_BEHIND, QueueFull
+from backend import catalog
+from sqlalchemy import text, insert, delete, func
 
 
 # -------------------- APP SETUP --------------------
-app = FastAPI(title="Health & Fitness Tracker API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # lookups and searches then stay in memory, even on the event loop
+    await run_in_threadpool(catalog.preload)
+    if WRITE_BEHIND:
+        # replays whatever the last run journaled but didn't flush
+        await run_in_threadpool(INGEST_QUEUE.start)
+    yield
+    if WRITE_BEHIND:
+        await run_in_threadpool(INGEST_QUEUE.stop)
+
+
+app = FastAPI(title="Health & Fitness Tracker API", lifespan=lifespan)
+
+# innermost, so shed 503s still get CORS headers and show up in /metrics
+app.add_middleware(ConcurrencyLimitMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,71 +64,220 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# -------------------- MASTER DATA --------------------
-FOOD_CALORIES = {
-    "rice": 350,
-    "roti": 120,
-    "banana": 105,
-    "apple": 95,
-    "oats": 250,
-    "chicken": 400,
-}
-
-WORKOUT_CALORIES = {
-    "lunges": 230,
-    "squats": 250,
-    "pushups": 180,
-    "plank": 120,
-    "jumping jacks": 200,
-    "burpees": 300,
-    "running": 400,
-}
-
-MOOD_MAP = {
-    "Sad": 1,
-    "Tired": 2,
-    "Neutral": 3,
-    "Happy": 4,
-    "Energetic": 5
-}
-
+app.add_middleware(MetricsMiddleware)
 
 # -------------------- HELPERS --------------------
-def get_or_create_user(db: Session, name: str) -> User:
-    user = db.query(User).filter(User.name.ilike(name)).first()
-    if not user:
-        user = User(name=name, age=0, height=0, weight=0, goal="General")
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-    return user
+def _run_with_session(fn, *args):
+    with SessionLocal() as db:
+        return fn(db, *args)
+
+
+async def run_db(fn, *args):
+    """Run fn(db, *args) on the database path picked by USE_ASYNC_DB.
+
+    Async: the function runs on an AsyncSession (asyncpg) through run_sync,
+    so it never occupies a threadpool thread. Sync: it runs on a blocking
+    Session in the threadpool, exactly like a plain `def` endpoint.
+    """
+    if USE_ASYNC_DB:
+        async with async_sessions()() as db:
+            return await db.run_sync(fn, *args)
+    return await run_in_threadpool(_run_with_session, fn, *args)
+
+
+# users.data_version, kept current over LISTEN/NOTIFY (see backend/versions.py)
+VERSIONS = VersionWatcher(engine)
+
+Gauges(
+    "version_watcher", "LISTEN connection for data versions; connected is 0 while it retries.",
+    ("stat",), lambda: {(stat,): value for stat, value in VERSIONS.stats().items()}
+)
+
+
+async def current_version(name: str):
+    """(user_id, data_version) for `name`; no query while both are known."""
+    VERSIONS.start()
+    user_id = USER_CACHE.get(normalize_name(name))
+    if user_id is not None:
+        version = VERSIONS.get(user_id)
+        if version is None:
+            version = await run_db(version_of, user_id)
+            VERSIONS.seed({user_id: version})
+        return user_id, version
+
+    found = await run_db(lookup_user_version, name)
+    if found is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    user_id, version = found
+    USER_CACHE.set(normalize_name(name), user_id)
+    VERSIONS.seed({user_id: version})
+    return user_id, version
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+async def conditional_read(request: Request, name: str, read: str, start: Optional[date],
+                           end: Optional[date], params: tuple, fetch, *args):
+    """Serve `fetch(db, user_id, *args)` with a strong ETag.
+
+    The tag is the user's data version plus the request parameters, so a
+    matching If-None-Match is answered with 304 before any query runs.
+    Otherwise the result comes from RESPONSE_CACHE until a write changes
+    `read` on a day between `start` and `end`.
+    """
+    user_id, version = await current_version(name)
+    digest = hashlib.sha1(repr((read, start, end, params)).encode()).hexdigest()[:12]
+    etag = f'"{user_id}-{version}-{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    data = await RESPONSE_CACHE.get_or_load(
+        read_key(user_id, read, start, end, version, *params), lambda: run_db(fetch, user_id, *args)
+    )
+    return JSONResponse(data, headers=headers)
+
+
+Gauges(
+    "response_cache", "Read cache for summaries, timeseries and catalog search.", ("stat",),
+    lambda: {(stat,): value for stat, value in RESPONSE_CACHE.stats().items()}
+)
+
+
+def queue_entry(kind: str, data) -> JSONResponse:
+    """WRITE_BEHIND mode: validate, journal and answer 202 right away."""
+    to_values = ENTRY_KINDS[kind][2]
+    try:
+        values = to_values(data)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    try:
+        seq = INGEST_QUEUE.submit(kind, data.name, values)
+    except QueueFull:
+        raise HTTPException(
+            status_code=503, detail="Ingest queue is full", headers={"Retry-After": "1"}
+        )
+    return JSONResponse({"message": "Entry queued", "seq": seq}, status_code=202)
 
 # -------------------- ROOT --------------------
 @app.get("/")
-def root():
-    return {"status": "API running successfully"}
+async def root():
+    return {"status": "API running successfully", "async_db": USE_ASYNC_DB}
+
+# -------------------- USERS --------------------
+@app.get("/users/search", tags=["Users"])
+async def user_search(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50)):
+    return {"results": await run_db(search_users, q, limit)}
+
+
+@app.delete("/users/{name}", tags=["Users"])
+async def delete_user(name: str):
+    return await run_db(remove_user, name)
+
+
+def remove_user(db: Session, name: str) -> dict:
+    # Core DELETE so the fact rows go through the FK's ON DELETE CASCADE
+    # instead of being loaded and deleted one by one by the ORM
+    deleted = db.execute(
+        delete(User)
+        .where(func.lower(User.name) == name.lower())
+        .returning(User.user_id, User.name)
+    ).all()
+
+    if not deleted:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    db.commit()
+    for user_id, user_name in deleted:
+        invalidate_user(user_name)
+        RESPONSE_CACHE.invalidate_user(user_id)
+
+    return {"message": "User deleted successfully"}
+
+@app.get("/users/{name}/summary", tags=["Users"])
+async def user_summary(
+    name: str,
+    request: Request,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+):
+    return await conditional_read(
+        request, name, "summary", start, end, (), fetch_summary, start, end
+    )
+
+
+@app.get("/users/{name}/timeseries/{metric}", tags=["Users"])
+async def user_timeseries(
+    name: str,
+    metric: str,
+    request: Request,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    resolution: str = "auto"
+):
+    if metric not in TIMESERIES:
+        raise HTTPException(status_code=404, detail="Unknown metric")
+    if resolution != "auto" and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail="resolution must be auto, day, week or month")
+
+    return await conditional_read(
+        request, name, metric, start, end, (resolution,),
+        fetch_timeseries, metric, start, end, resolution
+    )
+
+@app.get("/users/{name}/rolling", tags=["Users"])
+async def user_rolling(name: str, request: Request):
+    # streaks lapse with the calendar, not only with writes, so the day
+    # is part of the ETag and the cache key
+    today = date.today()
+    return await conditional_read(
+        request, name, "rolling", None, None, (today.isoformat(),), fetch_rolling, today
+    )
+
+@app.get("/users/{name}/reports", tags=["Users"])
+async def user_reports(name: str, period: str = "week", limit: int = Query(12, ge=1, le=520)):
+    # written by the nightly backend/build_reports.py run, not by ingest, so
+    # the data version can't serve as an ETag here
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail="period must be week or month")
+    user_id, _ = await current_version(name)
+    return await run_db(fetch_reports, user_id, period, limit)
 
 # -------------------- CALORIES --------------------
 @app.post("/calories/add-by-name", tags=["Calories"])
-def add_calorie_by_name(
-    data: CalorieByName,
-    db: Session = Depends(get_db)
-):
-    food_key = data.food.lower()
+async def add_calorie_by_name(data: CalorieByName):
+    if WRITE_BEHIND:
+        return queue_entry("calories", data)
+    return await run_db(save_calorie, data)
+
 
-    if food_key not in FOOD_CALORIES:
+def save_calorie(db: Session, data: CalorieByName) -> dict:
+    food = catalog.current().lookup("food", data.food)
+
+    if food is None:
         raise HTTPException(status_code=400, detail="Food not found")
 
-    calories = FOOD_CALORIES[food_key]
-    user = get_or_create_user(db, data.name)
+    calories = food.calories
+    user_id = get_user_id(db, data.name)
 
     db.execute(
     text("""
-        INSERT INTO calories (user_id, food_name, calories, date)
+        INSERT INTO calories (user_id, food_item_id, calories, date)
         VALUES (:u, :f, :c, :d)
     """),
-    {"u": user.user_id, "f": data.food, "c": calories, "d": data.entry_date}
+    {"u": user_id, "f": food.item_id, "c": calories, "d": data.entry_date}
 )
+    record_entries(db, "calories", [
+        {"user_id": user_id, "calories": calories, "date": data.entry_date}
+    ])
 
     db.commit()
 
@@ -96,20 +289,30 @@ def add_calorie_by_name(
 
 # -------------------- SLEEP --------------------
 @app.post("/sleep/add-by-name", tags=["Sleep"])
-def add_sleep_by_name(
-    data: SleepByName,
-    db: Session = Depends(get_db)
-):
-    user = get_or_create_user(db, data.name)
+async def add_sleep_by_name(data: SleepByName):
+    if WRITE_BEHIND:
+        return queue_entry("sleep", data)
+    return await run_db(save_sleep, data)
+
+
+def save_sleep(db: Session, data: SleepByName) -> dict:
+    quality_id = SLEEP_QUALITY_MAP.get(data.sleep_quality.strip().capitalize())
+    if quality_id is None:
+        raise HTTPException(status_code=400, detail="Invalid sleep quality")
+
+    user_id = get_user_id(db, data.name)
 
     sleep = Sleep(
-        user_id=user.user_id,
+        user_id=user_id,
         sleep_hours=data.sleep_hours,
-        sleep_quality=data.sleep_quality,
+        quality_id=quality_id,
         date=data.entry_date
     )
 
     db.add(sleep)
+    record_entries(db, "sleep", [
+        {"user_id": user_id, "sleep_hours": data.sleep_hours, "date": data.entry_date}
+    ])
     db.commit()
 
     return {"message": "Sleep entry added successfully"}
@@ -118,42 +321,38 @@ def add_sleep_by_name(
 from backend.models import Workout
 
 @app.post("/workouts/add-by-name", tags=["Workouts"])
-def add_workout_by_name(
-    data: WorkoutByName,
-    db: Session = Depends(get_db)
-):
-    # 1. Get or create user
-    user = db.query(User).filter(User.name.ilike(data.name)).first()
-    if not user:
-        user = User(
-            name=data.name,
-            age=0,
-            height=0,
-            weight=0,
-            goal="General"
-        )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
+async def add_workout_by_name(data: WorkoutByName):
+    if WRITE_BEHIND:
+        return queue_entry("workouts", data)
+    return await run_db(save_workout, data)
+
 
-    # 2. Get calories for workout
-    workout_key = data.workout.lower()
-    calories = WORKOUT_CALORIES.get(workout_key)
+def save_workout(db: Session, data: WorkoutByName) -> dict:
+    # 1. Get calories for workout
+    workout = catalog.current().lookup("workout", data.workout)
 
-    if calories is None:
+    if workout is None:
         raise HTTPException(status_code=400, detail="Workout not found")
 
+    calories = workout.calories
+
+    # 2. Get or create user
+    user_id = get_user_id(db, data.name)
+
     # 3. Create workout entry (ORM)
     workout_entry = Workout(
-        user_id=user.user_id,
-        workout_type=data.workout,
+        user_id=user_id,
+        workout_item_id=workout.item_id,
         duration=data.duration,
         calories_burned=calories,
         date=data.entry_date
     )
 
-    # 4. Save
+    # 4. Save, together with the day's summary
     db.add(workout_entry)
+    record_entries(db, "workouts", [
+        {"user_id": user_id, "calories_burned": calories, "date": data.entry_date}
+    ])
     db.commit()
 
     return {
@@ -164,37 +363,202 @@ def add_workout_by_name(
 
 # -------------------- MOODS --------------------
 @app.post("/moods/add-by-name", tags=["Moods"])
-def add_mood(
-    name: str,
-    mood: str,
-    entry_date: date,
-    db: Session = Depends(get_db)
-):
-    # get or create user
-    user = db.query(User).filter(User.name.ilike(name)).first()
-    if not user:
-        user = User(name=name, age=0, height=0, weight=0, goal="General")
-        db.add(user)
-        db.commit()
-        db.refresh(user)
+async def add_mood(name: str, mood: str, entry_date: date):
+    if WRITE_BEHIND:
+        return queue_entry("moods", MoodByName(name=name, mood=mood, entry_date=entry_date))
+    return await run_db(save_mood, name, mood, entry_date)
+
 
+def save_mood(db: Session, name: str, mood: str, entry_date: date) -> dict:
     # 🔥 convert mood string → integer
     mood_level = MOOD_MAP.get(mood)
     if mood_level is None:
         raise HTTPException(status_code=400, detail="Invalid mood")
 
+    # get or create user
+    user_id = get_user_id(db, name)
+
     mood_entry = Mood(
-        user_id=user.user_id,
-        mood_level=mood_level,  # ✅ INTEGER now
+        user_id=user_id,
+        mood_level=mood_level,
         date=entry_date
     )
 
     db.add(mood_entry)
+    record_entries(db, "moods", [
+        {"user_id": user_id, "mood_level": mood_level, "date": entry_date}
+    ])
     db.commit()
 
     return {"message": "Mood added successfully"}
 
 
+# -------------------- CATALOG --------------------
+@app.get("/catalog/search", tags=["Catalog"])
+async def catalog_search(
+    q: str = Query(..., min_length=1),
+    kind: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=50)
+):
+    if kind is not None and kind not in catalog.CATALOG_KINDS:
+        raise HTTPException(status_code=400, detail="Kind must be food or workout")
+
+    # pure in-memory lookup, no database access; the index version is part
+    # of the key, so a catalog change starts a fresh set of entries
+    if catalog.is_loaded():
+        index = catalog.current()
+    else:
+        # the startup load failed; don't block the event loop retrying it
+        index = await run_in_threadpool(catalog.current)
+
+    async def search():
+        return {"version": index.version, "results": index.search(q, kind, limit)}
+
+    return await RESPONSE_CACHE.get_or_load(
+        read_key(None, "catalog", None, None, index.version, q, kind, limit), search
+    )
+
+
+@app.post("/catalog/reload", tags=["Catalog"])
+def catalog_reload():
+    # workers also pick up changes on their own within CATALOG_RELOAD_INTERVAL
+    index = catalog.reload()
+    return {"version": index.version, "items": index.size}
+
+
+# -------------------- BATCH INGEST --------------------
+MAX_BATCH_SIZE = 5000
+
+
+def ingest_batch(db: Session, entries: list, kind: str) -> dict:
+    if len(entries) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large (max {MAX_BATCH_SIZE} entries)"
+        )
+
+    # 1. Validate every entry, collecting errors instead of failing the batch
+    accepted, errors = [], []
+    for index, raw in enumerate(entries):
+        try:
+            accepted.append(parse_entry(kind, raw))
+        except EntryError as exc:
+            errors.append({"index": index, "detail": exc.detail})
+
+    if not accepted:
+        return {"inserted": 0, "errors": errors}
+
+    # 2. Resolve every user in the batch at once
+    user_ids = resolve_user_ids(db, [name for name, _ in accepted])
+
+    # 3. One executemany INSERT, one summary upsert, one commit
+    model = ENTRY_KINDS[kind][0]
+    rows = [
+        {**values, "user_id": user_ids[normalize_name(name)]}
+        for name, values in accepted
+    ]
+    db.execute(insert(model), rows)
+    record_entries(db, kind, rows)
+    db.commit()
+
+    return {"inserted": len(rows), "errors": errors}
+
+
+@app.post("/calories/add-batch", tags=["Calories"], response_model=BatchResponse)
+async def add_calorie_batch(batch: BatchRequest):
+    return await run_db(ingest_batch, batch.entries, "calories")
+
+
+@app.post("/sleep/add-batch", tags=["Sleep"], response_model=BatchResponse)
+async def add_sleep_batch(batch: BatchRequest):
+    return await run_db(ingest_batch, batch.entries, "sleep")
+
+
+@app.post("/workouts/add-batch", tags=["Workouts"], response_model=BatchResponse)
+async def add_workout_batch(batch: BatchRequest):
+    return await run_db(ingest_batch, batch.entries, "workouts")
+
+
+@app.post("/moods/add-batch", tags=["Moods"], response_model=BatchResponse)
+async def add_mood_batch(batch: BatchRequest):
+    return await run_db(ingest_batch, batch.entries, "moods")
+
+
+# -------------------- WRITE-BEHIND --------------------
+@app.get("/ingest/queue", tags=["Ingest"])
+def ingest_queue_stats():
+    if not WRITE_BEHIND:
+        return {"enabled": False}
+    return INGEST_QUEUE.stats()
+
+
+Gauges(
+    "ingest_queue", "Write-behind queue state (see GET /ingest/queue).", ("stat",),
+    lambda: {
+        (stat,): value for stat, value in INGEST_QUEUE.stats().items()
+        if stat in ("depth", "flushed", "batches", "last_batch_size", "last_flush_ms", "errors",
+                    "attempts", "dead_lettered")
+    } if WRITE_BEHIND else {}
+)
+
+
+# -------------------- METRICS --------------------
+@app.get("/metrics", tags=["Metrics"], response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text format: route latency, statement timings, pool state
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+# -------------------- EXPORT --------------------
+def export_response(kind: str, fmt: str, user_id: Optional[int], filename: str) -> StreamingResponse:
+    if kind not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail="Unknown entry kind")
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail="Format must be parquet or arrow")
+
+    extension, media_type = FORMATS[fmt]
+    # a sync generator, so Starlette pulls each chunk in the threadpool;
+    # rows come off a server-side cursor and are never all in memory
+    return StreamingResponse(
+        stream_export(engine, EXPORT_TABLES[kind], fmt, user_id),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{extension}"'}
+    )
+
+
+@app.get("/users/{name}/export/{kind}", tags=["Export"])
+async def export_user(name: str, kind: str, fmt: str = Query("parquet", alias="format")):
+    user_id, _ = await current_version(name)
+    return export_response(kind, fmt, user_id, f"user-{user_id}-{kind}")
+
+
+@app.get("/export/{kind}", tags=["Export"])
+def export_all(kind: str, fmt: str = Query("parquet", alias="format")):
+    return export_response(kind, fmt, None, kind)
+
+
+# -------------------- IMPORT --------------------
+@app.post("/import/{kind}", tags=["Import"])
+def import_entries(
+    kind: str,
+    file: UploadFile = File(...),
+    fmt: Optional[str] = Query(None, alias="format"),
+    db: Session = Depends(get_db)
+):
+    if kind not in ENTRY_KINDS:
+        raise HTTPException(status_code=404, detail="Unknown entry kind")
+
+    if fmt is None:
+        fmt = "csv" if (file.filename or "").lower().endswith(".csv") else "ndjson"
+    if fmt not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Format must be ndjson or csv")
+
+    # the upload is spooled to disk, so this reads it line by line; COPY
+    # needs the psycopg2 connection, so imports always use the sync path
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    return import_stream(db, stream, kind, fmt)
+
+
 # -------------------- RUN --------------------
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,30 @@
+import argparse
+
+from backend.database import engine
+from backend.partitions import (
+    MONTHS_AHEAD, RETENTION_MODE, RETENTION_MONTHS, apply_retention, ensure_partitions,
+)
+
+# run daily (cron, systemd timer, ...): inserts never fail without it, since
+# rows for a missing month go to the default partition, but pruning and
+# cheap vacuums depend on every month having its own partition
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Create upcoming monthly partitions and retire expired ones"
+    )
+    parser.add_argument("--ahead", type=int, default=MONTHS_AHEAD,
+                        help="months of partitions to create in advance")
+    parser.add_argument("--retain-months", type=int, default=RETENTION_MONTHS,
+                        help="keep this many whole months of raw entries (0 = keep all)")
+    parser.add_argument("--mode", choices=["detach", "archive", "drop"], default=RETENTION_MODE)
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        created = ensure_partitions(conn, args.ahead)
+        retired = apply_retention(conn, args.retain_months, args.mode)
+
+    for name in created:
+        print(f"→ created {name}")
+    for name in retired:
+        print(f"→ {args.mode} {name}")
+    print(f"✅ {len(created)} partition(s) created, {len(retired)} retired")
@@ -0,0 +1,236 @@
+import bisect
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# -------------------- SETTINGS --------------------
+# fraction of statements logged with their duration (0 = none, 1 = all)
+SQL_LOG_SAMPLE = float(os.getenv("SQL_LOG_SAMPLE", "0"))
+# statements slower than this are always logged; 0 turns it off
+SQL_LOG_SLOW_MS = float(os.getenv("SQL_LOG_SLOW_MS", "0"))
+# distinct statements tracked; anything past it is counted as "other"
+MAX_STATEMENTS = int(os.getenv("METRICS_MAX_STATEMENTS", "500"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+sql_log = logging.getLogger("backend.sql")
+
+
+# -------------------- PRIMITIVES --------------------
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, labels: tuple, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), n, total) for labels, (counts, n, total) in self._series.items()]
+        for labels, counts, n, total in sorted(snapshot):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _label_str(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _label_str(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {n}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, labels)} {n}")
+        return lines
+
+
+class Gauges:
+    """Values computed at scrape time by `collect() -> {labels: value}`."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple, collect):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.collect = collect
+        REGISTRY.append(self)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_label_str(self.labelnames, labels)} {value}")
+        return lines
+
+
+REGISTRY = []
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -------------------- HTTP --------------------
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route template.",
+    ("method", "route", "status")
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording HTTP_LATENCY for every request.
+
+    Routes are labelled by their template (/users/{name}/summary), never by
+    the raw path, so the number of series stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_LATENCY.observe(
+                (scope["method"], route.path if route is not None else "unmatched", str(status[0])),
+                time.perf_counter() - started
+            )
+
+
+# -------------------- SQL --------------------
+SQL_LATENCY = Histogram(
+    "db_statement_duration_seconds", "Statement execution time by normalized statement.",
+    ("engine", "statement"), SQL_BUCKETS
+)
+
+POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Time spent waiting for a pooled connection.",
+    ("engine",), SQL_BUCKETS
+)
+
+_PARAM = re.compile(r"%\(\w+\)s|\$\d+|:\w+|%s")
+_PARAM_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_statements = set()
+_statements_lock = threading.Lock()
+
+
+def statement_label(statement: str) -> str:
+    """Collapse whitespace and parameters so equal statements share a series."""
+    label = " ".join(statement.split())
+    label = _PARAM_LIST.sub("(?, ...)", _PARAM.sub("?", label))[:200]
+    if label not in _statements:
+        with _statements_lock:
+            if len(_statements) >= MAX_STATEMENTS:
+                return "other"
+            _statements.add(label)
+    return label
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Time every statement on `engine` and export its pool state."""
+    if (SQL_LOG_SAMPLE or SQL_LOG_SLOW_MS) and not sql_log.handlers:
+        # same behaviour as echo=True, but only for the statements we keep
+        sql_log.addHandler(logging.StreamHandler(sys.stdout))
+        sql_log.setLevel(logging.INFO)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        SQL_LATENCY.observe((name, statement_label(statement)), elapsed)
+
+        if (SQL_LOG_SLOW_MS and elapsed * 1000 >= SQL_LOG_SLOW_MS) or (
+            SQL_LOG_SAMPLE and random.random() < SQL_LOG_SAMPLE
+        ):
+            sql_log.info("[%s %.1fms] %s %r", name, elapsed * 1000, statement, parameters)
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(context):
+        # after_cursor_execute doesn't fire for a failed statement
+        started = context.connection.info.get("query_started") if context.connection else None
+        if started:
+            started.pop()
+
+    POOLS[name] = engine.pool
+
+
+def timed_pool(base, name: str):
+    """Subclass of pool class `base` that records POOL_WAIT for every checkout."""
+
+    class TimedPool(base):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                POOL_WAIT.observe((name,), time.perf_counter() - started)
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+POOLS = {}
+
+
+def _pool_stats() -> dict:
+    stats = {}
+    for name, pool in POOLS.items():
+        for stat in ("size", "checkedout", "overflow", "checkedin"):
+            getter = getattr(pool, stat, None)
+            if getter is not None:
+                # overflow() counts up from -size; only connections past the pool matter
+                stats[(name, stat)] = max(getter(), 0) if stat == "overflow" else getter()
+    return stats
+
+
+Gauges("db_pool_connections", "Connection pool state.", ("engine", "state"), _pool_stats)
@@ -0,0 +1,19 @@
+import argparse
+
+from backend.database import engine
+from backend.migrations import upgrade
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--contract", action="store_true",
+                        help="also apply contract migrations; only once no process runs the previous release")
+    parser.add_argument("--maintenance", action="store_true",
+                        help="also apply migrations that lock tables while they run (6: partitioning); "
+                             "schedule it in a maintenance window")
+    args = parser.parse_args()
+
+    applied = upgrade(engine, contract=args.contract, maintenance=args.maintenance)
+    if applied:
+        print(f"✅ Applied {len(applied)} migration(s)")
+    else:
+        print("✅ Database schema is up to date")
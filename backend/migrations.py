@@ -0,0 +1,483 @@
+from collections import namedtuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from backend.catalog import SEED_FOODS, SEED_WORKOUTS
+from backend.ingest import SLEEP_QUALITY_MAP
+from backend.partitions import (
+    PARTITIONED_TABLES, ensure_partitions, is_partitioned, list_partitions, partition_table,
+)
+from backend.models import (
+    DailySummary, CatalogItem, CatalogSynonym, CatalogMeta, IngestCheckpoint,
+    Report, ReportRun, ReportShard, SleepQuality, RollingStats,
+)
+from backend.summary import REBUILD_SQL
+from backend.rolling import rebuild as rebuild_rolling
+
+
+# -------------------- REGISTRY --------------------
+Migration = namedtuple(
+    "Migration", "version description apply transactional contract maintenance"
+)
+
+MIGRATIONS = []
+
+# any constant works, it only has to be the same for every deploy
+MIGRATION_LOCK_ID = 720_431
+
+
+def migration(
+    version: int, description: str, transactional: bool = True, contract: bool = False,
+    maintenance: bool = False
+):
+    """Register a migration.
+
+    Migrations must be idempotent: `create_tables.py` builds the latest
+    schema with `create_all` and then runs every migration on top of it.
+    Non-transactional migrations run in autocommit mode, which is what
+    `CREATE INDEX CONCURRENTLY` needs. Contract migrations remove what the
+    previous release still uses, so `upgrade()` holds them back until it is
+    called with contract=True, once no old code is running. Maintenance
+    migrations lock tables for as long as they run; they and every later
+    migration wait for an upgrade with maintenance=True, scheduled in a
+    maintenance window, so a routine deploy never takes those locks.
+    """
+    def register(fn):
+        MIGRATIONS.append(
+            Migration(version, description, fn, transactional, contract, maintenance)
+        )
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+    return register
+
+
+# -------------------- HELPERS --------------------
+def create_index_concurrently(conn: Connection, name: str, table: str, definition: str) -> None:
+    if is_partitioned(conn, table):
+        # not supported on a partitioned parent; it cascades to every partition
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {definition}"))
+        return
+
+    # a failed CONCURRENTLY build leaves an INVALID index behind, which
+    # IF NOT EXISTS would then happily skip, so drop it first
+    invalid = conn.execute(text("""
+        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :name AND NOT i.indisvalid
+    """), {"name": name}).first()
+    if invalid:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+    conn.execute(text(
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}"
+    ))
+
+
+def column_exists(conn: Connection, table: str, column: str) -> bool:
+    return conn.execute(text("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = :t AND column_name = :c
+    """), {"t": table, "c": column}).first() is not None
+
+
+def column_nullable(conn: Connection, table: str, column: str) -> bool:
+    return conn.execute(text("""
+        SELECT is_nullable = 'YES' FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = :t AND column_name = :c
+    """), {"t": table, "c": column}).scalar() or False
+
+
+def constraint_exists(conn: Connection, table: str, name: str) -> bool:
+    return conn.execute(text(
+        "SELECT 1 FROM pg_constraint WHERE conrelid = to_regclass(:t) AND conname = :n"
+    ), {"t": table, "n": name}).first() is not None
+
+
+def add_constraint_online(conn: Connection, table: str, name: str, definition: str) -> None:
+    """ADD CONSTRAINT ... NOT VALID, then VALIDATE it as a separate statement.
+
+    Meant for autocommit migrations: adding a NOT VALID constraint only
+    locks briefly, and VALIDATE scans under SHARE UPDATE EXCLUSIVE, which
+    lets reads and writes through. A partitioned parent can't take a NOT
+    VALID foreign key (before PostgreSQL 18), so every partition gets the
+    constraint first and the parent's then adopts theirs without a scan.
+    """
+    if constraint_exists(conn, table, name):
+        return
+    targets = list_partitions(conn, table) if is_partitioned(conn, table) else [table]
+    for target in targets:
+        if not constraint_exists(conn, target, name):
+            conn.execute(text(f"ALTER TABLE {target} ADD CONSTRAINT {name} {definition} NOT VALID"))
+        conn.execute(text(f"ALTER TABLE {target} VALIDATE CONSTRAINT {name}"))
+    if targets != [table]:
+        conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}"))
+
+
+def normalized_sql(expression: str) -> str:
+    """SQL twin of catalog.normalize(): lower case, single spaces, trimmed."""
+    return rf"lower(trim(regexp_replace({expression}, '\s+', ' ', 'g')))"
+
+
+def catalog_item_sql(kind: str, name: str) -> str:
+    """The item id CatalogIndex.lookup(kind, name) resolves to, as SQL.
+
+    Names win over synonyms and the lowest item id wins a tie, like the
+    index, which is loaded in item_id order.
+    """
+    return f"""COALESCE(
+        (SELECT item_id FROM catalog_items
+         WHERE kind = '{kind}' AND {normalized_sql("name")} = {normalized_sql(name)}
+         ORDER BY item_id LIMIT 1),
+        (SELECT s.item_id FROM catalog_synonyms s JOIN catalog_items i USING (item_id)
+         WHERE i.kind = '{kind}' AND {normalized_sql("s.name")} = {normalized_sql(name)}
+         ORDER BY s.item_id LIMIT 1)
+    )"""
+
+
+def backfill(conn: Connection, table: str, id_column: str, assignment: str, pending: str,
+             batch: int = 50_000) -> int:
+    """UPDATE `table` SET `assignment` in id ranges of `batch`, each its own transaction.
+
+    Meant for autocommit migrations: locks are held for one batch at a time
+    and a restart skips the rows `pending` no longer matches.
+    """
+    low, high = conn.execute(text(f"SELECT MIN({id_column}), MAX({id_column}) FROM {table}")).one()
+    if low is None:
+        return 0
+
+    updated = 0
+    for start in range(low, high + 1, batch):
+        updated += conn.execute(text(f"""
+            UPDATE {table} SET {assignment}
+            WHERE {id_column} >= :start AND {id_column} < :end AND {pending}
+        """), {"start": start, "end": start + batch}).rowcount
+    return updated
+
+
+# -------------------- MIGRATIONS --------------------
+@migration(1, "(user_id, date) indexes and lower(name) index", transactional=False)
+def add_lookup_indexes(conn: Connection) -> None:
+    for table in ("calories", "sleep", "workouts", "moods"):
+        create_index_concurrently(conn, f"ix_{table}_user_id_date", table, "(user_id, date)")
+
+    create_index_concurrently(conn, "ix_users_name_lower", "users", "(lower(name))")
+
+
+@migration(2, "daily_summary table, backfilled from the raw tables")
+def add_daily_summary(conn: Connection) -> None:
+    DailySummary.__table__.create(conn, checkfirst=True)
+    if conn.execute(text("SELECT NOT EXISTS (SELECT 1 FROM daily_summary)")).scalar():
+        conn.execute(text(REBUILD_SQL.format(user_filter="")))
+
+
+
+@migration(3, "users.data_version change counter")
+def add_data_version(conn: Connection) -> None:
+    # constant default: no table rewrite on PostgreSQL 11+
+    conn.execute(text(
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS data_version BIGINT NOT NULL DEFAULT 0"
+    ))
+
+
+
+@migration(4, "food/workout catalog tables, seeded from the old hard-coded lists")
+def add_catalog(conn: Connection) -> None:
+    for model in (CatalogItem, CatalogSynonym, CatalogMeta):
+        model.__table__.create(conn, checkfirst=True)
+
+    conn.execute(text(
+        "INSERT INTO catalog_meta (id, version) VALUES (true, 0) ON CONFLICT DO NOTHING"
+    ))
+
+    conn.execute(text("""
+        CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE catalog_meta SET version = version + 1;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """))
+    for table in ("catalog_items", "catalog_synonyms"):
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_changed ON {table}"))
+        conn.execute(text(f"""
+            CREATE TRIGGER {table}_changed
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version()
+        """))
+
+    seed = [
+        {"kind": "food", "name": name, "calories": calories, "unit": "serving"}
+        for name, calories in SEED_FOODS.items()
+    ] + [
+        {"kind": "workout", "name": name, "calories": calories, "unit": "session"}
+        for name, calories in SEED_WORKOUTS.items()
+    ]
+    conn.execute(text("""
+        INSERT INTO catalog_items (kind, name, calories, serving_unit)
+        VALUES (:kind, :name, :calories, :unit)
+        ON CONFLICT (kind, name) DO NOTHING
+    """), seed)
+
+
+
+@migration(5, "write-behind journal checkpoints")
+def add_ingest_checkpoints(conn: Connection) -> None:
+    IngestCheckpoint.__table__.create(conn, checkfirst=True)
+
+
+
+# rewrites each table under ACCESS EXCLUSIVE; a no-op on tables created partitioned
+@migration(6, "monthly range partitioning of the fact tables", maintenance=True)
+def partition_fact_tables(conn: Connection) -> None:
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(conn, table):
+            partition_table(conn, table)
+    ensure_partitions(conn)
+
+
+
+@migration(7, "weekly/monthly reports and report job bookkeeping")
+def add_reports(conn: Connection) -> None:
+    for model in (Report, ReportRun, ReportShard):
+        model.__table__.create(conn, checkfirst=True)
+
+
+# fact table -> (id column, old column, compact column, its type,
+#                old value -> compact value, compact value -> old value);
+# names match the catalog however they were typed, as the API's lookups do
+COMPACT_COLUMNS = {
+    "calories": (
+        "calorie_id", "food_name", "food_item_id", "INTEGER", catalog_item_sql("food", "{old}"),
+        "(SELECT name FROM catalog_items WHERE item_id = {new})",
+    ),
+    "sleep": (
+        "sleep_id", "sleep_quality", "quality_id", "SMALLINT",
+        "(SELECT quality_id FROM sleep_qualities WHERE lower(name) = lower(trim({old})))",
+        "(SELECT name FROM sleep_qualities WHERE quality_id = {new})",
+    ),
+    "workouts": (
+        "workout_id", "workout_type", "workout_item_id", "INTEGER",
+        catalog_item_sql("workout", "{old}"),
+        "(SELECT name FROM catalog_items WHERE item_id = {new})",
+    ),
+    # the new code writes the old column here: it keeps its name, and text
+    # takes the integer; readers cast it until migration 12 changes its type
+    "moods": (
+        "mood_id", "mood_level", "mood_level_new", "SMALLINT", "{old}::smallint", "{new}::text",
+    ),
+}
+
+# the compact column's final name, once the old one is gone
+COMPACT_NAMES = {"mood_level_new": "mood_level"}
+
+
+@migration(8, "compact fact columns: add, keep in sync and backfill in batches", transactional=False)
+def add_compact_columns(conn: Connection) -> None:
+    SleepQuality.__table__.create(conn, checkfirst=True)
+    conn.execute(text("""
+        INSERT INTO sleep_qualities (quality_id, name) VALUES (:id, :name)
+        ON CONFLICT DO NOTHING
+    """), [{"id": quality_id, "name": name} for name, quality_id in SLEEP_QUALITY_MAP.items()])
+    conn.execute(text("""
+        SELECT setval(pg_get_serial_sequence('sleep_qualities', 'quality_id'),
+                      (SELECT MAX(quality_id) FROM sleep_qualities))
+    """))
+
+    if not column_exists(conn, "calories", "food_name"):
+        return  # created by create_all with the compact columns already
+
+    # every value in use needs a dimension row before rows can point at it
+    conn.execute(text("""
+        INSERT INTO sleep_qualities (name)
+        SELECT DISTINCT ON (lower(trim(sleep_quality))) trim(sleep_quality) FROM sleep s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM sleep_qualities q WHERE lower(q.name) = lower(trim(s.sleep_quality))
+        )
+    """))
+    # matched by normalized name for every row of the backfill; the catalog
+    # is small, so these build in a moment
+    conn.execute(text(
+        f"CREATE INDEX IF NOT EXISTS ix_catalog_items_normalized_name "
+        f"ON catalog_items (kind, ({normalized_sql('name')}))"
+    ))
+    conn.execute(text(
+        f"CREATE INDEX IF NOT EXISTS ix_catalog_synonyms_normalized_name "
+        f"ON catalog_synonyms (({normalized_sql('name')}))"
+    ))
+    # one item per normalized name ("Rice", "rice " and "rice" are one food)
+    # that the catalog doesn't know yet
+    for kind, table, column, calories in (
+        ("food", "calories", "food_name", "calories"),
+        ("workout", "workouts", "workout_type", "calories_burned"),
+    ):
+        conn.execute(text(f"""
+            INSERT INTO catalog_items (kind, name, calories)
+            SELECT :kind, name, MAX(calories) FROM (
+                SELECT {normalized_sql(column)} AS name, {calories} AS calories FROM {table}
+            ) used
+            WHERE name <> '' AND {catalog_item_sql(kind, "used.name")} IS NULL
+            GROUP BY name
+            ON CONFLICT (kind, name) DO NOTHING
+        """), {"kind": kind})
+
+    for table, (id_column, old, new, sql_type, value, old_value) in COMPACT_COLUMNS.items():
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {new} {sql_type}"))
+        # the new release doesn't know the old column; a catalog-only change
+        conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {old} DROP NOT NULL"))
+
+        # until migration 12 both releases run: rows the old code writes get
+        # the compact value, rows the new code writes get the old one back
+        conn.execute(text(f"""
+            CREATE OR REPLACE FUNCTION {table}_fill_{new}() RETURNS trigger AS $$
+            BEGIN
+                IF NEW.{old} IS NULL THEN
+                    NEW.{old} := {old_value.format(new=f"NEW.{new}")};
+                ELSE
+                    NEW.{new} := {value.format(old=f"NEW.{old}")};
+                END IF;
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """))
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_fill_{new} ON {table}"))
+        conn.execute(text(f"""
+            CREATE TRIGGER {table}_fill_{new}
+            BEFORE INSERT OR UPDATE OF {old} ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {table}_fill_{new}()
+        """))
+
+        updated = backfill(
+            conn, table, id_column, f"{new} = {value.format(old=old)}", f"{new} IS NULL"
+        )
+        print(f"  … {table}.{new}: {updated} rows backfilled")
+
+
+# compact column -> what it references
+COMPACT_FOREIGN_KEYS = {
+    "calories": ("food_item_id", "catalog_items (item_id)"),
+    "sleep": ("quality_id", "sleep_qualities (quality_id)"),
+    "workouts": ("workout_item_id", "catalog_items (item_id)"),
+}
+
+
+@migration(9, "compact fact columns: foreign keys, validated online", transactional=False)
+def add_compact_foreign_keys(conn: Connection) -> None:
+    # NULLs pass a foreign key, so rows the old code writes while the old
+    # columns still exist are fine; NOT NULL comes with the contract step
+    for table, (column, target) in COMPACT_FOREIGN_KEYS.items():
+        add_constraint_online(
+            conn, table, f"{table}_{column}_fkey", f"FOREIGN KEY ({column}) REFERENCES {target}"
+        )
+
+
+@migration(10, "indexes for user name search (trigram, or prefix without pg_trgm)", transactional=False)
+def add_user_search_indexes(conn: Connection) -> None:
+    available = conn.execute(text(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+    )).first()
+    if available:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        create_index_concurrently(
+            conn, "ix_users_name_trgm", "users", "USING gin (lower(name) gin_trgm_ops)"
+        )
+    else:
+        print("  … pg_trgm is not installed; user search falls back to prefix matches")
+        create_index_concurrently(
+            conn, "ix_users_name_prefix", "users", "(lower(name) text_pattern_ops)"
+        )
+
+
+@migration(11, "7/30-day rolling stats and workout streaks, backfilled from daily_summary")
+def add_rolling_stats(conn: Connection) -> None:
+    RollingStats.__table__.create(conn, checkfirst=True)
+    if conn.execute(text("SELECT NOT EXISTS (SELECT 1 FROM rolling_stats)")).scalar():
+        rebuild_rolling(conn)
+
+
+@migration(
+    12, "compact fact columns: drop the text columns (contract)", transactional=False, contract=True
+)
+def drop_text_columns(conn: Connection) -> None:
+    for table, (id_column, old, new, sql_type, value, old_value) in COMPACT_COLUMNS.items():
+        name = COMPACT_NAMES.get(new, new)
+        column = new if column_exists(conn, table, new) else name
+
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_fill_{new} ON {table}"))
+        conn.execute(text(f"DROP FUNCTION IF EXISTS {table}_fill_{new}()"))
+
+        if column_nullable(conn, table, column):
+            # a validated CHECK lets SET NOT NULL skip its full-table scan
+            check = f"{table}_{name}_not_null"
+            add_constraint_online(conn, table, check, f"CHECK ({column} IS NOT NULL)")
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+            conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT {check}"))
+
+        if column_exists(conn, table, old) and old != column:
+            conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {old}"))
+        if column != name:
+            conn.execute(text(f"ALTER TABLE {table} RENAME COLUMN {column} TO {name}"))
+
+    # only the backfill and the sync triggers matched on normalized names
+    for index in ("ix_catalog_items_normalized_name", "ix_catalog_synonyms_normalized_name"):
+        conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+
+
+# -------------------- RUNNER --------------------
+def applied_versions(engine: Engine) -> set:
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        """))
+        return set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+
+def upgrade(engine: Engine, log=print, contract: bool = False, maintenance: bool = False) -> list:
+    """Apply pending migrations in order and return the versions applied.
+
+    Contract migrations are skipped (and reported) unless `contract` is set.
+    A pending maintenance migration stops the run unless `maintenance` is
+    set: the migrations after it assume its result (migration 8's triggers
+    would not survive a later conversion), so they wait for it too.
+    """
+    done = []
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        # serialize concurrent deploys
+        lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        try:
+            applied = applied_versions(engine)
+
+            for m in MIGRATIONS:
+                if m.version in applied:
+                    continue
+                if m.maintenance and not maintenance:
+                    log(f"… {m.version:04d} {m.description}: locks tables, held back with every "
+                        "later migration; run `migrate --maintenance` in a maintenance window")
+                    break
+                if m.contract and not contract:
+                    log(f"… {m.version:04d} {m.description}: held back, run `migrate --contract` "
+                        "once no process runs the previous release")
+                    continue
+
+                log(f"→ {m.version:04d} {m.description}")
+                if m.transactional:
+                    with engine.begin() as conn:
+                        m.apply(conn)
+                else:
+                    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                        m.apply(conn)
+
+                with engine.begin() as conn:
+                    conn.execute(
+                        text("INSERT INTO schema_migrations (version, description) VALUES (:v, :d)"),
+                        {"v": m.version, "d": m.description}
+                    )
+                done.append(m.version)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+
+    return done
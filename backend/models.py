@@ -1,4 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey
+from sqlalchemy import (
+    Column, Integer, BigInteger, SmallInteger, String, Float, Date, DateTime, Boolean,
+    ForeignKey, Index, UniqueConstraint, func,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from backend.database import Base
 
@@ -15,61 +19,257 @@ class User(Base):
     weight = Column(Float, default=0)
     goal = Column(String, default="General")
 
+    # bumped by every write to the user's data, see backend/versions.py
+    data_version = Column(BigInteger, nullable=False, default=0, server_default="0")
+
     # Relationships
     calories = relationship("Calorie", back_populates="user", cascade="all, delete")
     sleep = relationship("Sleep", back_populates="user", cascade="all, delete")
     workouts = relationship("Workout", back_populates="user", cascade="all, delete")
     moods = relationship("Mood", back_populates="user", cascade="all, delete")
 
+    __table_args__ = (
+        # case-insensitive lookups: lower(name) = lower(:name)
+        Index("ix_users_name_lower", func.lower(name)),
+    )
+
 # -------------------- CALORIES --------------------
 class Calorie(Base):
     __tablename__ = "calories"
 
-    calorie_id = Column(Integer, primary_key=True, index=True)
+    calorie_id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"))
 
-    food_name = Column(String, nullable=False)
+    food_item_id = Column(Integer, ForeignKey("catalog_items.item_id"), nullable=False)
     calories = Column(Integer, nullable=False)
-    date = Column(Date, nullable=False)
+    date = Column(Date, primary_key=True)   # partition key, see backend/partitions.py
 
     user = relationship("User", back_populates="calories")
 
+    __table_args__ = (
+        Index("ix_calories_user_id_date", "user_id", "date"),
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
+
 # -------------------- SLEEP --------------------
 class Sleep(Base):
     __tablename__ = "sleep"
 
-    sleep_id = Column(Integer, primary_key=True, index=True)
+    sleep_id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"))
 
     sleep_hours = Column(Float, nullable=False)
-    sleep_quality = Column(String, nullable=False)
-    date = Column(Date, nullable=False)
+    quality_id = Column(SmallInteger, ForeignKey("sleep_qualities.quality_id"), nullable=False)
+    date = Column(Date, primary_key=True)   # partition key, see backend/partitions.py
 
     user = relationship("User", back_populates="sleep")
 
+    __table_args__ = (
+        Index("ix_sleep_user_id_date", "user_id", "date"),
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
+
 # -------------------- WORKOUTS --------------------
 class Workout(Base):
     __tablename__ = "workouts"
 
-    workout_id = Column(Integer, primary_key=True, index=True)
+    workout_id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"))
 
-    workout_type = Column(String, nullable=False)
+    workout_item_id = Column(Integer, ForeignKey("catalog_items.item_id"), nullable=False)
     duration = Column(Integer, nullable=False)          # minutes
     calories_burned = Column(Integer, nullable=False)
-    date = Column(Date, nullable=False)
+    date = Column(Date, primary_key=True)   # partition key, see backend/partitions.py
 
     user = relationship("User", back_populates="workouts")
 
+    __table_args__ = (
+        Index("ix_workouts_user_id_date", "user_id", "date"),
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
+
+class SleepQuality(Base):
+    # Poor / Fair / Good / Excellent, see SLEEP_QUALITY_MAP in backend/ingest.py
+    __tablename__ = "sleep_qualities"
+
+    quality_id = Column(SmallInteger, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+
 # -------------------- MOODS --------------------
 class Mood(Base):
     __tablename__ = "moods"
 
-    mood_id = Column(Integer, primary_key=True, index=True)
+    mood_id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"))
 
-    mood_level = Column(String, nullable=False)   # 👈 FIX
+    mood_level = Column(SmallInteger, nullable=False)   # MOOD_MAP value, 1-5
     note = Column(String, nullable=True)
-    date = Column(Date, nullable=False)
+    date = Column(Date, primary_key=True)   # partition key, see backend/partitions.py
 
     user = relationship("User", back_populates="moods")
+
+    __table_args__ = (
+        Index("ix_moods_user_id_date", "user_id", "date"),
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
+
+# -------------------- DAILY SUMMARY --------------------
+class DailySummary(Base):
+    __tablename__ = "daily_summary"
+
+    user_id = Column(
+        Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True
+    )
+    date = Column(Date, primary_key=True)
+
+    calories_in = Column(Integer, nullable=False, default=0, server_default="0")
+    calories_burned = Column(Integer, nullable=False, default=0, server_default="0")
+    sleep_hours = Column(Float, nullable=False, default=0, server_default="0")      # day total
+    sleep_entries = Column(Integer, nullable=False, default=0, server_default="0")
+    workout_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # mood histogram, one column per MOOD_MAP level
+    mood_1 = Column(Integer, nullable=False, default=0, server_default="0")
+    mood_2 = Column(Integer, nullable=False, default=0, server_default="0")
+    mood_3 = Column(Integer, nullable=False, default=0, server_default="0")
+    mood_4 = Column(Integer, nullable=False, default=0, server_default="0")
+    mood_5 = Column(Integer, nullable=False, default=0, server_default="0")
+
+# -------------------- ROLLING STATS --------------------
+class RollingStats(Base):
+    # sums over the 7 and 30 days ending at as_of, the user's latest entry
+    # day, plus workout streaks; kept by backend/rolling.py
+    __tablename__ = "rolling_stats"
+
+    user_id = Column(
+        Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True
+    )
+    as_of = Column(Date, nullable=False)
+
+    calories_in_7 = Column(Integer, nullable=False, default=0, server_default="0")
+    calories_burned_7 = Column(Integer, nullable=False, default=0, server_default="0")
+    sleep_hours_7 = Column(Float, nullable=False, default=0, server_default="0")
+    sleep_entries_7 = Column(Integer, nullable=False, default=0, server_default="0")
+    workout_count_7 = Column(Integer, nullable=False, default=0, server_default="0")
+    mood_sum_7 = Column(Integer, nullable=False, default=0, server_default="0")
+    mood_entries_7 = Column(Integer, nullable=False, default=0, server_default="0")
+
+    calories_in_30 = Column(Integer, nullable=False, default=0, server_default="0")
+    calories_burned_30 = Column(Integer, nullable=False, default=0, server_default="0")
+    sleep_hours_30 = Column(Float, nullable=False, default=0, server_default="0")
+    sleep_entries_30 = Column(Integer, nullable=False, default=0, server_default="0")
+    workout_count_30 = Column(Integer, nullable=False, default=0, server_default="0")
+    mood_sum_30 = Column(Integer, nullable=False, default=0, server_default="0")
+    mood_entries_30 = Column(Integer, nullable=False, default=0, server_default="0")
+
+    current_streak = Column(Integer, nullable=False, default=0, server_default="0")
+    longest_streak = Column(Integer, nullable=False, default=0, server_default="0")
+    last_workout_date = Column(Date, nullable=True)
+
+# -------------------- CATALOG --------------------
+class CatalogItem(Base):
+    __tablename__ = "catalog_items"
+
+    item_id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)                 # "food" | "workout"
+    name = Column(String, nullable=False)
+    calories = Column(Integer, nullable=False)            # per serving / per session
+    serving_unit = Column(String, nullable=False, default="serving", server_default="serving")
+    updated_at = Column(
+        DateTime(timezone=True), nullable=False,
+        server_default=func.now(), onupdate=func.now()
+    )
+
+    synonyms = relationship("CatalogSynonym", back_populates="item", cascade="all, delete")
+
+    __table_args__ = (
+        UniqueConstraint("kind", "name", name="uq_catalog_items_kind_name"),
+    )
+
+class CatalogSynonym(Base):
+    __tablename__ = "catalog_synonyms"
+
+    synonym_id = Column(Integer, primary_key=True)
+    item_id = Column(
+        Integer, ForeignKey("catalog_items.item_id", ondelete="CASCADE"), nullable=False
+    )
+    name = Column(String, nullable=False)
+
+    item = relationship("CatalogItem", back_populates="synonyms")
+
+    __table_args__ = (
+        UniqueConstraint("item_id", "name", name="uq_catalog_synonyms_item_name"),
+    )
+
+class CatalogMeta(Base):
+    # single row; a trigger bumps `version` on any catalog change so workers
+    # know when to rebuild their in-memory index
+    __tablename__ = "catalog_meta"
+
+    id = Column(Boolean, primary_key=True, default=True)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+# -------------------- WRITE-BEHIND --------------------
+class IngestCheckpoint(Base):
+    # highest journal sequence number already in the database, written in the
+    # same transaction as the entries, see backend/writebehind.py
+    __tablename__ = "ingest_checkpoints"
+
+    journal = Column(String, primary_key=True)
+    seq = Column(BigInteger, nullable=False)
+    updated_at = Column(
+        DateTime(timezone=True), nullable=False,
+        server_default=func.now(), onupdate=func.now()
+    )
+
+# -------------------- REPORTS --------------------
+class Report(Base):
+    # one row per user and week / month, written by backend/build_reports.py
+    __tablename__ = "reports"
+
+    user_id = Column(
+        Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True
+    )
+    period = Column(String, primary_key=True)             # "week" | "month"
+    period_start = Column(Date, primary_key=True)         # Monday / 1st of the month
+
+    days_logged = Column(Integer, nullable=False)
+    calories_in = Column(Integer, nullable=False)
+    calories_burned = Column(Integer, nullable=False)
+    calorie_balance = Column(Integer, nullable=False)     # in - burned
+
+    avg_sleep_hours = Column(Float, nullable=True)
+    sleep_poor = Column(Integer, nullable=False)
+    sleep_fair = Column(Integer, nullable=False)
+    sleep_good = Column(Integer, nullable=False)
+    sleep_excellent = Column(Integer, nullable=False)
+    sleep_other = Column(Integer, nullable=False)
+
+    workout_minutes = Column(Integer, nullable=False)
+    workout_minutes_by_type = Column(JSONB, nullable=False)
+
+    avg_mood = Column(Float, nullable=True)
+    mood_trend = Column(Float, nullable=True)             # least-squares slope, mood points per day
+
+    computed_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+class ReportRun(Base):
+    __tablename__ = "report_runs"
+
+    run_id = Column(Integer, primary_key=True)
+    since = Column(Date, nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+class ReportShard(Base):
+    # a shard is marked done in the same transaction that writes its reports,
+    # so a crashed run resumes with exactly the shards that are missing
+    __tablename__ = "report_shards"
+
+    run_id = Column(
+        Integer, ForeignKey("report_runs.run_id", ondelete="CASCADE"), primary_key=True
+    )
+    shard = Column(Integer, primary_key=True)
+    first_user_id = Column(Integer, nullable=False)
+    last_user_id = Column(Integer, nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,195 @@
+import os
+import re
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+# -------------------- SETTINGS --------------------
+# fact table -> id column; all are range partitioned by month on `date`
+PARTITIONED_TABLES = {
+    "calories": "calorie_id",
+    "sleep": "sleep_id",
+    "workouts": "workout_id",
+    "moods": "mood_id",
+}
+
+MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+RETENTION_MONTHS = int(os.getenv("RETENTION_MONTHS", "0"))     # 0 keeps everything
+RETENTION_MODE = os.getenv("RETENTION_MODE", "archive")         # detach | archive | drop
+ARCHIVE_SCHEMA = "archive"
+
+# any constant works, it only has to be the same for every maintenance run
+PARTITION_LOCK_ID = 720_432
+
+
+# -------------------- MONTHS --------------------
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    years, index = divmod(month.month - 1 + months, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def partition_month(table: str, name: str):
+    match = re.fullmatch(rf"{table}_p(\d{{4}})(\d{{2}})", name)
+    return date(int(match[1]), int(match[2]), 1) if match else None
+
+
+# -------------------- PARTITIONS --------------------
+def is_partitioned(conn: Connection, table: str) -> bool:
+    return conn.execute(
+        text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:t)"), {"t": table}
+    ).scalar() or False
+
+
+def list_partitions(conn: Connection, table: str) -> list:
+    return conn.execute(text("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:t)
+        ORDER BY c.relname
+    """), {"t": table}).scalars().all()
+
+
+def create_partition(conn: Connection, table: str, month: date) -> bool:
+    """Attach the partition for `month`, moving its rows out of the default one."""
+    name = partition_name(table, month)
+    if conn.execute(text("SELECT to_regclass(:n)"), {"n": name}).scalar():
+        return False
+
+    low, high = month, add_months(month, 1)
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"))
+    # a matching CHECK lets ATTACH skip scanning the new table
+    conn.execute(text(
+        f"ALTER TABLE {name} ADD CONSTRAINT {name}_range "
+        f"CHECK (date >= '{low}' AND date < '{high}')"
+    ))
+    conn.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {table}_default WHERE date >= :low AND date < :high RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """), {"low": low, "high": high})
+    conn.execute(text(
+        f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{low}') TO ('{high}')"
+    ))
+    conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {name}_range"))
+    return True
+
+
+def ensure_partitions(conn: Connection, months_ahead: int = MONTHS_AHEAD, today: date = None) -> list:
+    """Partitions for last month through `months_ahead` months from now.
+
+    Rows for any other month land in <table>_default; each run also gives
+    such months their own partition, so the default one stays small.
+    """
+    conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": PARTITION_LOCK_ID})
+    this_month = month_start(today or date.today())
+    created = []
+
+    for table in PARTITIONED_TABLES:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+
+        months = {add_months(this_month, n) for n in range(-1, months_ahead + 1)}
+        months.update(conn.execute(text(
+            f"SELECT DISTINCT date_trunc('month', date)::date FROM {table}_default"
+        )).scalars())
+
+        for month in sorted(months):
+            if create_partition(conn, table, month):
+                created.append(partition_name(table, month))
+
+    return created
+
+
+def apply_retention(
+    conn: Connection,
+    keep_months: int = RETENTION_MONTHS,
+    mode: str = RETENTION_MODE,
+    today: date = None
+) -> list:
+    """Detach partitions older than `keep_months` whole months.
+
+    mode "detach" leaves them as plain tables, "archive" moves them to the
+    archive schema and "drop" deletes them. daily_summary is left alone, so
+    dashboards keep the history; a summary rebuild only sees retained rows.
+    """
+    if keep_months <= 0:
+        return []
+    if mode not in ("detach", "archive", "drop"):
+        raise ValueError(f"Unknown retention mode: {mode}")
+
+    conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": PARTITION_LOCK_ID})
+    cutoff = add_months(month_start(today or date.today()), -keep_months)
+    if mode == "archive":
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+
+    retired = []
+    for table in PARTITIONED_TABLES:
+        for name in list_partitions(conn, table):
+            month = partition_month(table, name)
+            if month is None or add_months(month, 1) > cutoff:
+                continue
+
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            if mode == "archive":
+                conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+            elif mode == "drop":
+                conn.execute(text(f"DROP TABLE {name}"))
+            retired.append(name)
+
+    return retired
+
+
+# -------------------- CONVERSION --------------------
+def partition_table(conn: Connection, table: str, months_ahead: int = MONTHS_AHEAD) -> None:
+    """Rebuild a plain fact table as a monthly partitioned one, keeping its rows.
+
+    Takes an exclusive lock for the duration of the copy, so run it in a
+    maintenance window on large tables.
+    """
+    id_column = PARTITIONED_TABLES[table]
+    new = f"{table}_partitioned"
+    sequence = conn.execute(
+        text("SELECT pg_get_serial_sequence(:t, :c)"), {"t": table, "c": id_column}
+    ).scalar()
+
+    conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f"CREATE TABLE {new} (LIKE {table} INCLUDING DEFAULTS) PARTITION BY RANGE (date)"))
+    # the partition key has to be part of the primary key
+    conn.execute(text(f"ALTER TABLE {new} ADD CONSTRAINT {new}_pkey PRIMARY KEY ({id_column}, date)"))
+    conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {new} DEFAULT"))
+
+    this_month = month_start(date.today())
+    months = {add_months(this_month, n) for n in range(-1, months_ahead + 1)}
+    months.update(conn.execute(text(
+        f"SELECT DISTINCT date_trunc('month', date)::date FROM {table}"
+    )).scalars())
+    for month in sorted(months):
+        conn.execute(text(
+            f"CREATE TABLE {partition_name(table, month)} PARTITION OF {new} "
+            f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+        ))
+
+    conn.execute(text(f"INSERT INTO {new} SELECT * FROM {table}"))
+
+    # the id sequence belongs to the old table and would be dropped with it
+    conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+    conn.execute(text(f"DROP TABLE {table}"))
+    conn.execute(text(f"ALTER TABLE {new} RENAME TO {table}"))
+    conn.execute(text(f"ALTER TABLE {table} RENAME CONSTRAINT {new}_pkey TO {table}_pkey"))
+    conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.{id_column}"))
+
+    conn.execute(text(f"""
+        ALTER TABLE {table} ADD CONSTRAINT {table}_user_id_fkey
+        FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+    """))
+    conn.execute(text(f"CREATE INDEX ix_{table}_user_id_date ON {table} (user_id, date)"))
+    conn.execute(text(f"CREATE INDEX ix_{table}_{id_column} ON {table} ({id_column})"))
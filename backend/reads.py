@@ -0,0 +1,225 @@
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend.downsample import MAX_POINTS, bucket_sql, lttb, pick_resolution
+
+
+# -------------------- USERS --------------------
+def lookup_user_version(db: Session, name: str):
+    """(user_id, data_version) for `name`, or None. Never creates a user."""
+    row = db.execute(text("""
+        SELECT user_id, data_version FROM users
+        WHERE lower(name) = lower(:name)
+        ORDER BY user_id
+        LIMIT 1
+    """), {"name": name}).first()
+    return tuple(row) if row else None
+
+
+# whether pg_trgm is installed; looked up once per process
+_trigram_search = None
+
+
+def has_trigram_search(db: Session) -> bool:
+    global _trigram_search
+    if _trigram_search is None:
+        _trigram_search = db.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        ).first() is not None
+    return _trigram_search
+
+
+def search_users(db: Session, query: str, limit: int = 10) -> list:
+    """Users for an autocomplete box: exact name, then prefix, then similar names.
+
+    Both the LIKE and the `%` (similarity) filter are served by the trigram
+    index of migration 10; without pg_trgm only prefix matches are found,
+    through the text_pattern_ops index instead.
+    """
+    term = " ".join(query.lower().split())
+    # "_" and "%" in a name are literal characters, not wildcards
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    params = {"term": term, "prefix": f"{escaped}%", "limit": limit}
+    if has_trigram_search(db):
+        sql = """
+            SELECT user_id, name FROM users
+            WHERE lower(name) LIKE :prefix ESCAPE '\\' OR lower(name) % :term
+            ORDER BY lower(name) = :term DESC, lower(name) LIKE :prefix ESCAPE '\\' DESC,
+                     similarity(lower(name), :term) DESC, name
+            LIMIT :limit
+        """
+    else:
+        sql = """
+            SELECT user_id, name FROM users
+            WHERE lower(name) LIKE :prefix ESCAPE '\\'
+            ORDER BY lower(name) = :term DESC, lower(name)
+            LIMIT :limit
+        """
+    return [dict(row) for row in db.execute(text(sql), params).mappings()]
+
+
+def version_of(db: Session, user_id: int) -> int:
+    return db.execute(
+        text("SELECT data_version FROM users WHERE user_id = :u"), {"u": user_id}
+    ).scalar_one()
+
+
+# -------------------- QUERIES --------------------
+def _date_filter(start: Optional[date], end: Optional[date], params: dict) -> str:
+    clause = ""
+    if start is not None:
+        clause += " AND date >= :start"
+        params["start"] = start
+    if end is not None:
+        clause += " AND date <= :end"
+        params["end"] = end
+    return clause
+
+
+WORKOUTS_JOIN = "workouts JOIN catalog_items ON catalog_items.item_id = workouts.workout_item_id"
+
+# metric -> (source table, value columns, extra WHERE); rows come back by date
+TIMESERIES = {
+    "calories": ("daily_summary", ("calories_in",), " AND calories_in > 0"),
+    "calories_burned": ("daily_summary", ("calories_burned",), " AND workout_count > 0"),
+    "sleep": ("sleep JOIN sleep_qualities USING (quality_id)", ("sleep_hours", "sleep_quality"), ""),
+    "workouts": (WORKOUTS_JOIN, ("workout_type", "duration", "calories_burned"), ""),
+    "moods": ("moods", ("mood_level",), ""),
+}
+
+# the fact tables store ids; names come from the dimension tables.
+# moods.mood_level is text until migration 12 runs, the cast is a no-op after
+COLUMN_SQL = {
+    "sleep_quality": "sleep_qualities.name AS sleep_quality",
+    "workout_type": "catalog_items.name AS workout_type",
+    "mood_level": "CAST(mood_level AS smallint) AS mood_level",
+}
+
+# week/month buckets: metric -> (source table, column -> aggregate, extra WHERE, extra GROUP BY)
+BUCKETED = {
+    "calories": ("daily_summary", {"calories_in": "SUM(calories_in)"}, " AND calories_in > 0", ()),
+    "calories_burned": (
+        "daily_summary", {"calories_burned": "SUM(calories_burned)"}, " AND workout_count > 0", ()
+    ),
+    "sleep": (
+        "daily_summary", {"sleep_hours": "SUM(sleep_hours) / SUM(sleep_entries)"},
+        " AND sleep_entries > 0", ()
+    ),
+    "workouts": (
+        WORKOUTS_JOIN, {"duration": "SUM(duration)", "calories_burned": "SUM(calories_burned)"},
+        "", ("workout_type",)
+    ),
+    "moods": ("moods", {"mood_level": "AVG(CAST(mood_level AS smallint))::float"}, "", ()),
+}
+
+# day-resolution series longer than MAX_POINTS are thinned with LTTB on
+# this column: metric -> y column
+POINT_SERIES = {
+    "calories": "calories_in",
+    "calories_burned": "calories_burned",
+    "sleep": "sleep_hours",
+    "workouts": "calories_burned",
+    "moods": "mood_level",
+}
+
+
+def fetch_summary(db: Session, user_id: int, start: Optional[date], end: Optional[date]) -> dict:
+    params = {"u": user_id}
+    where = _date_filter(start, end, params)
+
+    row = db.execute(text(f"""
+        SELECT COUNT(*) AS days,
+               COALESCE(SUM(calories_in), 0) AS calories_in,
+               COALESCE(SUM(calories_burned), 0) AS calories_burned,
+               COALESCE(SUM(sleep_hours) / NULLIF(SUM(sleep_entries), 0), 0) AS avg_sleep_hours,
+               COALESCE(SUM(workout_count), 0) AS workout_count,
+               COALESCE(SUM(mood_1), 0) AS mood_1, COALESCE(SUM(mood_2), 0) AS mood_2,
+               COALESCE(SUM(mood_3), 0) AS mood_3, COALESCE(SUM(mood_4), 0) AS mood_4,
+               COALESCE(SUM(mood_5), 0) AS mood_5
+        FROM daily_summary
+        WHERE user_id = :u{where}
+    """), params).mappings().one()
+
+    summary = {key: row[key] for key in (
+        "days", "calories_in", "calories_burned", "avg_sleep_hours", "workout_count"
+    )}
+    summary["avg_sleep_hours"] = round(float(summary["avg_sleep_hours"]), 2)
+    summary["moods"] = {str(level): row[f"mood_{level}"] for level in range(1, 6)}
+    return summary
+
+
+def date_range(db: Session, user_id: int) -> tuple:
+    row = db.execute(text(
+        "SELECT MIN(date), MAX(date) FROM daily_summary WHERE user_id = :u"
+    ), {"u": user_id}).one()
+    return row[0], row[1]
+
+
+def resolve_resolution(
+    db: Session, user_id: int, resolution: str, start: Optional[date], end: Optional[date]
+) -> str:
+    if resolution != "auto":
+        return resolution
+    if start is None or end is None:
+        first, last = date_range(db, user_id)
+        start, end = start or first, end or last
+    return pick_resolution(start, end)
+
+
+def fetch_timeseries(
+    db: Session,
+    user_id: int,
+    metric: str,
+    start: Optional[date],
+    end: Optional[date],
+    resolution: str = "day"
+) -> dict:
+    """Columnar series: {"resolution": ..., "date": [...], "<column>": [...], ...}.
+
+    "day" returns the stored rows, thinned to MAX_POINTS with LTTB;
+    "week"/"month" aggregate in SQL; "auto" picks from the range.
+    """
+    resolution = resolve_resolution(db, user_id, resolution, start, end)
+    params = {"u": user_id}
+    where = _date_filter(start, end, params)
+
+    if resolution == "day":
+        table, columns, extra = TIMESERIES[metric]
+        select_sql = ", ".join(COLUMN_SQL.get(c, c) for c in columns)
+        sql = f"""
+            SELECT date, {select_sql}
+            FROM {table}
+            WHERE user_id = :u{where}{extra}
+            ORDER BY date
+        """
+    else:
+        table, aggregates, extra, group_by = BUCKETED[metric]
+        columns = group_by + tuple(aggregates)
+        # grouped by position: a name could mean a fact table column, like
+        # workouts.workout_type before migration 12
+        select_sql = ", ".join(
+            tuple(COLUMN_SQL.get(c, c) for c in group_by)
+            + tuple(f"{agg} AS {c}" for c, agg in aggregates.items())
+        )
+        sql = f"""
+            SELECT {bucket_sql(resolution)} AS bucket, {select_sql}
+            FROM {table}
+            WHERE user_id = :u{where}{extra}
+            GROUP BY {", ".join(str(i) for i in range(1, len(group_by) + 2))}
+            ORDER BY bucket
+        """
+
+    rows = db.execute(text(sql), params).all()
+
+    if resolution == "day" and len(rows) > MAX_POINTS:
+        y = columns.index(POINT_SERIES[metric]) + 1
+        keep = lttb([row[0].toordinal() for row in rows], [float(row[y]) for row in rows])
+        rows = [rows[i] for i in keep]
+
+    series = {"resolution": resolution, "date": [row[0].isoformat() for row in rows]}
+    for i, column in enumerate(columns, 1):
+        series[column] = [row[i] for row in rows]
+    return series
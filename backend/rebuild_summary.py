@@ -0,0 +1,34 @@
+import argparse
+
+from backend.database import SessionLocal
+from backend.models import User
+from backend.response_cache import RESPONSE_CACHE
+from backend.rolling import rebuild as rebuild_rolling
+from backend.summary import rebuild
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute daily_summary and rolling_stats from the raw tables")
+    parser.add_argument("--user", help="only rebuild this user (default: everyone)")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        user_id = None
+        if args.user:
+            user = db.query(User).filter(User.name.ilike(args.user)).first()
+            if user is None:
+                raise SystemExit(f"❌ User not found: {args.user}")
+            user_id = user.user_id
+
+        rows = rebuild(db, user_id)
+        # rolling stats derive from daily_summary; same transaction
+        users = rebuild_rolling(db, None if user_id is None else [user_id])
+        db.commit()
+
+    # the rebuild bumped every data version it touched, so no cached read is
+    # served again; this only frees the shared cache's old entries early
+    if user_id is None:
+        RESPONSE_CACHE.clear()
+    else:
+        RESPONSE_CACHE.invalidate_user(user_id)
+
+    print(f"✅ Rebuilt {rows} daily summary rows and the rolling stats of {users} users")
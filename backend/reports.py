@@ -0,0 +1,202 @@
+import io
+import json
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend.importer import copy_csv
+from backend.ingest import MOOD_MAP, SLEEP_QUALITY_MAP
+
+
+# -------------------- SETTINGS --------------------
+PERIODS = ("week", "month")
+
+# sleep_qualities ids counted on their own; any other id is sleep_other
+SLEEP_QUALITIES = ("Poor", "Fair", "Good", "Excellent")
+
+REPORT_COLUMNS = (
+    "user_id", "period", "period_start", "days_logged",
+    "calories_in", "calories_burned", "calorie_balance",
+    "avg_sleep_hours", "sleep_poor", "sleep_fair", "sleep_good", "sleep_excellent", "sleep_other",
+    "workout_minutes", "workout_minutes_by_type",
+    "avg_mood", "mood_trend",
+)
+
+MOOD_COLUMNS = [f"mood_{level}" for level in sorted(MOOD_MAP.values())]
+
+
+def period_bounds(since: date) -> dict:
+    """First period start to (re)compute for each period type."""
+    return {
+        "week": since - timedelta(days=since.weekday()),
+        "month": since.replace(day=1),
+    }
+
+
+# -------------------- LOADING --------------------
+def copy_frame(db: Session, sql: str, params: dict) -> pd.DataFrame:
+    """Run a SELECT through COPY TO STDOUT and parse it with pandas."""
+    cursor = db.connection().connection.cursor()
+    try:
+        query = cursor.mogrify(sql, params).decode()
+        buf = io.StringIO()
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", buf)
+    finally:
+        cursor.close()
+    buf.seek(0)
+    frame = pd.read_csv(buf)
+    # also types the column when the result is empty
+    frame["date"] = pd.to_datetime(frame["date"])
+    return frame
+
+
+def load_shard(db: Session, first_user_id: int, last_user_id: int, start: date) -> dict:
+    params = {"first": first_user_id, "last": last_user_id, "start": start}
+    where = "user_id BETWEEN %(first)s AND %(last)s AND date >= %(start)s"
+    return {
+        # calorie totals, sleep hours and the mood histogram are already per day
+        "days": copy_frame(db, f"""
+            SELECT user_id, date, calories_in, calories_burned, sleep_hours, sleep_entries,
+                   {", ".join(MOOD_COLUMNS)}
+            FROM daily_summary WHERE {where}
+        """, params),
+        "sleep": copy_frame(db, f"SELECT user_id, date, quality_id FROM sleep WHERE {where}", params),
+        "workouts": copy_frame(
+            db, f"SELECT user_id, date, workout_item_id, duration FROM workouts WHERE {where}", params
+        ),
+        "workout_names": dict(db.execute(text(
+            "SELECT item_id, name FROM catalog_items WHERE kind = 'workout'"
+        )).all()),
+    }
+
+
+# -------------------- AGGREGATION --------------------
+def period_start(dates: pd.Series, period: str) -> pd.Series:
+    if period == "week":
+        return dates - pd.to_timedelta(dates.dt.weekday, unit="D")
+    return dates.dt.to_period("M").dt.start_time
+
+
+def aggregate(frames: dict, period: str, first_start: date) -> pd.DataFrame:
+    """Reports for one period type, one row per (user_id, period_start).
+
+    Everything is a groupby over whole columns; the only Python loop is
+    over the already aggregated workout minutes, to build the JSON maps.
+    """
+    keys = ["user_id", "period_start"]
+    days = frames["days"].copy()
+    if days.empty:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    days["period_start"] = period_start(days["date"], period)
+
+    # daily mean mood from the histogram, then a least-squares slope per
+    # period: (n*Sxy - Sx*Sy) / (n*Sxx - Sx^2) with x = day in the period
+    levels = np.array([int(c.split("_")[1]) for c in MOOD_COLUMNS], dtype=float)
+    counts = days[MOOD_COLUMNS].to_numpy(dtype=float)
+    entries = counts.sum(axis=1)
+    days["mood_sum"] = counts @ levels
+    days["mood_entries"] = entries
+    has_mood = entries > 0
+    y = np.divide(days["mood_sum"], entries, out=np.zeros(len(days)), where=has_mood)
+    x = (days["date"] - days["period_start"]).dt.days.to_numpy(dtype=float)
+    days["n"] = has_mood.astype(float)
+    days["sx"] = np.where(has_mood, x, 0)
+    days["sy"] = np.where(has_mood, y, 0)
+    days["sxx"] = np.where(has_mood, x * x, 0)
+    days["sxy"] = np.where(has_mood, x * y, 0)
+
+    report = days.groupby(keys).agg(
+        days_logged=("date", "size"),
+        calories_in=("calories_in", "sum"),
+        calories_burned=("calories_burned", "sum"),
+        sleep_hours=("sleep_hours", "sum"),
+        sleep_entries=("sleep_entries", "sum"),
+        mood_sum=("mood_sum", "sum"),
+        mood_entries=("mood_entries", "sum"),
+        n=("n", "sum"), sx=("sx", "sum"), sy=("sy", "sum"), sxx=("sxx", "sum"), sxy=("sxy", "sum"),
+    )
+    report["calorie_balance"] = report["calories_in"] - report["calories_burned"]
+    report["avg_sleep_hours"] = (report["sleep_hours"] / report["sleep_entries"]).where(
+        report["sleep_entries"] > 0
+    ).round(2)
+    report["avg_mood"] = (report["mood_sum"] / report["mood_entries"]).where(
+        report["mood_entries"] > 0
+    ).round(2)
+    denominator = report["n"] * report["sxx"] - report["sx"] ** 2
+    report["mood_trend"] = (
+        (report["n"] * report["sxy"] - report["sx"] * report["sy"]) / denominator
+    ).where(denominator > 0).round(4)
+
+    sleep = frames["sleep"]
+    quality = sleep["quality_id"].map({SLEEP_QUALITY_MAP[name]: name for name in SLEEP_QUALITIES})
+    mix = sleep.assign(
+        period_start=period_start(sleep["date"], period),
+        quality=quality.fillna("Other")
+    ).groupby(keys + ["quality"]).size().unstack(fill_value=0)
+    for name in (*SLEEP_QUALITIES, "Other"):
+        report[f"sleep_{name.lower()}"] = mix[name] if name in mix else 0
+
+    workouts = frames["workouts"]
+    minutes = workouts.groupby(
+        [workouts["user_id"], period_start(workouts["date"], period).rename("period_start"),
+         workouts["workout_item_id"]]
+    )["duration"].sum()
+    report["workout_minutes"] = minutes.groupby(level=[0, 1]).sum()
+    names = frames["workout_names"]
+    by_type = {}
+    for (user_id, start, item_id), total in minutes.items():
+        by_type.setdefault((user_id, start), {})[names.get(item_id, str(item_id))] = int(total)
+    report["workout_minutes_by_type"] = [
+        json.dumps(by_type.get(key, {}), sort_keys=True) for key in report.index
+    ]
+
+    report = report.reset_index()
+    report = report[report["period_start"] >= pd.Timestamp(first_start)]
+    report["period"] = period
+    report["period_start"] = report["period_start"].dt.date
+
+    counts = ["calories_in", "calories_burned", "calorie_balance", "workout_minutes",
+              *(f"sleep_{name.lower()}" for name in (*SLEEP_QUALITIES, "Other"))]
+    report[counts] = report[counts].fillna(0).astype(int)
+    return report[list(REPORT_COLUMNS)]
+
+
+# -------------------- WRITING --------------------
+def write_reports(db: Session, first_user_id: int, last_user_id: int, since: date, reports: list) -> int:
+    """Replace the shard's reports from `since` on; the caller commits."""
+    bounds = period_bounds(since)
+    db.execute(text("""
+        DELETE FROM reports
+        WHERE user_id BETWEEN :first AND :last
+          AND ((period = 'week' AND period_start >= :week) OR (period = 'month' AND period_start >= :month))
+    """), {"first": first_user_id, "last": last_user_id, **bounds})
+
+    rows = 0
+    for frame in reports:
+        buf = io.StringIO()
+        frame.to_csv(buf, header=False, index=False)
+        copy_csv(db, "reports", REPORT_COLUMNS, buf)
+        rows += len(frame)
+    return rows
+
+
+def build_shard(db: Session, first_user_id: int, last_user_id: int, since: date) -> int:
+    bounds = period_bounds(since)
+    frames = load_shard(db, first_user_id, last_user_id, min(bounds.values()))
+    reports = [aggregate(frames, period, bounds[period]) for period in PERIODS]
+    return write_reports(db, first_user_id, last_user_id, since, reports)
+
+
+# -------------------- READING --------------------
+def fetch_reports(db: Session, user_id: int, period: str, limit: int) -> list:
+    rows = db.execute(text(f"""
+        SELECT {", ".join(REPORT_COLUMNS[1:])}
+        FROM reports
+        WHERE user_id = :u AND period = :period
+        ORDER BY period_start DESC
+        LIMIT :limit
+    """), {"u": user_id, "period": period, "limit": limit}).mappings().all()
+    return [{**row, "period_start": row["period_start"].isoformat()} for row in rows]
@@ -0,0 +1,414 @@
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+# -------------------- SETTINGS --------------------
+# "local": an LRU per worker; "redis": one cache shared by every worker
+# (RESPONSE_CACHE_URL); "off": no caching
+CACHE_BACKEND = os.getenv("RESPONSE_CACHE", "local")
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "redis://localhost:6379/0")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))   # entries, local only
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+# how long another worker may hold a key's load before we give up waiting
+LOCK_TIMEOUT = 5.0
+LOCK_POLL = 0.02
+
+# entry kind -> cached reads a new entry of that kind changes
+AFFECTED_READS = {
+    "calories": ("summary", "rolling", "calories"),
+    "sleep": ("summary", "rolling", "sleep"),
+    "workouts": ("summary", "rolling", "workouts", "calories_burned"),
+    "moods": ("summary", "rolling", "moods"),
+}
+
+_MISSING = object()
+
+
+# -------------------- KEYS --------------------
+# start / end are ISO dates or "" for an open end; user_id is None for
+# reads that don't belong to a user (the catalog). The version (a user's
+# data_version, the catalog's index version) is part of the name, so a
+# worker whose cache missed an invalidation still can't serve a body that
+# predates the version it reports in the ETag.
+ReadKey = namedtuple("ReadKey", "user_id read start end name")
+
+
+def read_key(user_id, read: str, start=None, end=None, version=None, *params) -> ReadKey:
+    start = start.isoformat() if start else ""
+    end = end.isoformat() if end else ""
+    digest = hashlib.sha1(repr(params).encode()).hexdigest()[:12]
+    return ReadKey(
+        user_id, read, start, end, f"resp:{user_id}:{read}:{start}:{end}:{version}:{digest}"
+    )
+
+
+def covers(start: str, end: str, days: set) -> bool:
+    """Whether a read over [start, end] includes any of `days` (ISO strings)."""
+    return any((not start or start <= day) and (not end or day <= end) for day in days)
+
+
+# -------------------- BACKENDS --------------------
+class LocalBackend:
+    """In-process LRU with TTL, plus an index of keys per (user, read).
+
+    A per-user generation counter, bumped on every invalidation, lets a
+    load that raced with a write skip storing what it read.
+    """
+
+    shared = False
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._index = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str):
+        with self._lock:
+            item = self._data.get(name)
+            if item is None:
+                return _MISSING
+            key, value, expires_at = item
+            if expires_at <= time.monotonic():
+                self._drop(name)
+                return _MISSING
+            self._data.move_to_end(name)
+            return value
+
+    def generation(self, user_id) -> int:
+        return self._generations.get(user_id, 0)
+
+    def store(self, key: ReadKey, value, generation) -> bool:
+        with self._lock:
+            if key.user_id is not None and self._generations.get(key.user_id, 0) != generation:
+                return False
+            self._drop(key.name)
+            self._data[key.name] = (key, value, time.monotonic() + self.ttl)
+            self._index.setdefault((key.user_id, key.read), set()).add(key.name)
+            while len(self._data) > self.maxsize:
+                self._drop(next(iter(self._data)))
+            return True
+
+    def invalidate(self, user_id, reads, days: set) -> int:
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            dropped = 0
+            for read in reads:
+                for name in list(self._index.get((user_id, read), ())):
+                    key = self._data[name][0]
+                    if days is None or covers(key.start, key.end, days):
+                        self._drop(name)
+                        dropped += 1
+            return dropped
+
+    def _drop(self, name: str) -> None:
+        item = self._data.pop(name, None)
+        if item is not None:
+            key = item[0]
+            names = self._index.get((key.user_id, key.read))
+            names.discard(name)
+            if not names:
+                del self._index[(key.user_id, key.read)]
+
+    # coalescing across workers is moot with one cache per worker
+    def acquire(self, name: str):
+        return True
+
+    def release(self, name: str, token) -> None:
+        pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._index.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisBackend:
+    """The same operations on a Redis server, shared by all workers.
+
+    Values are JSON under their key name; each (user, read) has a hash of
+    key name -> "start|end" so an invalidation finds the keys a date falls
+    into, and gen:<user_id> is the generation counter.
+    """
+
+    shared = True
+
+    def __init__(self, url: str = RESPONSE_CACHE_URL, ttl: float = RESPONSE_CACHE_TTL):
+        import redis   # only needed for RESPONSE_CACHE=redis
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.ttl = int(ttl)
+        self._watch_error = redis.WatchError
+
+    def get(self, name: str):
+        value = self.client.get(name)
+        return _MISSING if value is None else json.loads(value)
+
+    def generation(self, user_id):
+        return self.client.get(f"gen:{user_id}")
+
+    def store(self, key: ReadKey, value, generation) -> bool:
+        data = json.dumps(value)
+        index = f"idx:{key.user_id}:{key.read}"
+        with self.client.pipeline() as pipe:
+            try:
+                if key.user_id is not None:
+                    pipe.watch(f"gen:{key.user_id}")
+                    if pipe.get(f"gen:{key.user_id}") != generation:
+                        return False
+                pipe.multi()
+                pipe.set(key.name, data, ex=self.ttl)
+                if key.user_id is not None:
+                    pipe.hset(index, key.name, f"{key.start}|{key.end}")
+                    pipe.expire(index, self.ttl)
+                pipe.execute()
+                return True
+            except self._watch_error:
+                # invalidated while we were storing
+                return False
+
+    def invalidate(self, user_id, reads, days: set) -> int:
+        self.client.incr(f"gen:{user_id}")
+        self.client.expire(f"gen:{user_id}", self.ttl + int(LOCK_TIMEOUT))
+        dropped = 0
+        for read in reads:
+            index = f"idx:{user_id}:{read}"
+            names = [
+                name for name, bounds in self.client.hgetall(index).items()
+                if days is None or covers(*bounds.split("|"), days)
+            ]
+            if names:
+                self.client.delete(*names)
+                self.client.hdel(index, *names)
+                dropped += len(names)
+        return dropped
+
+    def acquire(self, name: str):
+        token = uuid.uuid4().hex
+        if self.client.set(f"lock:{name}", token, nx=True, px=int(LOCK_TIMEOUT * 1000)):
+            return token
+        return None
+
+    def release(self, name: str, token) -> None:
+        if self.client.get(f"lock:{name}") == token:
+            self.client.delete(f"lock:{name}")
+
+    def locked(self, name: str) -> bool:
+        return bool(self.client.exists(f"lock:{name}"))
+
+    def clear(self) -> None:
+        for pattern in ("resp:*", "idx:*", "gen:*", "lock:*"):
+            names = list(self.client.scan_iter(pattern))
+            if names:
+                self.client.delete(*names)
+
+
+# -------------------- RESPONSE CACHE --------------------
+class ResponseCache:
+    """Read results cached until a write touches the user, read and date.
+
+    Concurrent misses on one key share a single load inside a worker (one
+    task, awaited by everyone), and with a shared backend a lock key makes
+    other workers wait for that result too instead of querying themselves.
+    A shared backend's invalidations are sent by a background thread, in
+    order, so a commit never waits on Redis.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._inflight = {}
+        self._pending = queue.Queue()
+        self._sender = None
+        self._sender_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidated = 0
+        self.errors = 0
+        self.last_error = None
+
+    async def _call(self, fn, *args):
+        # Redis calls block; keep them off the event loop
+        if self.backend.shared:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def get_or_load(self, key: ReadKey, load):
+        """The cached value for `key`, or the result of `await load()`."""
+        if self.backend is None:
+            return await load()
+
+        try:
+            value = await self._call(self.backend.get, key.name)
+        except Exception as exc:
+            # an unreachable shared cache only costs the query
+            self._failed(exc)
+            return await load()
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key.name)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fill(key, load))
+            self._inflight[key.name] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key.name, None))
+        else:
+            self.coalesced += 1
+        # shielded: one caller going away doesn't cancel everyone's load
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: ReadKey, load):
+        generation = await self._call(self.backend.generation, key.user_id)
+        token = await self._call(self.backend.acquire, key.name)
+        if token is None:
+            value = await self._wait(key.name)
+            if value is not _MISSING:
+                self.coalesced += 1
+                return value
+        try:
+            value = await load()
+            await self._call(self.backend.store, key, value, generation)
+            return value
+        finally:
+            if token is not None:
+                await self._call(self.backend.release, key.name, token)
+
+    async def _wait(self, name: str):
+        """Poll for the value another worker is loading."""
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL)
+            value = await self._call(self.backend.get, name)
+            if value is not _MISSING or not await self._call(self.backend.locked, name):
+                return value
+        return _MISSING
+
+    def invalidate(self, touched: dict) -> None:
+        """Drop the reads changed by {kind: {(user_id, date)}}."""
+        if self.backend is None:
+            return
+        by_user = {}
+        for kind, keys in touched.items():
+            for user_id, day in keys:
+                reads, days = by_user.setdefault(user_id, (set(), set()))
+                reads.update(AFFECTED_READS[kind])
+                days.add(day.isoformat())
+        for user_id, (reads, days) in by_user.items():
+            self._invalidate(user_id, reads, days)
+
+    def invalidate_user(self, user_id: int) -> None:
+        if self.backend is not None:
+            reads = {read for reads in AFFECTED_READS.values() for read in reads}
+            self._invalidate(user_id, reads, None)
+
+    def clear(self) -> None:
+        if self.backend is not None:
+            self.backend.clear()
+
+    def _invalidate(self, user_id, reads, days) -> None:
+        if not self.backend.shared:
+            self._send(user_id, reads, days)
+            return
+        # after_commit also fires inside USE_ASYNC_DB's run_sync, on the
+        # event loop, where blocking Redis round trips would stall every
+        # request. Keys carry the data_version, so reads after the write
+        # miss the old entries even before these deletes land.
+        with self._sender_lock:
+            if self._sender is None:
+                self._sender = threading.Thread(
+                    target=self._send_pending, name="cache-invalidation", daemon=True
+                )
+                self._sender.start()
+        self._pending.put((user_id, reads, days))
+
+    def _send_pending(self) -> None:
+        while True:
+            invalidation = self._pending.get()
+            try:
+                self._send(*invalidation)
+            finally:
+                self._pending.task_done()
+
+    def _send(self, user_id, reads, days) -> None:
+        # runs after the commit: failing here must not fail the write, the
+        # entries then expire after RESPONSE_CACHE_TTL
+        try:
+            self.invalidated += self.backend.invalidate(user_id, reads, days)
+        except Exception as exc:
+            self._failed(exc)
+
+    def wait_for_invalidations(self) -> None:
+        """Block until every queued invalidation has been sent."""
+        self._pending.join()
+
+    def _failed(self, exc: Exception) -> None:
+        self.errors += 1
+        self.last_error = str(exc)
+
+    def stats(self) -> dict:
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidated": self.invalidated,
+            "errors": self.errors,
+            "pending_invalidations": self._pending.qsize(),
+        }
+        # counting a shared cache's keys would mean scanning the server
+        if self.backend is not None and not self.backend.shared:
+            stats["entries"] = len(self.backend)
+        return stats
+
+
+def make_backend(kind: str = CACHE_BACKEND):
+    if kind == "redis":
+        return RedisBackend()
+    if kind == "local":
+        return LocalBackend()
+    return None
+
+
+RESPONSE_CACHE = ResponseCache(make_backend())
+
+
+# -------------------- WRITE-THROUGH INVALIDATION --------------------
+_TOUCHED = "response_cache_touched"
+
+
+def touch(db: Session, kind: str, keys) -> None:
+    """Note (user_id, date) pairs written in `db`'s transaction.
+
+    The matching cache entries are dropped once the transaction commits,
+    and forgotten if it rolls back.
+    """
+    db.info.setdefault(_TOUCHED, {}).setdefault(kind, set()).update(keys)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    touched = session.info.pop(_TOUCHED, None)
+    if touched:
+        RESPONSE_CACHE.invalidate(touched)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session) -> None:
+    session.info.pop(_TOUCHED, None)
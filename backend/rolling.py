@@ -0,0 +1,309 @@
+from datetime import date, timedelta
+
+from sqlalchemy import text, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from backend.ingest import MOOD_MAP
+from backend.models import RollingStats
+
+
+# -------------------- COLUMNS --------------------
+# windows end at the user's latest entry day (as_of) and include it
+WINDOWS = (7, 30)
+
+# summed over each window; the averages are ratios of two of these
+WINDOW_SUMS = (
+    "calories_in", "calories_burned", "sleep_hours", "sleep_entries",
+    "workout_count", "mood_sum", "mood_entries",
+)
+WINDOW_COLUMNS = tuple(f"{column}_{days}" for days in WINDOWS for column in WINDOW_SUMS)
+STREAK_COLUMNS = ("current_streak", "longest_streak", "last_workout_date")
+STATE_COLUMNS = ("as_of", *WINDOW_COLUMNS, *STREAK_COLUMNS)
+
+MOOD_LEVELS = sorted(MOOD_MAP.values())
+
+
+def new_state() -> dict:
+    state = dict.fromkeys(STATE_COLUMNS, 0)
+    state["as_of"] = state["last_workout_date"] = None
+    return state
+
+
+def day_sums(day: dict) -> dict:
+    """A daily_summary row, or the deltas for one, as WINDOW_SUMS."""
+    return {
+        "calories_in": day["calories_in"],
+        "calories_burned": day["calories_burned"],
+        "sleep_hours": day["sleep_hours"],
+        "sleep_entries": day["sleep_entries"],
+        "workout_count": day["workout_count"],
+        "mood_sum": sum(level * day[f"mood_{level}"] for level in MOOD_LEVELS),
+        "mood_entries": sum(day[f"mood_{level}"] for level in MOOD_LEVELS),
+    }
+
+
+def shift(state: dict, window: int, sums: dict, sign: int) -> None:
+    for column in WINDOW_SUMS:
+        state[f"{column}_{window}"] += sign * sums[column]
+
+
+def extend_streak(state: dict, workout_days: list) -> bool:
+    """Advance the streak counters over new workout days, oldest first.
+
+    Returns False for a day before the last workout day: it may join two
+    streaks, which only a recount can tell.
+    """
+    for day in workout_days:
+        last = state["last_workout_date"]
+        if last is not None and day < last:
+            return False
+        if last is not None and day == last:
+            continue
+        if last is not None and day == last + timedelta(days=1):
+            state["current_streak"] += 1
+        else:
+            state["current_streak"] = 1
+        state["last_workout_date"] = day
+        state["longest_streak"] = max(state["longest_streak"], state["current_streak"])
+    return True
+
+
+# -------------------- INCREMENTAL UPDATE --------------------
+def record_days(db: Session, totals: dict) -> None:
+    """Fold {(user_id, date): daily_summary deltas} into rolling_stats.
+
+    Called by summary.record_entries after its upsert, in the same
+    transaction; the users rows it bumped stay locked until commit, so
+    writers for one user take turns here. The work is bounded by the
+    window length, not the history: a day inside a window adds its
+    deltas, and moving a window forward subtracts the daily_summary rows
+    that fall out of it (at most 30 per user). Backdated workout days are
+    the exception and recount that user's streaks.
+    """
+    batch = {}
+    for (user_id, day), deltas in totals.items():
+        batch.setdefault(user_id, {})[day] = day_sums(deltas)
+
+    states = load_states(db, list(batch))
+    ranges = {}
+    for user_id, days in batch.items():
+        old = states[user_id]["as_of"]
+        if old is not None and max(days) > old:
+            # days of the old windows that leave the 30- or the 7-day one
+            ranges[user_id] = (
+                old - timedelta(days=max(WINDOWS) - 1),
+                min(old, max(days) - timedelta(days=min(WINDOWS))),
+            )
+    leaving = load_days(db, ranges)
+
+    recount = []
+    for user_id, days in batch.items():
+        state = states[user_id]
+        old = state["as_of"]
+        new = max(days) if old is None else max(old, max(days))
+        for window in WINDOWS:
+            span = timedelta(days=window)
+            for day, sums in leaving.get(user_id, {}).items():
+                if old - span < day <= new - span:
+                    # daily_summary already holds this batch, which the
+                    # window never counted
+                    shift(state, window, sums, -1)
+                    if day in days:
+                        shift(state, window, days[day], 1)
+            for day, sums in days.items():
+                if new - span < day <= new:
+                    shift(state, window, sums, 1)
+        state["as_of"] = new
+
+        workout_days = sorted(day for day, sums in days.items() if sums["workout_count"] > 0)
+        if not extend_streak(state, workout_days):
+            recount.append(user_id)
+
+    if recount:
+        streaks = load_streaks(db, recount)
+        for user_id in recount:
+            states[user_id].update(streaks[user_id])
+
+    save_states(db, states)
+
+
+def load_states(db: Session, user_ids: list) -> dict:
+    # FOR UPDATE waits out a running rebuild(), which locks the table
+    rows = db.execute(
+        text(f"""
+            SELECT user_id, {", ".join(STATE_COLUMNS)} FROM rolling_stats
+            WHERE user_id IN :users
+            ORDER BY user_id
+            FOR UPDATE
+        """).bindparams(bindparam("users", expanding=True)),
+        {"users": sorted(user_ids)}
+    ).mappings().all()
+    states = {user_id: new_state() for user_id in user_ids}
+    for row in rows:
+        states[row["user_id"]] = {column: row[column] for column in STATE_COLUMNS}
+    return states
+
+
+def load_days(db: Session, ranges: dict) -> dict:
+    """{user_id: {date: WINDOW_SUMS}} of daily_summary within each user's (first, last)."""
+    if not ranges:
+        return {}
+    rows = db.execute(text("""
+        SELECT d.* FROM daily_summary d
+        JOIN unnest(CAST(:users AS integer[]), CAST(:firsts AS date[]), CAST(:lasts AS date[]))
+             AS r(user_id, first_day, last_day)
+          ON d.user_id = r.user_id AND d.date BETWEEN r.first_day AND r.last_day
+    """), {
+        "users": list(ranges),
+        "firsts": [first for first, _ in ranges.values()],
+        "lasts": [last for _, last in ranges.values()],
+    }).mappings().all()
+    days = {}
+    for row in rows:
+        days.setdefault(row["user_id"], {})[row["date"]] = day_sums(row)
+    return days
+
+
+def load_streaks(db: Session, user_ids: list) -> dict:
+    rows = db.execute(
+        text(STREAKS_SQL.format(user_filter="AND user_id IN :users"))
+        .bindparams(bindparam("users", expanding=True)),
+        {"users": user_ids}
+    ).mappings().all()
+    streaks = {user_id: {"current_streak": 0, "longest_streak": 0, "last_workout_date": None}
+               for user_id in user_ids}
+    for row in rows:
+        streaks[row["user_id"]] = {column: row[column] for column in STREAK_COLUMNS}
+    return streaks
+
+
+def save_states(db: Session, states: dict) -> None:
+    stmt = pg_insert(RollingStats).values([
+        {"user_id": user_id, **state} for user_id, state in sorted(states.items())
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[RollingStats.user_id],
+        set_={column: getattr(stmt.excluded, column) for column in STATE_COLUMNS}
+    ))
+
+
+# -------------------- REBUILD --------------------
+# gaps and islands: consecutive workout days share date - row_number()
+STREAKS_SQL = """
+    SELECT DISTINCT ON (user_id)
+           user_id,
+           length AS current_streak,
+           MAX(length) OVER (PARTITION BY user_id) AS longest_streak,
+           last_day AS last_workout_date
+    FROM (
+        SELECT user_id, COUNT(*) AS length, MAX(date) AS last_day
+        FROM (
+            SELECT user_id, date,
+                   date - CAST(ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY date) AS integer) AS island
+            FROM daily_summary
+            WHERE workout_count > 0 {user_filter}
+        ) workout_days
+        GROUP BY user_id, island
+    ) streaks
+    ORDER BY user_id, last_day DESC
+"""
+
+# every window sum of every day in one pass of RANGE frames; each user
+# keeps the row of their latest day
+REBUILD_SQL = f"""
+    WITH days AS (
+        SELECT user_id, date, calories_in, calories_burned, sleep_hours, sleep_entries, workout_count,
+               {" + ".join(f"{level} * mood_{level}" for level in MOOD_LEVELS)} AS mood_sum,
+               {" + ".join(f"mood_{level}" for level in MOOD_LEVELS)} AS mood_entries
+        FROM daily_summary
+        WHERE true {{user_filter}}
+    ), windowed AS (
+        SELECT user_id, date, MAX(date) OVER (PARTITION BY user_id) AS as_of,
+               {", ".join(
+                   f"SUM({column}) OVER last_{days} AS {column}_{days}"
+                   for days in WINDOWS for column in WINDOW_SUMS
+               )}
+        FROM days
+        WINDOW {", ".join(
+            f"last_{days} AS (PARTITION BY user_id ORDER BY date "
+            f"RANGE BETWEEN INTERVAL '{days - 1} days' PRECEDING AND CURRENT ROW)"
+            for days in WINDOWS
+        )}
+    ), streaks AS ({{streaks}})
+    INSERT INTO rolling_stats (user_id, {", ".join(STATE_COLUMNS)})
+    SELECT w.user_id, w.as_of, {", ".join(f"w.{column}" for column in WINDOW_COLUMNS)},
+           COALESCE(s.current_streak, 0), COALESCE(s.longest_streak, 0), s.last_workout_date
+    FROM windowed w
+    LEFT JOIN streaks s ON s.user_id = w.user_id
+    WHERE w.date = w.as_of
+"""
+
+
+def rebuild(db: Session, user_ids: list = None) -> int:
+    """Recompute rolling_stats from daily_summary (everyone, or these users).
+
+    Writers wait in load_states() until this commits, then apply their
+    entries on top of the rebuilt rows.
+    """
+    db.execute(text("LOCK TABLE rolling_stats IN EXCLUSIVE MODE"))
+
+    if user_ids is None:
+        db.execute(text("DELETE FROM rolling_stats"))
+        user_filter = ""
+    else:
+        db.execute(
+            text("DELETE FROM rolling_stats WHERE user_id IN :users")
+            .bindparams(bindparam("users", expanding=True)),
+            {"users": user_ids}
+        )
+        user_filter = "AND user_id IN :users"
+
+    sql = text(REBUILD_SQL.format(
+        user_filter=user_filter, streaks=STREAKS_SQL.format(user_filter=user_filter)
+    ))
+    if user_ids is None:
+        return db.execute(sql).rowcount
+    return db.execute(
+        sql.bindparams(bindparam("users", expanding=True)), {"users": user_ids}
+    ).rowcount
+
+
+# -------------------- READING --------------------
+def describe(state: dict, today: date) -> dict:
+    windows = {}
+    for days in WINDOWS:
+        sums = {column: state[f"{column}_{days}"] for column in WINDOW_SUMS}
+        balance = sums["calories_in"] - sums["calories_burned"]
+        windows[f"last_{days}_days"] = {
+            "avg_sleep_hours": round(sums["sleep_hours"] / sums["sleep_entries"], 2)
+            if sums["sleep_entries"] else None,
+            "calories_in": sums["calories_in"],
+            "calories_burned": sums["calories_burned"],
+            "calorie_balance": balance,
+            "avg_daily_balance": round(balance / days, 1),
+            "workouts": sums["workout_count"],
+            "avg_mood": round(sums["mood_sum"] / sums["mood_entries"], 2)
+            if sums["mood_entries"] else None,
+        }
+
+    # a streak is still alive until a whole day passes without a workout
+    last = state["last_workout_date"]
+    alive = last is not None and last >= today - timedelta(days=1)
+    return {
+        "as_of": state["as_of"].isoformat() if state["as_of"] else None,
+        **windows,
+        "streak": {
+            "current": state["current_streak"] if alive else 0,
+            "longest": state["longest_streak"],
+            "last_workout": last.isoformat() if last else None,
+        },
+    }
+
+
+def fetch_rolling(db, user_id: int, today: date = None) -> dict:
+    row = db.execute(
+        text(f"SELECT {', '.join(STATE_COLUMNS)} FROM rolling_stats WHERE user_id = :u"),
+        {"u": user_id}
+    ).mappings().first()
+    return describe(dict(row) if row else new_state(), today or date.today())
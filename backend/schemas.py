@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import date
+from typing import Any, List
 
 # -------------------- BASE RESPONSES --------------------
 class MessageResponse(BaseModel):
@@ -24,3 +25,22 @@ class WorkoutByName(BaseModel):
     workout: str = Field(..., min_length=1)
     duration: int = Field(..., gt=0)
     entry_date: date
+
+# -------------------- MOODS --------------------
+class MoodByName(BaseModel):
+    name: str = Field(..., min_length=1)
+    mood: str = Field(..., min_length=1)
+    entry_date: date
+
+# -------------------- BATCHES --------------------
+class BatchRequest(BaseModel):
+    # entries are validated one by one so a bad item doesn't reject the batch
+    entries: List[Any]
+
+class BatchError(BaseModel):
+    index: int
+    detail: Any
+
+class BatchResponse(BaseModel):
+    inserted: int
+    errors: List[BatchError]
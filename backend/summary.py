@@ -0,0 +1,160 @@
+from sqlalchemy import text, select, update, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from backend.models import DailySummary, User
+from backend.response_cache import touch
+from backend.rolling import record_days
+from backend.versions import VERSION_CHANNEL
+
+
+# -------------------- COLUMNS --------------------
+SUMMARY_COLUMNS = (
+    "calories_in", "calories_burned", "sleep_hours", "sleep_entries",
+    "workout_count", "mood_1", "mood_2", "mood_3", "mood_4", "mood_5",
+)
+
+
+def entry_deltas(kind: str, row: dict) -> dict:
+    """What one fact row adds to its (user_id, date) summary row."""
+    if kind == "calories":
+        return {"calories_in": row["calories"]}
+    if kind == "sleep":
+        return {"sleep_hours": row["sleep_hours"], "sleep_entries": 1}
+    if kind == "workouts":
+        return {"calories_burned": row["calories_burned"], "workout_count": 1}
+    if kind == "moods":
+        return {f"mood_{int(row['mood_level'])}": 1}
+    raise ValueError(f"Unknown entry kind: {kind}")
+
+
+# -------------------- INCREMENTAL UPDATE --------------------
+def record_entries(db: Session, kind: str, rows: list) -> None:
+    """Add freshly inserted fact rows to daily_summary.
+
+    Runs in the caller's transaction, so the summary commits (or rolls
+    back) together with the rows. Deltas are folded per (user_id, date)
+    first, so a batch costs a single statement: the multi-row upsert, the
+    data_version bump of every touched user and its NOTIFY. The same
+    deltas then move the users' rolling stats. The cached reads covering
+    these days are dropped when the transaction commits.
+    """
+    totals = {}
+    for row in rows:
+        key = (row["user_id"], row["date"])
+        acc = totals.setdefault(key, dict.fromkeys(SUMMARY_COLUMNS, 0))
+        for column, delta in entry_deltas(kind, row).items():
+            acc[column] += delta
+
+    if not totals:
+        return
+    touch(db, kind, totals)
+
+    # every statement below takes its row locks in (user_id, date) order, so
+    # two batches over the same users wait for each other instead of
+    # deadlocking (imports, batch endpoints and the write-behind flusher
+    # all write many users at once). The users rows are locked FOR NO KEY
+    # UPDATE: the fact rows' foreign keys already hold KEY SHARE on them,
+    # and FOR UPDATE would deadlock two writers of the same user.
+    totals = dict(sorted(totals.items()))
+
+    stmt = pg_insert(DailySummary).values([
+        {"user_id": user_id, "date": day, **acc}
+        for (user_id, day), acc in totals.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailySummary.user_id, DailySummary.date],
+        set_={
+            column: getattr(DailySummary, column) + getattr(stmt.excluded, column)
+            for column in SUMMARY_COLUMNS
+        }
+    )
+    upserted = stmt.returning(DailySummary.user_id).cte("upserted")
+
+    locked = (
+        select(User.user_id)
+        .where(User.user_id.in_(select(upserted.c.user_id)))
+        .order_by(User.user_id)
+        .with_for_update(key_share=True)
+        .cte("locked")
+    )
+    bumped = (
+        update(User)
+        .where(User.user_id == locked.c.user_id)
+        .values(data_version=User.data_version + 1)
+        .returning(User.user_id, User.data_version)
+        .cte("bumped")
+    )
+
+    # NOTIFY is only delivered on commit
+    db.execute(select(func.pg_notify(
+        VERSION_CHANNEL,
+        func.concat(bumped.c.user_id, ":", bumped.c.data_version)
+    )))
+
+    record_days(db, totals)
+
+
+# -------------------- REBUILD --------------------
+REBUILD_SQL = """
+    INSERT INTO daily_summary (
+        user_id, date, calories_in, calories_burned, sleep_hours, sleep_entries,
+        workout_count, mood_1, mood_2, mood_3, mood_4, mood_5
+    )
+    SELECT user_id, date,
+           SUM(calories_in), SUM(calories_burned), SUM(sleep_hours), SUM(sleep_entries),
+           SUM(workout_count), SUM(mood_1), SUM(mood_2), SUM(mood_3), SUM(mood_4), SUM(mood_5)
+    FROM (
+        SELECT user_id, date, calories AS calories_in, 0 AS calories_burned,
+               0 AS sleep_hours, 0 AS sleep_entries, 0 AS workout_count,
+               0 AS mood_1, 0 AS mood_2, 0 AS mood_3, 0 AS mood_4, 0 AS mood_5
+        FROM calories
+        UNION ALL
+        SELECT user_id, date, 0, 0, sleep_hours, 1, 0, 0, 0, 0, 0, 0
+        FROM sleep
+        UNION ALL
+        SELECT user_id, date, 0, calories_burned, 0, 0, 1, 0, 0, 0, 0, 0
+        FROM workouts
+        UNION ALL
+        SELECT user_id, date, 0, 0, 0, 0, 0,
+               (mood_level = '1')::int, (mood_level = '2')::int, (mood_level = '3')::int,
+               (mood_level = '4')::int, (mood_level = '5')::int
+        FROM moods
+    ) entries
+    WHERE user_id IS NOT NULL {user_filter}
+    GROUP BY user_id, date
+"""
+
+
+def rebuild(db: Session, user_id: int = None) -> int:
+    """Recompute daily_summary from the raw tables (all users or one).
+
+    Writers touching daily_summary wait until this commits, so the rebuilt
+    rows can't miss or double-count an entry written in the meantime.
+    """
+    db.execute(text("LOCK TABLE daily_summary IN SHARE ROW EXCLUSIVE MODE"))
+
+    if user_id is None:
+        db.execute(text("DELETE FROM daily_summary"))
+        result = db.execute(text(REBUILD_SQL.format(user_filter="")))
+    else:
+        params = {"u": user_id}
+        db.execute(text("DELETE FROM daily_summary WHERE user_id = :u"), params)
+        result = db.execute(
+            text(REBUILD_SQL.format(user_filter="AND user_id = :u")), params
+        )
+
+    rebuilt = result.rowcount
+
+    # dashboards holding the old numbers should refetch; the same NOTIFY as
+    # record_entries, delivered when the caller commits
+    bumped = update(User).values(data_version=User.data_version + 1)
+    if user_id is not None:
+        bumped = bumped.where(User.user_id == user_id)
+    bumped = bumped.returning(User.user_id, User.data_version).cte("bumped")
+    db.execute(select(func.pg_notify(
+        VERSION_CHANNEL,
+        func.concat(bumped.c.user_id, ":", bumped.c.data_version)
+    )))
+
+    return rebuilt
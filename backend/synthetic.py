@@ -0,0 +1,118 @@
+import random
+from datetime import date, timedelta
+
+from backend.catalog import SEED_FOODS, SEED_WORKOUTS
+from backend.ingest import MOOD_MAP, SLEEP_QUALITY_MAP
+
+
+# -------------------- SYNTHETIC ENTRIES --------------------
+# only seed catalog names, so entries are valid on any database
+FOODS = sorted(SEED_FOODS)
+WORKOUTS = sorted(SEED_WORKOUTS)
+MOODS = sorted(MOOD_MAP)
+SLEEP_QUALITIES = ("Poor", "Fair", "Good", "Excellent")
+
+
+def user_names(count: int, prefix: str = "bench") -> list:
+    return [f"{prefix}-{i}" for i in range(count)]
+
+
+def random_entry(rng: random.Random, kind: str, name: str, day: date) -> dict:
+    """One raw entry, shaped like the add-by-name / add-batch request bodies."""
+    if kind == "calories":
+        return {"name": name, "food": rng.choice(FOODS), "entry_date": day.isoformat()}
+    if kind == "sleep":
+        return {
+            "name": name,
+            "sleep_hours": round(rng.gauss(7, 1.2), 1) if rng.random() > 0.02 else 3.0,
+            "sleep_quality": rng.choice(SLEEP_QUALITIES),
+            "entry_date": day.isoformat(),
+        }
+    if kind == "workouts":
+        return {
+            "name": name,
+            "workout": rng.choice(WORKOUTS),
+            "duration": rng.randint(10, 90),
+            "entry_date": day.isoformat(),
+        }
+    if kind == "moods":
+        return {"name": name, "mood": rng.choice(MOODS), "entry_date": day.isoformat()}
+    raise ValueError(f"Unknown entry kind: {kind}")
+
+
+# -------------------- USER HISTORIES --------------------
+GOALS = ("General", "Weight Loss", "Muscle Gain", "Endurance")
+
+
+def sleep_quality(hours: float) -> str:
+    if hours < 5.5:
+        return "Poor"
+    if hours < 6.5:
+        return "Fair"
+    if hours < 8:
+        return "Good"
+    return "Excellent"
+
+
+def user_profile(rng: random.Random, workouts: list) -> dict:
+    """Habits of one synthetic user. Call first on the user's own RNG."""
+    return {
+        "age": rng.randint(18, 70),
+        "height": round(rng.gauss(170, 9), 1),
+        "weight": round(rng.gauss(72, 12), 1),
+        "goal": rng.choice(GOALS),
+        "meals": rng.choice((2, 3, 3, 3, 4, 5)),
+        "sleep_mean": rng.gauss(7.1, 0.6),
+        "weekend_sleep": rng.uniform(0.2, 1.2),
+        "workout_days": set(rng.sample(range(7), rng.randint(0, 5))),
+        "workouts": rng.sample(workouts, min(3, len(workouts))),
+        "adherence": rng.uniform(0.5, 0.98),   # chance of logging on a given day
+        "mood_base": rng.uniform(2.5, 4.2),
+        "joined_at": rng.random(),             # fraction into the range
+        "churned_at": rng.uniform(0.3, 1.0) if rng.random() < 0.2 else None,
+    }
+
+
+def user_history(rng: random.Random, profile: dict, start: date, end: date,
+                 foods: list, workouts: dict):
+    """Yield (day, {kind: [value tuples]}) for every day the user logged.
+
+    Tuples follow the ENTRY_KINDS columns without user_id; `foods` is
+    [(item_id, calories)] and `workouts` maps name -> (item_id, calories).
+    Patterns: more sleep and snacks on weekends, fewer workouts in winter,
+    mood following sleep and exercise, users joining late and some
+    dropping out.
+    """
+    span = (end - start).days
+    first = start + timedelta(days=int(span * profile["joined_at"] * 0.7))
+    last = end
+    if profile["churned_at"] is not None:
+        last = min(end, first + timedelta(days=int((end - first).days * profile["churned_at"])))
+
+    day = first
+    while day <= last:
+        if rng.random() < profile["adherence"]:
+            weekend = day.weekday() >= 5
+            entries = {}
+
+            meals = profile["meals"] + (rng.random() < 0.5 if weekend else 0)
+            entries["calories"] = [(*rng.choice(foods), day) for _ in range(meals)]
+
+            hours = rng.gauss(profile["sleep_mean"] + (profile["weekend_sleep"] if weekend else 0), 0.8)
+            hours = round(min(max(hours, 3.0), 12.0), 1)
+            entries["sleep"] = [(hours, SLEEP_QUALITY_MAP[sleep_quality(hours)], day)]
+
+            chance = 0.85 if day.weekday() in profile["workout_days"] else 0.05
+            if day.month in (12, 1, 2):
+                chance *= 0.7
+            entries["workouts"] = []
+            if profile["workouts"] and rng.random() < chance:
+                item_id, calories = workouts[rng.choice(profile["workouts"])]
+                entries["workouts"].append((item_id, rng.randint(15, 75), calories, day))
+
+            mood = profile["mood_base"] + 0.4 * (hours - 7) + 0.3 * bool(entries["workouts"])
+            mood = min(max(round(mood + rng.gauss(0, 0.7)), 1), 5)
+            entries["moods"] = [(mood, day)]
+
+            yield day, entries
+        day += timedelta(days=1)
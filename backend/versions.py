@@ -0,0 +1,111 @@
+import logging
+import select
+import threading
+import time
+
+from sqlalchemy.engine import Engine
+
+
+log = logging.getLogger("backend.versions")
+
+
+# -------------------- CHANNEL --------------------
+# payload is "<user_id>:<data_version>", sent by summary.record_entries
+VERSION_CHANNEL = "user_data_version"
+
+
+# -------------------- WATCHER --------------------
+class VersionWatcher:
+    """Keeps users' data_version current by LISTENing on VERSION_CHANNEL.
+
+    Versions are only known for users that were seeded (from a query) or
+    written to since the watcher connected. While the connection is down
+    `get` returns None, so callers fall back to querying the database.
+    Failed connections are retried after `retry_delay`, doubling up to
+    `max_retry_delay` until one succeeds.
+    """
+
+    def __init__(self, engine: Engine, channel: str = VERSION_CHANNEL, retry_delay: float = 5.0,
+                 max_retry_delay: float = 300.0):
+        self.engine = engine
+        self.channel = channel
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.connected = False
+        self.failures = 0
+        self.reconnects = 0
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="version-watcher", daemon=True
+                )
+                self._thread.start()
+
+    def get(self, user_id: int):
+        if not self.connected:
+            return None
+        return self._versions.get(user_id)
+
+    def seed(self, versions: dict) -> None:
+        with self._lock:
+            for user_id, version in versions.items():
+                # a notification may already have brought something newer
+                if version > self._versions.get(user_id, -1):
+                    self._versions[user_id] = version
+
+    def stats(self) -> dict:
+        return {
+            "connected": int(self.connected),
+            "failures": self.failures,
+            "reconnects": self.reconnects,
+            "known_users": len(self._versions),
+        }
+
+    # ---------- listener thread ----------
+    def _run(self) -> None:
+        delay = self.retry_delay
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                self.failures += 1
+                if self.connected:
+                    # the connection worked for a while, start the backoff over
+                    delay = self.retry_delay
+                log.exception("LISTEN %s failed, reconnecting in %.0fs", self.channel, delay)
+            # notifications may have been missed while disconnected
+            self.connected = False
+            with self._lock:
+                self._versions.clear()
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+            self.reconnects += 1
+
+    def _listen(self) -> None:
+        # a dedicated connection, detached so it never goes back to the pool
+        conn = self.engine.raw_connection()
+        conn.detach()
+        dbapi_conn = conn.dbapi_connection
+        try:
+            dbapi_conn.autocommit = True
+            with dbapi_conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel}")
+            self.connected = True
+
+            while True:
+                if select.select([dbapi_conn], [], [], 30) == ([], [], []):
+                    continue
+                dbapi_conn.poll()
+                updates = {}
+                while dbapi_conn.notifies:
+                    payload = dbapi_conn.notifies.pop(0).payload
+                    user_id, version = payload.split(":")
+                    updates[int(user_id)] = int(version)
+                self.seed(updates)
+        finally:
+            conn.close()
@@ -0,0 +1,371 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, DisconnectionError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from backend.database import SessionLocal, env_flag
+from backend.ingest import ENTRY_KINDS, normalize_name, resolve_user_ids
+from backend.models import IngestCheckpoint
+from backend.summary import record_entries
+
+
+# -------------------- SETTINGS --------------------
+WRITE_BEHIND = env_flag("WRITE_BEHIND")
+JOURNAL_DIR = os.getenv("WRITE_BEHIND_DIR", "journal")
+FLUSH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH", "500"))            # entries per flush
+FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "0.5"))   # seconds
+MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "100000"))
+# fsync every append: survives power loss, costs a disk flush per request
+FSYNC = env_flag("WRITE_BEHIND_FSYNC")
+# a batch failing this often for a reason other than the database being
+# unreachable is written entry by entry; entries that still fail go to the
+# journal's dead-letter file so the rest of the queue can move on
+MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "3"))
+MAX_BACKOFF = float(os.getenv("WRITE_BEHIND_MAX_BACKOFF", "30"))   # seconds
+
+log = logging.getLogger("backend.writebehind")
+
+
+class QueueFull(Exception):
+    pass
+
+
+# -------------------- JOURNAL --------------------
+# one JSON object per line: {"seq": 7, "kind": "sleep", "name": "...", "values": {...}}
+def encode(seq: int, kind: str, name: str, values: dict) -> str:
+    return json.dumps(
+        {"seq": seq, "kind": kind, "name": name, "values": values}, default=str
+    ) + "\n"
+
+
+def read_journal(f) -> list:
+    """Every entry in the journal as (seq, kind, name, values)."""
+    f.seek(0)
+    entries = []
+    for line in f:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            # torn last line from a crash mid-append; it was never acknowledged
+            break
+        values = record["values"]
+        values["date"] = date.fromisoformat(values["date"])
+        entries.append((record["seq"], record["kind"], record["name"], values))
+    return entries
+
+
+def load_checkpoint(db: Session, journal: str) -> int:
+    checkpoint = db.get(IngestCheckpoint, journal)
+    return checkpoint.seq if checkpoint else 0
+
+
+def save_checkpoint(db: Session, journal: str, seq: int) -> None:
+    stmt = pg_insert(IngestCheckpoint).values(journal=journal, seq=seq)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[IngestCheckpoint.journal], set_={"seq": stmt.excluded.seq}
+    ))
+
+
+def flush_entries(db: Session, journal: str, entries: list) -> None:
+    """Write a batch and advance the journal's checkpoint in one transaction."""
+    user_ids = resolve_user_ids(db, [name for _, _, name, _ in entries])
+
+    by_kind = {}
+    for _, kind, name, values in entries:
+        by_kind.setdefault(kind, []).append(
+            {**values, "user_id": user_ids[normalize_name(name)]}
+        )
+    for kind, rows in by_kind.items():
+        db.execute(insert(ENTRY_KINDS[kind][0]), rows)
+        record_entries(db, kind, rows)
+
+    save_checkpoint(db, journal, entries[-1][0])
+    db.commit()
+
+
+# -------------------- FAILURES --------------------
+def is_transient(exc: Exception) -> bool:
+    """True when the failure says nothing about the entries themselves.
+
+    Lost connections, a database restart, deadlocks, serialization
+    failures and pool timeouts are retried as they are, however long it
+    takes. Anything else (a constraint violation, a bad value, a name
+    that no longer resolves) fails again on every retry.
+    """
+    if isinstance(exc, DBAPIError) and exc.connection_invalidated:
+        return True
+    return isinstance(exc, (OperationalError, InterfaceError, DisconnectionError, PoolTimeout))
+
+
+def dead_letter_path(directory: str, journal: str) -> str:
+    return os.path.join(directory, os.path.splitext(journal)[0] + ".dead")
+
+
+def salvage(directory: str, journal: str, entries: list) -> tuple:
+    """Write `entries` one at a time, moving each failing one to the dead letters.
+
+    Returns (flushed, dead). A dead entry is appended to the dead-letter
+    file with its error before the checkpoint moves past it, so a crash
+    in between at worst lists it twice. Transient errors are raised: the
+    entries not handled yet stay queued.
+    """
+    with SessionLocal() as db:
+        checkpoint = load_checkpoint(db, journal)
+    flushed = dead = 0
+    for entry in entries:
+        if entry[0] <= checkpoint:
+            # written by an earlier salvage that a transient error cut short
+            flushed += 1
+            continue
+        try:
+            with SessionLocal() as db:
+                flush_entries(db, journal, [entry])
+            flushed += 1
+            continue
+        except Exception as exc:
+            if is_transient(exc):
+                raise
+            error = str(exc).splitlines()[0]
+
+        with open(dead_letter_path(directory, journal), "a", encoding="utf-8") as f:
+            record = json.loads(encode(*entry))
+            record["error"] = error
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        with SessionLocal() as db:
+            save_checkpoint(db, journal, entry[0])
+            db.commit()
+        dead += 1
+        log.error("write-behind: %s entry %s moved to %s: %s",
+                  journal, entry[0], dead_letter_path(directory, journal), error)
+    return flushed, dead
+
+
+# -------------------- QUEUE --------------------
+class WriteBehindQueue:
+    """Acknowledge entries once journaled, write them to PostgreSQL in batches.
+
+    Each process claims its own journal file in `directory` with an exclusive
+    flock. A background thread flushes when `flush_size` entries are waiting
+    or every `flush_interval` seconds. The flushed sequence number is stored
+    in ingest_checkpoints in the same transaction as the entries, so replaying
+    a journal after a crash never inserts an entry twice. A batch that the
+    database rejects MAX_ATTEMPTS times is written entry by entry, and the
+    entries it still rejects are moved to a dead-letter file next to the
+    journal (see salvage()).
+    """
+
+    def __init__(
+        self,
+        directory: str = JOURNAL_DIR,
+        flush_size: int = FLUSH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        max_pending: int = MAX_PENDING
+    ):
+        self.directory = directory
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.journal = None
+
+        self._file = None
+        self._seq = 0
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._backoff = 0.0
+
+        self.replayed = 0
+        self.flushed = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_error = None
+        self.attempts = 0
+        self.dead_lettered = 0
+        self.last_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = self._claim()
+            self.journal = os.path.basename(self._file.name)
+            self._drain_orphans()
+
+            with SessionLocal() as db:
+                checkpoint = load_checkpoint(db, self.journal)
+            entries = read_journal(self._file)
+            self._seq = max([checkpoint] + [seq for seq, _, _, _ in entries])
+            self._pending = [entry for entry in entries if entry[0] > checkpoint]
+            self.replayed = len(self._pending)
+            if not self._pending:
+                self._file.truncate(0)
+
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name="write-behind", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Flush what is pending and stop the background thread."""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+            self._thread = None
+
+    def submit(self, kind: str, name: str, values: dict) -> int:
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                raise QueueFull
+            self._seq += 1
+            entry = (self._seq, kind, name, values)
+            # appended under the lock, so the file is in sequence order
+            self._file.write(encode(*entry))
+            self._file.flush()
+            if FSYNC:
+                os.fsync(self._file.fileno())
+            self._pending.append(entry)
+            if len(self._pending) >= self.flush_size:
+                self._cond.notify_all()
+            return self._seq
+
+    def stats(self) -> dict:
+        with self._cond:
+            depth = len(self._pending)
+        return {
+            "enabled": True,
+            "journal": self.journal,
+            "depth": depth,
+            "replayed": self.replayed,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+            "avg_batch_size": round(self.flushed / self.batches, 1) if self.batches else 0,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self.batches, 2) if self.batches else 0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "attempts": self.attempts,
+            "dead_lettered": self.dead_lettered,
+        }
+
+    # ---------- journal files ----------
+    def _claim(self):
+        slot = 0
+        while True:
+            f = open(os.path.join(self.directory, f"ingest-{slot}.journal"), "a+", encoding="utf-8")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return f
+            except BlockingIOError:
+                f.close()
+                slot += 1
+
+    def _drain_orphans(self) -> None:
+        # journals left by workers that no longer run (e.g. fewer workers
+        # after a restart); live workers hold their lock, so they're skipped
+        for path in glob.glob(os.path.join(self.directory, "ingest-*.journal")):
+            if os.path.basename(path) == self.journal:
+                continue
+            with open(path, "a+", encoding="utf-8") as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                journal = os.path.basename(path)
+                try:
+                    with SessionLocal() as db:
+                        checkpoint = load_checkpoint(db, journal)
+                    entries = [e for e in read_journal(f) if e[0] > checkpoint]
+                    if entries:
+                        try:
+                            with SessionLocal() as db:
+                                flush_entries(db, journal, entries)
+                        except Exception as exc:
+                            if is_transient(exc):
+                                raise
+                            self.dead_lettered += salvage(self.directory, journal, entries)[1]
+                    f.truncate(0)
+                    self.replayed += len(entries)
+                except Exception as exc:
+                    # left as is; the next start tries again
+                    self.errors += 1
+                    self.last_error = f"{journal}: {exc}"
+
+    # ---------- flusher thread ----------
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: len(self._pending) >= self.flush_size or self._stopping,
+                    timeout=self.flush_interval
+                )
+                batch = self._pending[:self.flush_size]
+                if not batch and self._stopping:
+                    return
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            dead = 0
+            try:
+                if self.attempts < MAX_ATTEMPTS:
+                    with SessionLocal() as db:
+                        flush_entries(db, self.journal, batch)
+                else:
+                    _, dead = salvage(self.directory, self.journal, batch)
+            except Exception as exc:
+                # entries stay queued (and journaled); retry after a pause
+                self.errors += 1
+                self.last_error = str(exc)
+                if not is_transient(exc):
+                    self.attempts += 1
+                log.warning("write-behind: flushing %s entries failed (%s): %s",
+                            len(batch), "transient" if is_transient(exc) else
+                            f"attempt {self.attempts}/{MAX_ATTEMPTS}", str(exc).splitlines()[0])
+                if self._stopping:
+                    return
+                self._backoff = min(max(self._backoff * 2, self.flush_interval), MAX_BACKOFF)
+                time.sleep(self._backoff)
+                continue
+            elapsed = (time.perf_counter() - started) * 1000
+            self.attempts = 0
+            self._backoff = 0.0
+            self.dead_lettered += dead
+
+            with self._cond:
+                del self._pending[:len(batch)]
+                if not self._pending:
+                    # everything in the file is in the database now
+                    self._file.truncate(0)
+
+            self.flushed += len(batch) - dead
+            self.batches += 1
+            self.last_batch_size = len(batch)
+            self.last_flush_ms = elapsed
+            self.max_flush_ms = max(self.max_flush_ms, elapsed)
+            self._total_flush_ms += elapsed
+
+
+INGEST_QUEUE = WriteBehindQueue()
@@ -0,0 +1,157 @@
+import logging
+from contextlib import nullcontext
+
+import pytest
+
+from backend import catalog
+from backend.catalog import CatalogEntry, CatalogIndex, normalize
+
+
+def food(item_id, name, calories=100):
+    return CatalogEntry(item_id, "food", name, calories, "serving")
+
+
+def workout(item_id, name, calories=200):
+    return CatalogEntry(item_id, "workout", name, calories, "session")
+
+
+ITEMS = [
+    food(1, "rice"), food(2, "brown rice"), food(3, "rice cake"), food(4, "chicken"),
+    food(5, "apple"), food(6, "apple pie"), workout(7, "running"), workout(8, "rowing"),
+]
+SYNONYMS = [(4, "poultry"), (1, "chawal"), (5, "Apple")]
+
+
+def index(items=ITEMS, synonyms=SYNONYMS):
+    return CatalogIndex(1, items, synonyms)
+
+
+def names(results):
+    return [result["name"] for result in results]
+
+
+# -------------------- LOOKUP --------------------
+def test_normalize():
+    assert normalize("  Brown \t RICE ") == "brown rice"
+
+
+def test_lookup_names_and_synonyms_any_case():
+    catalog = index()
+    assert catalog.lookup("food", " RICE ").item_id == 1
+    assert catalog.lookup("food", "Poultry").item_id == 4
+    assert catalog.lookup("workout", "rice") is None
+
+
+def test_tie_on_normalized_name_keeps_first_item():
+    # load_index reads items in id order, so the oldest one wins
+    catalog = index([food(1, "Rice"), food(2, "rice "), food(3, "RICE")], [])
+    assert catalog.lookup("food", "rice").item_id == 1
+    assert names(catalog.search("rice")) == ["Rice"]
+
+
+def test_name_wins_over_another_items_synonym():
+    catalog = index([food(1, "rice"), food(2, "basmati")], [(2, "rice")])
+    assert catalog.lookup("food", "rice").item_id == 1
+
+
+# -------------------- SEARCH --------------------
+def test_prefix_matches_in_name_order():
+    assert names(index().search("ric", kind="food")) == ["rice", "rice cake"]
+
+
+def test_prefix_before_fuzzy():
+    results = index().search("rice", kind="food")
+    assert names(results)[:2] == ["rice", "rice cake"]
+    assert "brown rice" in names(results)[2:]
+
+
+def test_fuzzy_match_for_typos():
+    assert names(index().search("chiken"))[:1] == ["chicken"]
+
+
+def test_item_matched_twice_is_listed_once():
+    # "apple" is a name and (as "Apple") a synonym of the same item
+    results = index().search("apple")
+    assert names(results) == ["apple", "apple pie"]
+    assert results[0]["matched"] == "apple"
+
+
+def test_synonym_match_reports_what_matched():
+    [result] = index().search("poul")
+    assert (result["name"], result["matched"]) == ("chicken", "poultry")
+
+
+def test_kind_filter_and_limit():
+    assert names(index().search("r", kind="workout")) == ["rowing", "running"]
+    assert len(index().search("r", limit=2)) == 2
+
+
+def test_empty_query_lists_catalog_up_to_limit():
+    results = index().search("", limit=3)
+    assert len(results) == 3
+    assert index().search("   ", kind="workout", limit=10) == index().search("", kind="workout")
+
+
+def test_short_query_without_matches():
+    assert index().search("zq") == []
+    assert index().search("x", kind="food") == []
+
+
+# -------------------- RELOADING --------------------
+@pytest.fixture
+def loads(monkeypatch):
+    """Make reload() install the queued indexes instead of reading the database."""
+    queued = []
+    monkeypatch.setattr(catalog, "_index", None)
+    monkeypatch.setattr(catalog, "RELOAD_STATS", dict.fromkeys(catalog.RELOAD_STATS, 0))
+    monkeypatch.setattr(catalog, "SessionLocal", nullcontext)
+    monkeypatch.setattr(catalog, "load_index", lambda db: queued.pop(0))
+    return queued
+
+
+def test_reload_installs_newer_index(loads):
+    loads.extend([CatalogIndex(1, ITEMS, []), CatalogIndex(2, ITEMS[:1], [])])
+    assert catalog.reload().version == 1
+    assert catalog.reload().version == 2
+    assert catalog.current().size == 1
+
+
+def test_slow_reload_of_older_version_is_dropped(loads):
+    loads.extend([CatalogIndex(5, ITEMS, []), CatalogIndex(3, ITEMS[:1], [])])
+    catalog.reload()
+    assert catalog.reload().version == 5
+    assert catalog.current().size == len(ITEMS)
+    assert catalog.RELOAD_STATS["skipped_loads"] == 1
+
+
+def test_failed_check_is_logged_and_counted(monkeypatch, caplog):
+    def unreachable():
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(catalog, "SessionLocal", unreachable)
+    monkeypatch.setattr(catalog, "RELOAD_STATS", dict.fromkeys(catalog.RELOAD_STATS, 0))
+    with caplog.at_level(logging.ERROR, logger="backend.catalog"):
+        catalog.check_for_changes()
+
+    assert catalog.RELOAD_STATS["watch_errors"] == 1
+    assert "database is down" in caplog.text
+
+
+def test_preload_loads_once_and_starts_the_watcher(loads, monkeypatch):
+    started = []
+    monkeypatch.setattr(catalog, "_start_watcher", lambda: started.append(1))
+    loads.append(CatalogIndex(4, ITEMS, []))
+    assert not catalog.is_loaded()
+    catalog.preload()
+    assert catalog.is_loaded() and catalog.current().version == 4
+    assert started == [1]
+
+
+def test_failed_preload_is_logged_and_retried_on_first_use(loads, monkeypatch, caplog):
+    monkeypatch.setattr(catalog, "_start_watcher", lambda: None)
+    with caplog.at_level(logging.ERROR, logger="backend.catalog"):
+        catalog.preload()   # nothing queued: the load raises
+    assert "catalog preload failed" in caplog.text
+    assert not catalog.is_loaded()
+    loads.append(CatalogIndex(2, ITEMS, []))
+    assert catalog.current().version == 2
@@ -0,0 +1,86 @@
+import math
+from datetime import date
+
+import pytest
+
+from backend.downsample import MAX_POINTS, bucket_sql, lttb, pick_resolution
+from backend.reads import fetch_timeseries
+
+
+# -------------------- RESOLUTION --------------------
+@pytest.mark.parametrize("start, end, expected", [
+    (date(2024, 1, 1), date(2024, 1, 31), "day"),
+    (date(2024, 1, 1), date(2024, 4, 2), "day"),        # 92 days
+    (date(2024, 1, 1), date(2024, 4, 3), "week"),
+    (date(2024, 1, 1), date(2025, 12, 31), "week"),
+    (date(2020, 1, 1), date(2024, 1, 1), "month"),
+    (None, date(2024, 1, 1), "day"),
+    (date(2024, 1, 1), None, "day"),
+])
+def test_pick_resolution(start, end, expected):
+    assert pick_resolution(start, end) == expected
+
+
+def test_bucket_sql():
+    assert bucket_sql("day") == "date"
+    assert bucket_sql("week", "s.date") == "date_trunc('week', s.date)::date"
+    with pytest.raises(ValueError):
+        bucket_sql("year")
+
+
+# -------------------- LTTB --------------------
+def test_lttb_short_series_kept_whole():
+    assert lttb([1, 2, 3], [5, 6, 7], threshold=10) == [0, 1, 2]
+    assert lttb(list(range(50)), [0] * 50, threshold=2) == list(range(50))
+
+
+def test_lttb_keeps_threshold_sorted_points_with_ends():
+    xs = list(range(1000))
+    ys = [math.sin(x / 20) for x in xs]
+    keep = lttb(xs, ys, threshold=100)
+    assert len(keep) == 100
+    assert keep[0] == 0 and keep[-1] == 999
+    assert keep == sorted(set(keep))
+
+
+def test_lttb_keeps_spikes():
+    xs = list(range(500))
+    ys = [0.0] * 500
+    ys[137] = 100.0
+    ys[342] = -80.0
+    keep = lttb(xs, ys, threshold=20)
+    assert 137 in keep and 342 in keep
+
+
+# -------------------- TIMESERIES --------------------
+class Rows:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+@pytest.mark.parametrize("metric, row", [
+    ("calories", lambda day, i: (day, 1800 + i % 300)),
+    ("calories_burned", lambda day, i: (day, 400 + i % 50)),
+    ("sleep", lambda day, i: (day, 7.5, "good")),
+    ("workouts", lambda day, i: (day, "running", 30, 250 + i % 90)),
+    ("moods", lambda day, i: (day, 1 + i % 5)),
+])
+def test_explicit_day_resolution_is_capped_for_every_metric(metric, row):
+    start = date(2015, 1, 1)
+    rows = [row(date.fromordinal(start.toordinal() + i // 2), i) for i in range(3 * MAX_POINTS)]
+    series = fetch_timeseries(Rows(rows), 1, metric, None, None, "day")
+    assert series["resolution"] == "day"
+    assert len(series["date"]) == MAX_POINTS
+    assert series["date"][0] == start.isoformat()
+    assert series["date"] == sorted(series["date"])
+
+
+def test_short_day_series_is_returned_whole():
+    rows = [(date(2024, 1, day), 2000) for day in range(1, 31)]
+    assert len(fetch_timeseries(Rows(rows), 1, "calories", None, None, "day")["date"]) == 30
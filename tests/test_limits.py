@@ -0,0 +1,174 @@
+import asyncio
+
+import pytest
+
+from backend import limits
+from backend.limits import ConcurrencyLimiter, ConcurrencyLimitMiddleware, route_class
+
+
+# -------------------- ROUTE CLASSES --------------------
+@pytest.mark.parametrize("method, path, expected", [
+    ("GET", "/users/alice/export/calories", "export"),
+    ("GET", "/export/calories", "export"),
+    ("POST", "/calories/", "ingest"),
+    ("DELETE", "/users/alice", "ingest"),
+    ("GET", "/users/alice/summary", "read"),
+    ("GET", "/catalog/search", "read"),
+    ("GET", "/metrics", None),
+    ("POST", "/catalog/reload", None),
+])
+def test_route_class(method, path, expected):
+    assert route_class(method, path) == expected
+
+
+# -------------------- LIMITER --------------------
+def test_free_slots_admit_at_once_and_release_frees_them():
+    async def main():
+        limiter = ConcurrencyLimiter(limit=2, max_queue=0)
+        assert await limiter.acquire() and await limiter.acquire()
+        assert limiter.active == 2
+        limiter.release()
+        limiter.release()
+        return limiter.stats()
+
+    stats = asyncio.run(main())
+    assert (stats["active"], stats["admitted"], stats["waiting"]) == (0, 2, 0)
+
+
+def test_waiters_are_admitted_in_arrival_order():
+    async def main():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=5, timeout=5)
+        order = []
+
+        async def request(name):
+            assert await limiter.acquire()
+            order.append(name)
+            await asyncio.sleep(0.001)
+            limiter.release()
+
+        assert await limiter.acquire()
+        tasks = [asyncio.ensure_future(request(n)) for n in range(5)]
+        await asyncio.sleep(0)
+        assert limiter.stats()["waiting"] == 5
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order, limiter
+
+    order, limiter = asyncio.run(main())
+    assert order == [0, 1, 2, 3, 4]
+    assert (limiter.active, limiter.admitted) == (0, 6)
+
+
+def test_newcomer_does_not_overtake_the_queue():
+    async def main():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=5, timeout=5)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release()
+        # the slot went to the waiter, so a new request has to queue
+        newcomer = asyncio.ensure_future(limiter.acquire())
+        assert await waiter
+        await asyncio.sleep(0.001)
+        assert not newcomer.done()
+        limiter.release()
+        return await newcomer, limiter.active
+
+    assert asyncio.run(main()) == (True, 1)
+
+
+def test_full_queue_is_shed():
+    async def main():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=1, timeout=5)
+        await limiter.acquire()
+        queued = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        shed = await limiter.acquire()
+        limiter.release()
+        return shed, await queued, limiter.stats()
+
+    shed, queued, stats = asyncio.run(main())
+    assert (shed, queued) == (False, True)
+    assert (stats["shed"], stats["admitted"], stats["active"]) == (1, 2, 1)
+
+
+def test_waiter_times_out_and_leaves_the_queue():
+    async def main():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=5, timeout=0.01)
+        await limiter.acquire()
+        admitted = await limiter.acquire()
+        stats = limiter.stats()
+        limiter.release()
+        return admitted, stats, limiter.active
+
+    admitted, stats, active = asyncio.run(main())
+    assert admitted is False
+    assert (stats["timed_out"], stats["waiting"]) == (1, 0)
+    # the timed out request never held a slot, so releasing the first empties it
+    assert active == 0
+
+
+def test_cancelled_waiter_gives_its_slot_to_the_next():
+    async def main():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=5, timeout=5)
+        await limiter.acquire()
+        gone = asyncio.ensure_future(limiter.acquire())
+        second = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        gone.cancel()
+        await asyncio.sleep(0)
+        limiter.release()
+        assert await second
+        limiter.release()
+        return limiter.stats()
+
+    stats = asyncio.run(main())
+    assert (stats["active"], stats["waiting"], stats["admitted"]) == (0, 0, 2)
+
+
+# -------------------- MIDDLEWARE --------------------
+def call(app, method, path):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "headers": [], "query_string": b""}
+    return app(scope, receive, send), sent
+
+
+def test_middleware_sheds_with_503_and_releases_slots(monkeypatch):
+    limiter = ConcurrencyLimiter(limit=1, max_queue=0, timeout=5)
+    monkeypatch.setattr(limits, "LIMITERS", {"read": limiter})
+    gate = None
+
+    async def app(scope, receive, send):
+        await gate.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    middleware = ConcurrencyLimitMiddleware(app)
+
+    async def main():
+        nonlocal gate
+        gate = asyncio.Event()
+        first, first_sent = call(middleware, "GET", "/users/alice/summary")
+        first = asyncio.ensure_future(first)
+        await asyncio.sleep(0)
+        second, second_sent = call(middleware, "GET", "/users/alice/summary")
+        await second
+        unlimited, unlimited_sent = call(middleware, "GET", "/metrics")
+        unlimited = asyncio.ensure_future(unlimited)
+        gate.set()
+        await asyncio.gather(first, unlimited)
+        return first_sent, second_sent, unlimited_sent
+
+    first_sent, second_sent, unlimited_sent = asyncio.run(main())
+    assert first_sent[0]["status"] == 200
+    assert unlimited_sent[0]["status"] == 200
+    assert second_sent[0]["status"] == 503
+    assert (b"retry-after", limits.RETRY_AFTER.encode()) in second_sent[0]["headers"]
+    assert (limiter.active, limiter.shed) == (0, 1)
@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from backend import migrations
+from backend.database import engine
+from backend.migrations import Migration, applied_versions, upgrade
+
+
+# versions far past the real ones; recorded in DATABASE_URL's
+# schema_migrations while a test runs, so skipped without a database
+FIRST = 900_001
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    try:
+        applied_versions(engine)
+    except OperationalError:
+        pytest.skip("no database at DATABASE_URL")
+
+    ran = []
+
+    def step(version, **kind):
+        return Migration(version, f"test step {version}", lambda conn: ran.append(version),
+                         True, kind.get("contract", False), kind.get("maintenance", False))
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [
+        step(FIRST),
+        step(FIRST + 1, maintenance=True),
+        step(FIRST + 2),
+        step(FIRST + 3, contract=True),
+    ])
+    yield ran
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM schema_migrations WHERE version >= :v"), {"v": FIRST})
+
+
+def test_maintenance_migration_holds_back_itself_and_later_ones(registry):
+    logged = []
+    assert upgrade(engine, log=logged.append) == [FIRST]
+    assert registry == [FIRST]
+    assert "migrate --maintenance" in logged[-1]
+
+    # a second routine deploy still stops there
+    assert upgrade(engine, log=logged.append) == []
+
+
+def test_maintenance_run_applies_the_rest_except_contract(registry):
+    upgrade(engine, log=lambda line: None)
+    assert upgrade(engine, log=lambda line: None, maintenance=True) == [FIRST + 1, FIRST + 2]
+    assert upgrade(engine, log=lambda line: None, contract=True) == [FIRST + 3]
+    assert registry == [FIRST, FIRST + 1, FIRST + 2, FIRST + 3]
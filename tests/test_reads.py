@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from backend import reads
+from backend.database import SessionLocal
+from backend.reads import search_users
+
+
+NAMES = ["zz_search_a", "zzxsearchxb", "zz%search", "zz5search", "zz\\search", "zzasearch"]
+
+
+# these run against DATABASE_URL, and are skipped without a database
+@pytest.fixture
+def db():
+    try:
+        with SessionLocal() as db:
+            db.execute(text("INSERT INTO users (name) VALUES (:name)"), [{"name": n} for n in NAMES])
+            db.commit()
+    except OperationalError:
+        pytest.skip("no database at DATABASE_URL")
+
+    with SessionLocal() as db:
+        yield db
+    with SessionLocal() as db:
+        db.execute(text("DELETE FROM users WHERE name = ANY(:names)"), {"names": NAMES})
+        db.commit()
+
+
+def names(db, query):
+    return [user["name"] for user in search_users(db, query, 50)]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("zz_", "zz_search_a"),
+    ("zz%", "zz%search"),
+    ("zz\\", "zz\\search"),
+])
+def test_wildcards_in_the_query_match_literally(db, query, expected, monkeypatch):
+    # similar names follow the prefix matches
+    assert names(db, query)[0] == expected
+    # without pg_trgm the LIKE is the only filter
+    monkeypatch.setattr(reads, "has_trigram_search", lambda db: False)
+    assert names(db, query) == [expected]
+
+
+def test_plain_prefix_still_matches(db, monkeypatch):
+    monkeypatch.setattr(reads, "has_trigram_search", lambda db: False)
+    assert sorted(names(db, "zz")) == sorted(NAMES)
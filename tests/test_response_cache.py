@@ -0,0 +1,198 @@
+import asyncio
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from backend.response_cache import LocalBackend, ResponseCache, covers, read_key
+
+
+def cache():
+    return ResponseCache(LocalBackend(maxsize=100, ttl=60))
+
+
+def fill(cache, key, value):
+    async def load():
+        return value
+    return asyncio.run(cache.get_or_load(key, load))
+
+
+# -------------------- KEYS --------------------
+def test_read_key_names_version_and_params():
+    key = read_key(1, "sleep", date(2024, 1, 1), None, 7, "day")
+    assert key.name.startswith("resp:1:sleep:2024-01-01::7:")
+    assert key.name != read_key(1, "sleep", date(2024, 1, 1), None, 8, "day").name
+    assert key.name != read_key(1, "sleep", date(2024, 1, 1), None, 7, "week").name
+
+
+@pytest.mark.parametrize("start, end, days, expected", [
+    ("2024-01-01", "2024-01-31", {"2024-01-15"}, True),
+    ("2024-01-01", "2024-01-31", {"2024-01-31"}, True),
+    ("2024-01-01", "2024-01-31", {"2024-02-01"}, False),
+    ("", "2024-01-31", {"2000-01-01"}, True),
+    ("2024-01-01", "", {"2023-12-31"}, False),
+    ("", "", {"2024-06-01"}, True),
+])
+def test_covers(start, end, days, expected):
+    assert covers(start, end, days) is expected
+
+
+# -------------------- INVALIDATION --------------------
+def test_invalidate_drops_only_reads_covering_the_day():
+    c = cache()
+    january = read_key(1, "calories", date(2024, 1, 1), date(2024, 1, 31))
+    february = read_key(1, "calories", date(2024, 2, 1), date(2024, 2, 29))
+    sleep = read_key(1, "sleep", date(2024, 1, 1), date(2024, 1, 31))
+    other_user = read_key(2, "calories", date(2024, 1, 1), date(2024, 1, 31))
+    for key in (january, february, sleep, other_user):
+        fill(c, key, key.name)
+
+    c.invalidate({"calories": {(1, date(2024, 1, 10))}})
+
+    assert [c.backend.get(k.name) == k.name for k in (january, february, sleep, other_user)] \
+        == [False, True, True, True]
+    assert c.invalidated == 1
+
+
+def test_invalidate_workouts_drops_calories_burned():
+    c = cache()
+    key = read_key(1, "calories_burned")
+    fill(c, key, "burned")
+    c.invalidate({"workouts": {(1, date(2024, 1, 10))}})
+    assert c.backend.get(key.name) != "burned"
+
+
+def test_invalidate_user_drops_every_range():
+    c = cache()
+    keys = [read_key(1, "summary"), read_key(1, "moods", date(2024, 1, 1), date(2024, 1, 2))]
+    for key in keys:
+        fill(c, key, "cached")
+    c.invalidate_user(1)
+    assert len(c.backend) == 0
+
+
+def test_load_racing_an_invalidation_is_not_stored():
+    c = cache()
+    key = read_key(1, "summary")
+
+    async def load():
+        # a write commits while the read is still running
+        c.invalidate({"calories": {(1, date(2024, 1, 1))}})
+        return "stale"
+
+    assert asyncio.run(c.get_or_load(key, load)) == "stale"
+    assert len(c.backend) == 0
+
+
+def test_lru_evicts_oldest_and_keeps_index_in_step():
+    backend = LocalBackend(maxsize=2, ttl=60)
+    keys = [read_key(1, "summary", None, None, version) for version in range(3)]
+    for key in keys:
+        assert backend.store(key, key.name, backend.generation(1))
+    assert len(backend) == 2
+    assert backend.invalidate(1, {"summary"}, None) == 2
+
+
+# -------------------- COALESCING --------------------
+def test_concurrent_misses_share_one_load():
+    c = cache()
+    key = read_key(1, "summary")
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"rows": 3}
+
+    async def main():
+        return await asyncio.gather(*(c.get_or_load(key, load) for _ in range(10)))
+
+    assert asyncio.run(main()) == [{"rows": 3}] * 10
+    assert len(calls) == 1
+    assert (c.misses, c.coalesced) == (1, 9)
+    assert fill(c, key, "unused") == {"rows": 3}
+    assert c.hits == 1
+
+
+def test_failed_load_reaches_every_waiter_and_is_not_cached():
+    c = cache()
+    key = read_key(1, "summary")
+
+    async def load():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("db down")
+
+    async def main():
+        return await asyncio.gather(
+            *(c.get_or_load(key, load) for _ in range(3)), return_exceptions=True
+        )
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(main()))
+    assert len(c.backend) == 0
+    assert fill(c, key, "fresh") == "fresh"
+
+
+def test_cancelled_caller_does_not_cancel_shared_load():
+    c = cache()
+    key = read_key(1, "summary")
+
+    async def load():
+        await asyncio.sleep(0.02)
+        return "value"
+
+    async def main():
+        first = asyncio.ensure_future(c.get_or_load(key, load))
+        second = asyncio.ensure_future(c.get_or_load(key, load))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "value"
+    assert c.backend.get(key.name) == "value"
+
+
+# -------------------- SHARED BACKEND --------------------
+class SlowSharedBackend(LocalBackend):
+    """A LocalBackend that answers invalidations like a remote server would."""
+
+    shared = True
+
+    def __init__(self):
+        super().__init__(maxsize=100, ttl=60)
+        self.sent_from = []
+        self.answer = threading.Event()
+
+    def invalidate(self, user_id, reads, days):
+        self.answer.wait(5)
+        self.sent_from.append(threading.current_thread().name)
+        return super().invalidate(user_id, reads, days)
+
+
+def test_shared_invalidation_does_not_block_the_commit():
+    backend = SlowSharedBackend()
+    c = ResponseCache(backend)
+    key = read_key(1, "calories", date(2024, 1, 1), date(2024, 1, 31))
+    fill(c, key, "stale")
+
+    started = time.monotonic()
+    c.invalidate({"calories": {(1, date(2024, 1, 10))}})
+    c.invalidate_user(1)
+    assert time.monotonic() - started < 1
+    assert c.stats()["pending_invalidations"] >= 1
+
+    backend.answer.set()
+    c.wait_for_invalidations()
+    assert backend.sent_from == ["cache-invalidation"] * 2
+    assert backend.get(key.name) != "stale"
+    assert c.stats()["pending_invalidations"] == 0
+
+
+def test_failed_shared_invalidation_is_counted():
+    backend = SlowSharedBackend()
+    backend.answer.set()
+    backend.invalidate = lambda *args: 1 / 0
+    c = ResponseCache(backend)
+    c.invalidate_user(1)
+    c.wait_for_invalidations()
+    assert c.errors == 1
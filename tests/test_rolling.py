@@ -0,0 +1,175 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from backend import rolling
+from backend.summary import SUMMARY_COLUMNS
+
+
+# -------------------- HELPERS --------------------
+def workout_state(*days):
+    state = rolling.new_state()
+    assert rolling.extend_streak(state, list(days))
+    return state
+
+
+class FakeStore:
+    """daily_summary and rolling_stats as dicts, behind rolling's load_* / save_*."""
+
+    def __init__(self, monkeypatch):
+        self.daily = {}     # (user_id, date) -> SUMMARY_COLUMNS
+        self.states = {}    # user_id -> state
+        monkeypatch.setattr(rolling, "load_states", self.load_states)
+        monkeypatch.setattr(rolling, "load_days", self.load_days)
+        monkeypatch.setattr(rolling, "load_streaks", self.load_streaks)
+        monkeypatch.setattr(rolling, "save_states", self.save_states)
+
+    def record(self, totals):
+        # summary.record_entries upserts daily_summary before record_days
+        for key, deltas in totals.items():
+            row = self.daily.setdefault(key, dict.fromkeys(SUMMARY_COLUMNS, 0))
+            for column, delta in deltas.items():
+                row[column] += delta
+        rolling.record_days(None, totals)
+
+    def load_states(self, db, user_ids):
+        return {u: dict(self.states.get(u) or rolling.new_state()) for u in user_ids}
+
+    def load_days(self, db, ranges):
+        days = {}
+        for (user_id, day), row in self.daily.items():
+            if user_id in ranges and ranges[user_id][0] <= day <= ranges[user_id][1]:
+                days.setdefault(user_id, {})[day] = rolling.day_sums(row)
+        return days
+
+    def load_streaks(self, db, user_ids):
+        return {u: self.expected(u, streaks_only=True) for u in user_ids}
+
+    def save_states(self, db, states):
+        self.states.update({u: dict(s) for u, s in states.items()})
+
+    def expected(self, user_id, streaks_only=False):
+        """What rebuild() would compute for the user."""
+        days = {day: row for (u, day), row in self.daily.items() if u == user_id}
+        state = rolling.new_state()
+        rolling.extend_streak(state, sorted(d for d, row in days.items() if row["workout_count"]))
+        streaks = {column: state[column] for column in rolling.STREAK_COLUMNS}
+        if streaks_only:
+            return streaks
+        state["as_of"] = max(days)
+        for window in rolling.WINDOWS:
+            for day, row in days.items():
+                if state["as_of"] - timedelta(days=window) < day:
+                    rolling.shift(state, window, rolling.day_sums(row), 1)
+        return state
+
+
+def entry(kind, **extra):
+    deltas = dict.fromkeys(SUMMARY_COLUMNS, 0)
+    if kind == "calories":
+        deltas["calories_in"] = extra.get("calories", 500)
+    elif kind == "sleep":
+        deltas.update(sleep_hours=extra.get("hours", 7.5), sleep_entries=1)
+    elif kind == "workouts":
+        deltas.update(calories_burned=extra.get("burned", 300), workout_count=1)
+    else:
+        deltas[f"mood_{extra.get('level', 3)}"] = 1
+    return deltas
+
+
+# -------------------- STREAKS --------------------
+def test_extend_streak_counts_consecutive_days():
+    state = workout_state(date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3))
+    assert state["current_streak"] == 3
+    assert state["longest_streak"] == 3
+    assert state["last_workout_date"] == date(2024, 1, 3)
+
+
+def test_extend_streak_gap_restarts_current_keeps_longest():
+    state = workout_state(date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 5))
+    assert state["current_streak"] == 1
+    assert state["longest_streak"] == 2
+
+
+def test_extend_streak_same_day_twice_counts_once():
+    state = workout_state(date(2024, 1, 1))
+    assert rolling.extend_streak(state, [date(2024, 1, 1), date(2024, 1, 2)])
+    assert state["current_streak"] == 2
+
+
+def test_extend_streak_backdated_day_asks_for_recount():
+    state = workout_state(date(2024, 1, 1), date(2024, 1, 3))
+    assert not rolling.extend_streak(state, [date(2024, 1, 2)])
+
+
+# -------------------- INCREMENTAL UPDATE --------------------
+def test_record_days_windows_end_at_latest_day(monkeypatch):
+    store = FakeStore(monkeypatch)
+    start = date(2024, 3, 1)
+    for i in range(40):
+        store.record({(1, start + timedelta(days=i)): entry("calories", calories=100 + i)})
+
+    state = store.states[1]
+    assert state["as_of"] == start + timedelta(days=39)
+    assert state["calories_in_7"] == sum(100 + i for i in range(33, 40))
+    assert state["calories_in_30"] == sum(100 + i for i in range(10, 40))
+
+
+def test_record_days_jump_past_window_empties_it(monkeypatch):
+    store = FakeStore(monkeypatch)
+    store.record({(1, date(2024, 1, 1)): entry("sleep", hours=8)})
+    store.record({(1, date(2024, 6, 1)): entry("calories")})
+
+    state = store.states[1]
+    assert state["sleep_entries_7"] == state["sleep_entries_30"] == 0
+    assert state["sleep_hours_30"] == 0
+
+
+def test_record_days_backdated_workout_recounts_streak(monkeypatch):
+    store = FakeStore(monkeypatch)
+    store.record({(1, date(2024, 1, 1)): entry("workouts")})
+    store.record({(1, date(2024, 1, 3)): entry("workouts")})
+    store.record({(1, date(2024, 1, 2)): entry("workouts")})
+
+    assert store.states[1]["current_streak"] == 3
+    assert store.states[1]["longest_streak"] == 3
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_record_days_matches_rebuild(monkeypatch, seed):
+    rng = random.Random(seed)
+    store = FakeStore(monkeypatch)
+    start = date(2024, 1, 1)
+    for _ in range(300):
+        # mostly moving forward, with backdated entries mixed in
+        batch = {}
+        for _ in range(rng.randint(1, 4)):
+            user_id = rng.randint(1, 3)
+            day = start + timedelta(days=rng.randint(0, 90))
+            kind = rng.choice(("calories", "sleep", "workouts", "moods"))
+            deltas = entry(kind, level=rng.randint(1, 5))
+            acc = batch.setdefault((user_id, day), dict.fromkeys(SUMMARY_COLUMNS, 0))
+            for column, delta in deltas.items():
+                acc[column] += delta
+        store.record(batch)
+
+    for user_id, state in store.states.items():
+        assert state == pytest.approx(store.expected(user_id)), user_id
+
+
+# -------------------- READING --------------------
+def test_describe_streak_lapses_after_a_day_without_workouts():
+    state = workout_state(date(2024, 1, 1), date(2024, 1, 2))
+    state["as_of"] = date(2024, 1, 2)
+
+    assert rolling.describe(state, date(2024, 1, 3))["streak"]["current"] == 2
+    assert rolling.describe(state, date(2024, 1, 4))["streak"]["current"] == 0
+    assert rolling.describe(state, date(2024, 1, 4))["streak"]["longest"] == 2
+
+
+def test_describe_averages_skip_empty_windows():
+    window = rolling.describe(rolling.new_state(), date(2024, 1, 1))["last_7_days"]
+    assert window["avg_sleep_hours"] is None
+    assert window["avg_mood"] is None
+    assert window["calorie_balance"] == 0
@@ -0,0 +1,73 @@
+import threading
+from datetime import date
+
+import pytest
+from sqlalchemy import insert, text
+from sqlalchemy.exc import OperationalError
+
+from backend.database import SessionLocal
+from backend.models import Calorie
+from backend.summary import record_entries
+
+
+# these run against DATABASE_URL, and are skipped without a database
+@pytest.fixture
+def user_id():
+    try:
+        with SessionLocal() as db:
+            food = db.execute(
+                text("SELECT item_id FROM catalog_items WHERE kind = 'food' LIMIT 1")
+            ).scalar()
+            user = db.execute(
+                text("INSERT INTO users (name) VALUES ('test-summary-locks') RETURNING user_id")
+            ).scalar()
+            db.commit()
+    except OperationalError:
+        pytest.skip("no database at DATABASE_URL")
+    if food is None:
+        pytest.skip("catalog is empty, run backend.load_catalog")
+
+    yield user, food
+    with SessionLocal() as db:
+        db.execute(text("DELETE FROM users WHERE user_id = :u"), {"u": user})
+        db.commit()
+
+
+def test_concurrent_writes_for_one_user_take_turns(user_id):
+    user, food = user_id
+    day = date.today()
+    inserted = threading.Barrier(2, timeout=10)
+    errors = []
+
+    def write():
+        rows = [{"user_id": user, "food_item_id": food, "calories": 100, "date": day}]
+        try:
+            with SessionLocal() as db:
+                # the fact row's foreign key check holds KEY SHARE on the
+                # users row when record_entries bumps its data_version
+                db.execute(insert(Calorie), rows)
+                inserted.wait()
+                record_entries(db, "calories", rows)
+                db.commit()
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=write) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert errors == []
+    with SessionLocal() as db:
+        summary = db.execute(
+            text("SELECT calories_in FROM daily_summary WHERE user_id = :u AND date = :d"),
+            {"u": user, "d": day}
+        ).scalar()
+        rolling = db.execute(
+            text("SELECT calories_in_7 FROM rolling_stats WHERE user_id = :u"), {"u": user}
+        ).scalar()
+        version = db.execute(
+            text("SELECT data_version FROM users WHERE user_id = :u"), {"u": user}
+        ).scalar()
+    assert (summary, rolling, version) == (200, 200, 2)
@@ -0,0 +1,60 @@
+import logging
+
+import pytest
+
+from backend import versions
+from backend.versions import VersionWatcher
+
+
+class Stop(Exception):
+    pass
+
+
+def run(watcher, monkeypatch, sleeps=5):
+    """Run the listener loop until it has slept `sleeps` times; returns the delays."""
+    delays = []
+
+    def sleep(seconds):
+        delays.append(seconds)
+        if len(delays) == sleeps:
+            raise Stop
+
+    monkeypatch.setattr(versions.time, "sleep", sleep)
+    with pytest.raises(Stop):
+        watcher._run()
+    return delays
+
+
+def test_failed_listen_is_logged_and_retried_with_backoff(monkeypatch, caplog):
+    watcher = VersionWatcher(None, retry_delay=1, max_retry_delay=5)
+
+    def listen():
+        raise ConnectionError("could not connect to server")
+
+    monkeypatch.setattr(watcher, "_listen", listen)
+    with caplog.at_level(logging.ERROR, logger="backend.versions"):
+        delays = run(watcher, monkeypatch)
+
+    assert delays == [1, 2, 4, 5, 5]
+    assert "could not connect to server" in caplog.text
+    stats = watcher.stats()
+    assert (stats["connected"], stats["failures"], stats["reconnects"]) == (0, 5, 4)
+
+
+def test_dropped_connection_forgets_versions_and_resets_backoff(monkeypatch):
+    watcher = VersionWatcher(None, retry_delay=1, max_retry_delay=60)
+    attempts = []
+
+    def listen():
+        attempts.append(1)
+        if len(attempts) == 3:
+            # the third attempt connects and hears a notification before dropping
+            watcher.connected = True
+            watcher.seed({7: 3})
+            assert watcher.get(7) == 3
+        raise ConnectionError("server closed the connection")
+
+    monkeypatch.setattr(watcher, "_listen", listen)
+    assert run(watcher, monkeypatch) == [1, 2, 1, 2, 4]
+    assert watcher.get(7) is None
+    assert watcher.stats()["known_users"] == 0
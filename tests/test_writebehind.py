@@ -0,0 +1,191 @@
+import json
+import time
+from datetime import date
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from backend import writebehind
+from backend.writebehind import WriteBehindQueue, dead_letter_path, encode, read_journal
+
+
+class FakeSession:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def commit(self):
+        pass
+
+
+class FakeDatabase:
+    """Checkpoints and flushed entries in memory, behind writebehind's database calls."""
+
+    def __init__(self, monkeypatch):
+        self.checkpoints = {}
+        self.rows = []
+        self.reject = set()          # seqs that fail like a constraint violation
+        self.outages = 0             # next flushes failing like a lost connection
+        monkeypatch.setattr(writebehind, "SessionLocal", FakeSession)
+        monkeypatch.setattr(writebehind, "load_checkpoint", self.load_checkpoint)
+        monkeypatch.setattr(writebehind, "save_checkpoint", self.save_checkpoint)
+        monkeypatch.setattr(writebehind, "flush_entries", self.flush_entries)
+
+    def load_checkpoint(self, db, journal):
+        return self.checkpoints.get(journal, 0)
+
+    def save_checkpoint(self, db, journal, seq):
+        self.checkpoints[journal] = seq
+
+    def flush_entries(self, db, journal, entries):
+        if self.outages:
+            self.outages -= 1
+            raise OperationalError("INSERT", {}, Exception("server closed the connection"))
+        rejected = [seq for seq, _, _, _ in entries if seq in self.reject]
+        if rejected:
+            raise IntegrityError("INSERT", {}, Exception(f"entry {rejected[0]} violates a constraint"))
+        # one transaction: the rows and the checkpoint together
+        self.rows.extend(seq for seq, _, _, _ in entries)
+        self.checkpoints[journal] = entries[-1][0]
+
+
+def values(day=1):
+    return {"sleep_hours": 7.5, "quality_id": 3, "date": date(2024, 1, day)}
+
+
+def write_journal(path, seqs, torn=False):
+    with open(path, "w", encoding="utf-8") as f:
+        for seq in seqs:
+            f.write(encode(seq, "sleep", "alice", values()))
+        if torn:
+            f.write('{"seq": 99, "kind": "sle')
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    return FakeDatabase(monkeypatch)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WriteBehindQueue(str(tmp_path), flush_size=10, flush_interval=0.01, max_pending=100)
+    yield queue
+    queue.stop(5)
+
+
+# -------------------- JOURNAL --------------------
+def test_read_journal_stops_at_torn_last_line(tmp_path):
+    path = tmp_path / "ingest-0.journal"
+    write_journal(path, [1, 2, 3], torn=True)
+    with open(path, encoding="utf-8") as f:
+        entries = read_journal(f)
+    assert [seq for seq, _, _, _ in entries] == [1, 2, 3]
+    assert entries[0][3]["date"] == date(2024, 1, 1)
+
+
+def test_submit_appends_in_sequence_and_flushes(db, queue, tmp_path):
+    queue.start()
+    seqs = [queue.submit("sleep", "alice", values(day)) for day in (1, 2, 3)]
+    assert seqs == [1, 2, 3]
+
+    wait_for(lambda: db.rows == [1, 2, 3])
+    assert db.checkpoints[queue.journal] == 3
+    # everything is in the database, so the journal starts over
+    wait_for(lambda: (tmp_path / queue.journal).stat().st_size == 0)
+
+
+# -------------------- REPLAY --------------------
+def test_start_replays_only_entries_past_the_checkpoint(db, queue, tmp_path):
+    write_journal(tmp_path / "ingest-0.journal", [1, 2, 3, 4, 5], torn=True)
+    db.checkpoints["ingest-0.journal"] = 3
+
+    queue.start()
+    assert queue.replayed == 2
+    wait_for(lambda: db.rows == [4, 5])
+    # numbering continues after the journal, not after the checkpoint
+    assert queue.submit("sleep", "alice", values()) == 6
+
+
+def test_orphaned_journal_is_drained_at_start(db, queue, tmp_path):
+    write_journal(tmp_path / "ingest-1.journal", [1, 2, 3])
+    db.checkpoints["ingest-1.journal"] = 1
+
+    queue.start()
+    assert queue.journal == "ingest-0.journal"
+    assert db.rows == [2, 3]
+    assert db.checkpoints["ingest-1.journal"] == 3
+    assert (tmp_path / "ingest-1.journal").stat().st_size == 0
+
+
+def test_crash_after_flush_does_not_insert_twice(db, tmp_path):
+    first = WriteBehindQueue(str(tmp_path), flush_size=10, flush_interval=0.01)
+    first.start()
+    for day in (1, 2):
+        first.submit("sleep", "alice", values(day))
+    wait_for(lambda: db.rows == [1, 2])
+    # the worker dies before truncating; its journal still holds both entries
+    first._thread = None
+    first._file.close()
+    write_journal(tmp_path / "ingest-0.journal", [1, 2])
+
+    second = WriteBehindQueue(str(tmp_path), flush_size=10, flush_interval=0.01)
+    second.start()
+    second.stop(5)
+    assert second.replayed == 0
+    assert db.rows == [1, 2]
+
+
+# -------------------- FAILURES --------------------
+def test_transient_failures_retry_without_counting_attempts(db, queue, monkeypatch):
+    monkeypatch.setattr(writebehind, "MAX_ATTEMPTS", 1)
+    db.outages = 3
+    queue.start()
+    queue.submit("sleep", "alice", values())
+
+    wait_for(lambda: db.rows == [1])
+    assert queue.errors == 3
+    assert (queue.attempts, queue.dead_lettered) == (0, 0)
+
+
+def test_rejected_entry_is_dead_lettered_and_the_rest_go_in(db, queue, tmp_path, monkeypatch):
+    monkeypatch.setattr(writebehind, "MAX_ATTEMPTS", 2)
+    db.reject = {2}
+    queue.start()
+    for day in (1, 2, 3):
+        queue.submit("sleep", "alice", values(day))
+
+    wait_for(lambda: db.rows == [1, 3])
+    assert queue.dead_lettered == 1
+    assert queue.flushed == 2
+    assert queue.attempts == 0
+    assert db.checkpoints[queue.journal] == 3
+
+    with open(dead_letter_path(str(tmp_path), queue.journal), encoding="utf-8") as f:
+        [dead] = [json.loads(line) for line in f]
+    assert dead["seq"] == 2
+    assert dead["values"]["date"] == "2024-01-02"
+    assert "violates a constraint" in dead["error"]
+
+
+def test_salvage_skips_entries_an_interrupted_salvage_wrote(db, tmp_path):
+    entries = [(seq, "sleep", "alice", values()) for seq in (1, 2, 3)]
+    db.checkpoints["ingest-0.journal"] = 2
+    assert writebehind.salvage(str(tmp_path), "ingest-0.journal", entries) == (3, 0)
+    assert db.rows == [3]
+
+
+def test_salvage_raises_transient_errors(db, tmp_path):
+    db.outages = 1
+    entries = [(1, "sleep", "alice", values())]
+    with pytest.raises(OperationalError):
+        writebehind.salvage(str(tmp_path), "ingest-0.journal", entries)
+    assert not (tmp_path / "ingest-0.dead").exists()